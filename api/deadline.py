@@ -0,0 +1,96 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Union
+
+from myexception import PredictionTimeOut
+
+
+class Deadline:
+    """
+    Time budget checked cooperatively with `check()`, raising PredictionTimeOut (400) once expired.
+
+    Unlike SIGALRM, it works in any thread or worker process and supports sub-second budgets.
+    A deadline created with a parent never expires later than the parent, and cancelling the
+    parent (from any thread) cancels it too.
+    """
+
+    def __init__(self, seconds: Union[float, None] = None, parent: Union["Deadline", None] = None):
+        """
+        :param seconds: Budget in seconds from now (None: no limit of its own).
+        :param parent: Enclosing deadline.
+        """
+        self.seconds = seconds
+        self.parent = parent
+        self.expires_at = math.inf if seconds is None else time.monotonic() + seconds
+        if parent is not None:
+            self.expires_at = min(self.expires_at, parent.expires_at)
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        """
+        Seconds left before the deadline (math.inf without limit, 0.0 once expired or cancelled).
+        """
+        if self.cancelled:
+            return 0.0
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def expired(self) -> bool:
+        return self.cancelled or time.monotonic() >= self.expires_at
+
+    def check(self, stage: Union[str, None] = None) -> None:
+        """
+        Raise PredictionTimeOut if the deadline has expired or was cancelled.
+        """
+        if self.cancelled:
+            raise PredictionTimeOut(400, f"Prediction cancelled{f' during {stage}' if stage else ''}.")
+        if time.monotonic() >= self.expires_at:
+            raise PredictionTimeOut(400, f"Prediction timed out{f' during {stage}' if stage else ''}.")
+
+
+# Deadline of the running block, per thread (and per asyncio task)
+_current_deadline: ContextVar = ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Union[Deadline, None]:
+    return _current_deadline.get()
+
+
+def check_deadline(stage: Union[str, None] = None) -> None:
+    """
+    Raise PredictionTimeOut if the deadline of the running `time_limit` block has expired.
+    Does nothing outside a `time_limit` block.
+    """
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+@contextmanager
+def time_limit(seconds: Union[float, None], stage: Union[str, None] = None, deadline: Union[Deadline, None] = None):
+    """
+    Run the block with a deadline of `seconds` (within the deadline of an enclosing block).
+
+    The code in the block calls `check_deadline()` at safe points. The deadline is also
+    checked when the block finishes, so a block that overran between two checks still
+    raises PredictionTimeOut.
+
+    :param deadline: Enclosing deadline to use instead of the one of the running block
+                     (e.g. a per-house deadline passed to another thread).
+    """
+    deadline = Deadline(seconds, deadline if deadline is not None else _current_deadline.get())
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+    deadline.check(stage)
@@ -0,0 +1,524 @@
+import csv
+import datetime
+import numpy as np
+import pandas as pd
+from typing import List, Tuple, Union
+
+from myexception import InvalidInputError
+
+try:
+    import pyarrow
+    import pyarrow.csv as pyarrow_csv
+except ImportError:
+    pyarrow = None
+    pyarrow_csv = None
+
+
+# Columns of the electric data CSV (the order main.py writes them in)
+CSV_COLUMNS = [
+    'date_time_jst', 'air_conditioner', 'clothes_washer', 'microwave', 'refrigerator', 'rice_cooker',
+    'TV', 'cleaner', 'IH', 'Heater'
+]
+# Appliance columns used by the predictor
+USAGE_COLUMNS = ['air_conditioner', 'clothes_washer', 'microwave', 'rice_cooker', 'TV', 'cleaner', 'IH', 'Heater']
+DATETIME_FORMAT = "%Y/%m/%d %H:%M:%S"
+MINUTES_PER_DAY = 60 * 24
+# "c": pandas C parser, "pyarrow": pyarrow.csv (optional dependency)
+CSV_ENGINES = ("c", "pyarrow")
+
+
+class ElectricData:
+    """
+    Minute-level electric data of one house, the in-memory equivalent of the electric data CSV.
+
+    `date_time_jst` holds the JST timestamp of each row, as datetime64 or as strings in
+    the CSV format (parsed on use). For each appliance in `USAGE_COLUMNS`, `flags` is 1
+    if the value is > 0 (in use) and 0 otherwise, and `missing` is True if the value is
+    missing (NaN). `shape` is the shape of the source table in the CSV format, used for
+    the format validation.
+    """
+
+    def __init__(
+        self,
+        date_time_jst: np.ndarray,
+        flags: np.ndarray,
+        missing: np.ndarray,
+        shape: Union[Tuple[int, int], None] = None
+    ):
+        self.date_time_jst = np.asarray(date_time_jst)
+        self.flags = np.asarray(flags, dtype=np.int8)
+        self.missing = np.asarray(missing, dtype=bool)
+        self.shape = shape if shape is not None else (len(self.flags), len(CSV_COLUMNS))
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+    def __repr__(self) -> str:
+        if len(self.date_time_jst) == 0:
+            return f"ElectricData(shape={self.shape})"
+        return f"ElectricData(shape={self.shape}, from={self.date_time_jst[0]}, to={self.date_time_jst[-1]})"
+
+    def datetimes(self) -> np.ndarray:
+        """
+        Return date_time_jst as datetime64[s], parsing the strings ("%Y/%m/%d %H:%M:%S") in bulk if needed.
+        """
+        if np.issubdtype(self.date_time_jst.dtype, np.datetime64):
+            return self.date_time_jst.astype("datetime64[s]")
+        if len(self.date_time_jst) > 0 and isinstance(self.date_time_jst[0], datetime.datetime):
+            return self.date_time_jst.astype("datetime64[s]")
+        parsed = pd.to_datetime(pd.Series(self.date_time_jst), format=DATETIME_FORMAT)
+        if parsed.isna().any():
+            raise ValueError(f"date_time_jst has missing values. Expected format: {DATETIME_FORMAT}")
+        return parsed.to_numpy(dtype="datetime64[s]")
+
+    @classmethod
+    def from_usage(
+        cls,
+        date_time_jst: np.ndarray,
+        usage: np.ndarray,
+        shape: Union[Tuple[int, int], None] = None
+    ) -> "ElectricData":
+        """
+        Build from the appliance values in `USAGE_COLUMNS` order (NaN if missing).
+        """
+        usage = np.asarray(usage, dtype=np.float64)
+        return cls(date_time_jst, usage > 0, np.isnan(usage), shape)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "ElectricData":
+        """
+        Build from a DataFrame in the CSV format.
+        """
+        try:
+            df_used = df[['date_time_jst'] + USAGE_COLUMNS]
+        except KeyError as e:
+            raise InvalidInputError(
+                201,
+                f"Missing required columns in DataFrame: {e}. "
+                f"Expected columns: {['date_time_jst'] + USAGE_COLUMNS}",
+            )
+        return cls.from_usage(
+            df_used.date_time_jst.to_numpy(),
+            df_used[USAGE_COLUMNS].to_numpy(dtype=np.float64),
+            shape=df.shape
+        )
+
+    @classmethod
+    def from_matrix(
+        cls,
+        date_time_jst: np.ndarray,
+        values: np.ndarray,
+        columns: List[str] = CSV_COLUMNS[1:]
+    ) -> "ElectricData":
+        """
+        Build from a minute matrix of appliance values, one column per name in `columns` (NaN if missing),
+        e.g. the matrix main.py builds from the Energy Gateway API responses.
+        """
+        try:
+            usage_index = [columns.index(column) for column in USAGE_COLUMNS]
+        except ValueError as e:
+            raise InvalidInputError(201, f"Missing required columns in the minute matrix: {e}. Expected columns: {USAGE_COLUMNS}")
+        values = np.asarray(values, dtype=np.float64)
+        return cls.from_usage(date_time_jst, values[:, usage_index], shape=(len(values), len(columns) + 1))
+
+    @classmethod
+    def from_rows(cls, rows: Union[List[list], np.ndarray], columns: List[str] = CSV_COLUMNS) -> "ElectricData":
+        """
+        Build from rows in the CSV format. `None` is treated as missing.
+        """
+        try:
+            df = pd.DataFrame(rows, columns=columns)
+        except ValueError as e:
+            raise InvalidInputError(201, f"Invalid electric data rows: {e}")
+        return cls.from_dataframe(df)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, engine: str = "c") -> "ElectricData":
+        """
+        Build from an electric data CSV file (see `read_electric_csv`).
+        """
+        return read_electric_csv(csv_path, engine)
+
+    def pack(self) -> "PackedElectricData":
+        """
+        The same data as packed bits (see `PackedElectricData`).
+        """
+        return PackedElectricData.from_electric_data(self)
+
+
+def _read_csv_header(csv_path: str) -> List[str]:
+    with open(csv_path, mode='r', encoding='utf-8', newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def _read_csv_c(csv_path: str, n_columns: int) -> ElectricData:
+    """
+    Parse with the pandas C parser. Nullable Int8 parsing is several times slower than float64
+    in this parser, so the appliance columns are parsed as float64 and narrowed right away.
+    """
+    df = pd.read_csv(
+        csv_path,
+        encoding='utf-8',
+        usecols=['date_time_jst'] + USAGE_COLUMNS,
+        dtype={'date_time_jst': object, **{column: np.float64 for column in USAGE_COLUMNS}},
+    )
+    return ElectricData.from_usage(
+        df.date_time_jst.to_numpy(),
+        df[USAGE_COLUMNS].to_numpy(),
+        shape=(len(df), n_columns)
+    )
+
+
+def _read_csv_pyarrow(csv_path: str, n_columns: int) -> ElectricData:
+    """
+    Parse with pyarrow.csv: the appliance columns as int8 with a null mask and date_time_jst as timestamps.
+    """
+    convert_options = pyarrow_csv.ConvertOptions(
+        include_columns=['date_time_jst'] + USAGE_COLUMNS,
+        column_types={
+            'date_time_jst': pyarrow.timestamp('s'),
+            **{column: pyarrow.int8() for column in USAGE_COLUMNS}
+        },
+        timestamp_parsers=[DATETIME_FORMAT],
+    )
+    table = pyarrow_csv.read_csv(csv_path, convert_options=convert_options)
+    flags = np.column_stack([table.column(column).fill_null(0).to_numpy() for column in USAGE_COLUMNS])
+    missing = np.column_stack([
+        table.column(column).is_null().to_numpy(zero_copy_only=False) for column in USAGE_COLUMNS
+    ])
+    return ElectricData(
+        table.column('date_time_jst').to_numpy(),
+        flags > 0,
+        missing,
+        shape=(table.num_rows, n_columns)
+    )
+
+
+def read_electric_csv(csv_path: str, engine: str = "c") -> ElectricData:
+    """
+    Read an electric data CSV into ElectricData.
+
+    Only `date_time_jst` and `USAGE_COLUMNS` are parsed, with explicit dtypes, and the appliance
+    values are kept as int8 flags with a missing mask instead of float64 columns.
+
+    :param csv_path: Path of the electric data CSV.
+    :param engine: "c" (pandas C parser) or "pyarrow" (requires pyarrow). If the file does not
+                   match the fixed schema (e.g. power values instead of 0/1 flags), the pyarrow
+                   engine falls back to the C parser.
+    """
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Invalid engine: {engine}. Expected one of {CSV_ENGINES}.")
+    if engine == "pyarrow" and pyarrow is None:
+        raise ImportError("pyarrow is required for engine='pyarrow'.")
+
+    header = _read_csv_header(csv_path)
+    missing_columns = [column for column in ['date_time_jst'] + USAGE_COLUMNS if column not in header]
+    if missing_columns:
+        raise InvalidInputError(
+            201,
+            f"Missing required columns in CSV: {missing_columns}. "
+            f"Expected columns: {['date_time_jst'] + USAGE_COLUMNS}",
+        )
+
+    if engine == "pyarrow":
+        try:
+            return _read_csv_pyarrow(csv_path, len(header))
+        except pyarrow.ArrowInvalid:
+            pass
+    return _read_csv_c(csv_path, len(header))
+
+
+def day_runs(datetimes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split datetime64 rows into runs of consecutive rows on the same day.
+
+    :return: (day of each run as datetime64[D], number of rows of each run)
+    """
+    days = np.asarray(datetimes).astype("datetime64[D]")
+    if len(days) == 0:
+        return days, np.empty(0, dtype=np.int64)
+    run_starts = np.concatenate([[0], np.flatnonzero(days[1:] != days[:-1]) + 1])
+    run_lengths = np.diff(np.append(run_starts, len(days)))
+    return days[run_starts], run_lengths
+
+
+class ElectricFeatureAccumulator:
+    """
+    Running state of the electric data features, fed one chunk (e.g. one day of API
+    responses) at a time instead of the whole 28-day minute table.
+
+    The state has a constant size per house: the number of rows, the daytime and
+    midnight usage counts per appliance (as `Predictor._divide_array`), the missing
+    rows per day and appliance (for the electric rate checks) and the runs of rows
+    per calendar day (for the datetime features). As in the CSV path, rows are
+    assigned to days and to daytime/midnight by their position, every
+    `MINUTES_PER_DAY` rows being one day.
+    """
+
+    def __init__(self, nighttime_hour_0: int = 5, nighttime_hour_1: int = 2):
+        """
+        :param nighttime_hour_0: Midnight hours from 0:00 (default 5: 0:00-4:59).
+        :param nighttime_hour_1: Midnight hours until 23:59 (default 2: 22:00-23:59).
+        """
+        self.nighttime_minutes_0 = nighttime_hour_0 * 60
+        self.nighttime_minutes_1 = nighttime_hour_1 * 60
+        self.n_rows = 0
+        self.daytime_usage_time = np.zeros(len(USAGE_COLUMNS), dtype=np.int64)
+        self.midnight_usage_time = np.zeros(len(USAGE_COLUMNS), dtype=np.int64)
+        self._daily_missing = []
+        self._run_days = []
+        self._run_lengths = []
+        self._datetime_error = None
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __repr__(self) -> str:
+        if not self._run_days:
+            return f"ElectricFeatureAccumulator(shape={self.shape})"
+        return f"ElectricFeatureAccumulator(shape={self.shape}, from={self._run_days[0]}, to={self._run_days[-1]})"
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """
+        Shape of the accumulated data in the CSV format.
+        """
+        return (self.n_rows, len(CSV_COLUMNS))
+
+    @property
+    def daily_missing(self) -> np.ndarray:
+        """
+        Number of missing rows per day and appliance, shape (n_days, len(USAGE_COLUMNS)).
+        """
+        if not self._daily_missing:
+            return np.zeros((0, len(USAGE_COLUMNS)), dtype=np.int64)
+        return np.array(self._daily_missing, dtype=np.int64)
+
+    def day_runs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Runs of consecutive rows on the same day over all chunks (see `day_runs`).
+        Raises the ValueError of an unparsable date_time_jst here rather than in `add`,
+        so that the format and electric rate checks come first as in the CSV path.
+        """
+        if self._datetime_error is not None:
+            raise self._datetime_error
+        return np.array(self._run_days, dtype="datetime64[D]"), np.array(self._run_lengths, dtype=np.int64)
+
+    def add(self, electric_data: ElectricData) -> None:
+        """
+        Accumulate the next rows.
+        """
+        n = len(electric_data)
+        if n == 0:
+            return
+        position = self.n_rows + np.arange(n)
+
+        # daytime / midnight usage counts
+        minute = position % MINUTES_PER_DAY
+        midnight = (minute < self.nighttime_minutes_0) | (minute >= MINUTES_PER_DAY - self.nighttime_minutes_1)
+        flags = electric_data.flags > 0
+        self.midnight_usage_time += np.sum(flags[midnight], axis=0)
+        self.daytime_usage_time += np.sum(flags[~midnight], axis=0)
+
+        # missing rows per day
+        day = position // MINUTES_PER_DAY
+        boundaries = np.concatenate([[0], np.flatnonzero(np.diff(day)) + 1, [n]])
+        for start, stop in zip(boundaries[:-1], boundaries[1:]):
+            if day[start] >= len(self._daily_missing):
+                self._daily_missing.append(np.zeros(len(USAGE_COLUMNS), dtype=np.int64))
+            self._daily_missing[day[start]] += np.sum(electric_data.missing[start:stop], axis=0)
+
+        # runs of rows per calendar day
+        if self._datetime_error is None:
+            try:
+                run_days, run_lengths = day_runs(electric_data.datetimes())
+            except ValueError as e:
+                self._datetime_error = e
+            else:
+                if self._run_days and self._run_days[-1] == run_days[0]:
+                    self._run_lengths[-1] += int(run_lengths[0])
+                    run_days, run_lengths = run_days[1:], run_lengths[1:]
+                self._run_days.extend(run_days)
+                self._run_lengths.extend(int(length) for length in run_lengths)
+
+        self.n_rows += n
+
+    def add_rows(self, rows: Union[List[list], np.ndarray], columns: List[str] = CSV_COLUMNS) -> None:
+        """
+        Accumulate the next rows in the CSV format (see `ElectricData.from_rows`).
+        """
+        self.add(ElectricData.from_rows(rows, columns))
+
+    @classmethod
+    def from_electric_data(cls, electric_data: ElectricData) -> "ElectricFeatureAccumulator":
+        accumulator = cls()
+        accumulator.add(electric_data)
+        return accumulator
+
+
+# Number of set bits of each byte value (np.bitwise_count needs NumPy >= 2.0)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(packed: np.ndarray) -> np.ndarray:
+    """
+    Number of set bits of each byte of a uint8 array.
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(packed)
+    return _POPCOUNT[packed]
+
+
+class PackedElectricData:
+    """
+    Minute-level electric data of one house as packed bits, compact enough to hold
+    thousands of houses in memory for batch scoring.
+
+    For each appliance in `USAGE_COLUMNS`, the in-use flags and the missing mask are
+    packed 8 minutes per byte, arranged by (day, appliance, minute of day), every
+    `MINUTES_PER_DAY` rows being one day as in `Predictor._divide_array` (an incomplete
+    last day is padded with minutes neither in use nor missing). The timestamps are kept
+    as the runs of rows per calendar day (see `day_runs`), which is all the datetime
+    features use. 28 days take about 80 KB, against about 1 MB for `ElectricData` and
+    3 MB for the float64 DataFrame. Usage counts over any set of minutes of the day are
+    popcounts of the flags masked by that set.
+    """
+
+    BYTES_PER_DAY = MINUTES_PER_DAY // 8
+
+    def __init__(
+        self,
+        flag_bits: np.ndarray,
+        missing_bits: np.ndarray,
+        n_rows: int,
+        run_days: np.ndarray,
+        run_lengths: np.ndarray,
+        shape: Union[Tuple[int, int], None] = None,
+        datetime_error: Union[ValueError, None] = None
+    ):
+        """
+        :param flag_bits: Packed in-use flags, uint8 (n_days, len(USAGE_COLUMNS), BYTES_PER_DAY).
+        :param missing_bits: Packed missing mask, same layout.
+        :param n_rows: Number of minutes (rows) of the data.
+        :param run_days: Day of each run of rows (see `day_runs`).
+        :param run_lengths: Number of rows of each run.
+        :param shape: Shape of the source table in the CSV format.
+        :param datetime_error: ValueError of an unparsable date_time_jst, raised by `day_runs`.
+        """
+        self.flag_bits = np.asarray(flag_bits, dtype=np.uint8)
+        self.missing_bits = np.asarray(missing_bits, dtype=np.uint8)
+        self.n_rows = n_rows
+        self.run_days = np.asarray(run_days, dtype="datetime64[D]")
+        self.run_lengths = np.asarray(run_lengths, dtype=np.int32)
+        self.shape = shape if shape is not None else (n_rows, len(CSV_COLUMNS))
+        self._datetime_error = datetime_error
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __repr__(self) -> str:
+        if len(self.run_days) == 0:
+            return f"PackedElectricData(shape={self.shape})"
+        return f"PackedElectricData(shape={self.shape}, from={self.run_days[0]}, to={self.run_days[-1]})"
+
+    @property
+    def nbytes(self) -> int:
+        return self.flag_bits.nbytes + self.missing_bits.nbytes + self.run_days.nbytes + self.run_lengths.nbytes
+
+    @classmethod
+    def _pack(cls, values: np.ndarray) -> np.ndarray:
+        """
+        Pack (n_rows, n_appliances) booleans into (n_days, n_appliances, BYTES_PER_DAY) bits.
+        """
+        n_rows, n_columns = values.shape
+        n_days = -(-n_rows // MINUTES_PER_DAY)
+        padded = np.zeros((n_days * MINUTES_PER_DAY, n_columns), dtype=bool)
+        padded[:n_rows] = values
+        by_day = padded.reshape(n_days, MINUTES_PER_DAY, n_columns).transpose(0, 2, 1)
+        return np.packbits(by_day, axis=2)
+
+    @classmethod
+    def from_electric_data(cls, electric_data: ElectricData) -> "PackedElectricData":
+        datetime_error = None
+        try:
+            run_days, run_lengths = day_runs(electric_data.datetimes())
+        except ValueError as e:
+            # raised by day_runs, after the format and electric rate checks as in the CSV path
+            run_days, run_lengths = np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=np.int64)
+            datetime_error = e
+        return cls(
+            cls._pack(electric_data.flags > 0),
+            cls._pack(electric_data.missing),
+            len(electric_data),
+            run_days,
+            run_lengths,
+            electric_data.shape,
+            datetime_error
+        )
+
+    @classmethod
+    def from_csv(cls, csv_path: str, engine: str = "c") -> "PackedElectricData":
+        return cls.from_electric_data(read_electric_csv(csv_path, engine))
+
+    @classmethod
+    def minute_mask(cls, minutes: np.ndarray) -> np.ndarray:
+        """
+        Packed mask of a set of minutes of the day (boolean array of length MINUTES_PER_DAY).
+        """
+        minutes = np.asarray(minutes, dtype=bool)
+        if minutes.shape != (MINUTES_PER_DAY,):
+            raise ValueError(f"minutes must have shape ({MINUTES_PER_DAY},), got {minutes.shape}.")
+        return np.packbits(minutes)
+
+    def usage_time(self, mask: np.ndarray) -> np.ndarray:
+        """
+        Number of in-use minutes per appliance over all days, counting the minutes of the
+        day in the packed `mask` (see `minute_mask`).
+        """
+        return popcount(self.flag_bits & mask).sum(axis=(0, 2), dtype=np.int64)
+
+    def day_night_usage_time(self, nighttime_hour_0: int = 5, nighttime_hour_1: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Daytime and midnight usage counts per appliance, as `Predictor._divide_array`.
+        """
+        minute = np.arange(MINUTES_PER_DAY)
+        midnight = (minute < nighttime_hour_0 * 60) | (minute >= MINUTES_PER_DAY - nighttime_hour_1 * 60)
+        return self.usage_time(self.minute_mask(~midnight)), self.usage_time(self.minute_mask(midnight))
+
+    @property
+    def daily_missing(self) -> np.ndarray:
+        """
+        Number of missing rows per day and appliance, shape (n_days, len(USAGE_COLUMNS)).
+        """
+        return popcount(self.missing_bits).sum(axis=2, dtype=np.int64)
+
+    def day_runs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Runs of consecutive rows on the same day (see `day_runs`).
+        """
+        if self._datetime_error is not None:
+            raise self._datetime_error
+        return self.run_days, self.run_lengths.astype(np.int64)
+
+    def _unpack(self, bits: np.ndarray) -> np.ndarray:
+        by_day = np.unpackbits(bits, axis=2, count=MINUTES_PER_DAY).transpose(0, 2, 1)
+        return by_day.reshape(-1, bits.shape[1])[:self.n_rows]
+
+    def flags(self) -> np.ndarray:
+        """
+        In-use flags (n_rows, len(USAGE_COLUMNS)) as int8, as `ElectricData.flags`.
+        """
+        return self._unpack(self.flag_bits).astype(np.int8)
+
+    def missing(self) -> np.ndarray:
+        """
+        Missing mask (n_rows, len(USAGE_COLUMNS)), as `ElectricData.missing`.
+        """
+        return self._unpack(self.missing_bits).astype(bool)
+
+
+# Electric data accepted by the predictor: a CSV file path, in-memory data in the CSV format
+# or the features accumulated while fetching the data
+ElectricDataSource = Union[
+    str, ElectricData, PackedElectricData, ElectricFeatureAccumulator, pd.DataFrame, np.ndarray, list
+]
@@ -0,0 +1,260 @@
+import datetime
+import hashlib
+import logging
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+from typing import Dict, List, Tuple, Union
+
+
+# File layout: MAGIC | format version (uint16 LE) | number of rows (uint32 LE) | number of appliances (uint16 LE)
+# | exist (uint8) | contiguous (uint8) | first minute since the epoch (int64 LE) | zlib payload.
+# The payload holds the minute offsets from the first row (int32, only if the rows are not contiguous
+# minutes) followed by the flags (int8, row-major, -1 for missing).
+MAGIC = b"MCIDAY\x00\x00"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sHIHBBq")
+_MISSING = -1
+
+# (JST minute timestamps, flags (rows, appliances) with NaN for missing, whether the day has any value)
+DayData = Tuple[np.ndarray, np.ndarray, bool]
+
+
+def encode_day(date_time_jst: np.ndarray, values: np.ndarray, exist: bool) -> Union[bytes, None]:
+    """
+    Encode one day of converted electric data (see main.convert_electric_data_day).
+
+    :return: The encoded day, or None if `values` holds anything but 0, 1 and NaN.
+    """
+    minutes = np.asarray(date_time_jst, dtype="datetime64[m]").astype(np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    if not np.all(missing | (values == 0.0) | (values == 1.0)):
+        return None
+    codes = np.where(missing, _MISSING, values).astype(np.int8)
+
+    first = int(minutes[0]) if len(minutes) > 0 else 0
+    offsets = minutes - first
+    contiguous = bool(np.array_equal(offsets, np.arange(len(minutes))))
+    payload = codes.tobytes() if contiguous else offsets.astype(np.int32).tobytes() + codes.tobytes()
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(minutes), values.shape[1], bool(exist), contiguous, first)
+    return header + zlib.compress(payload, 6)
+
+
+def decode_day(data: bytes) -> DayData:
+    """
+    Decode a day encoded by `encode_day`.
+    """
+    magic, format_version, n, n_columns, exist, contiguous, first = _HEADER.unpack_from(data)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError("Not an electric day cache entry of the supported format.")
+    payload = zlib.decompress(data[_HEADER.size:])
+    if contiguous:
+        offsets = np.arange(n, dtype=np.int64)
+        codes = np.frombuffer(payload, dtype=np.int8)
+    else:
+        offsets = np.frombuffer(payload, dtype=np.int32, count=n).astype(np.int64)
+        codes = np.frombuffer(payload, dtype=np.int8, offset=4 * n)
+    codes = codes.reshape(n, n_columns)
+    values = codes.astype(np.float64)
+    values[codes == _MISSING] = np.nan
+    date_time_jst = (offsets + first).astype("datetime64[m]")
+    return date_time_jst, values, bool(exist)
+
+
+class ElectricDayCache:
+    """
+    On-disk cache of the converted Energy Gateway API response of one day of one house.
+
+    Entries are keyed by (spid, houseid, day, appliance type ids) and stored one file per
+    day in a compact binary format (int8 flags, zlib-compressed, a few KB per day), so
+    the directory can also be a mounted Cloud Storage bucket shared by job executions.
+    Only complete days are cached: a day is used from and written to the cache once it
+    ended at least `settle_seconds` ago, later days are always fetched. Entries are evicted
+    least recently used first (file modification time, updated on every hit) once the
+    total size exceeds `max_bytes`.
+
+    The object can be passed to worker processes; each copy counts its own hits and
+    misses and writes to the same directory (`merge_stats` adds the counts of a copy).
+    """
+
+    STATS_KEYS = ("hits", "misses", "bypassed", "stored", "stored_bytes", "evicted")
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 ** 3, settle_seconds: float = 24 * 60 * 60):
+        """
+        :param cache_dir: Cache directory (created if missing).
+        :param max_bytes: Size of the cache above which entries are evicted.
+        :param settle_seconds: Time after the end of a day from which the day is cached.
+        """
+        if max_bytes <= 0:
+            raise ValueError(f"max_bytes must be > 0, got {max_bytes}.")
+        if settle_seconds < 0:
+            raise ValueError(f"settle_seconds must be >= 0, got {settle_seconds}.")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.settle_seconds = settle_seconds
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(self.STATS_KEYS, 0)
+        # Size of the directory as of the last scan plus what was written since (None: not scanned yet)
+        self._total_bytes = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_stats"] = dict.fromkeys(self.STATS_KEYS, 0)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def path(self, spid, houseid, day_start: datetime.datetime, app_type_ids: List[int]) -> str:
+        app_key = hashlib.sha1(",".join(str(i) for i in app_type_ids).encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.cache_dir, str(spid), str(houseid), f"{day_start.strftime('%Y%m%d')}_{app_key}.bin")
+
+    def is_complete(self, day_end: datetime.datetime) -> bool:
+        """
+        Whether the day ending at `day_end` (timezone-aware) is complete and can be cached.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return (now - day_end).total_seconds() >= self.settle_seconds
+
+    def get(self, spid, houseid, day_start: datetime.datetime, day_end: datetime.datetime,
+            app_type_ids: List[int]) -> Union[DayData, None]:
+        """
+        The cached day, or None if it is not cached or not complete (counted as bypassed).
+        """
+        if not self.is_complete(day_end):
+            self._count("bypassed")
+            return None
+        path = self.path(spid, houseid, day_start, app_type_ids)
+        try:
+            with open(path, mode="rb") as f:
+                day = decode_day(f.read())
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Discarding unreadable electric day cache entry {path}: {e}")
+            self._remove(path)
+            self._count("misses")
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count("hits")
+        return day
+
+    def put(self, spid, houseid, day_start: datetime.datetime, day_end: datetime.datetime,
+            app_type_ids: List[int], day: DayData) -> bool:
+        """
+        Store a fetched day if it is complete and has data.
+
+        Days without any value are not stored, as the data may still arrive later.
+
+        :return: Whether the day was stored.
+        """
+        date_time_jst, values, exist = day
+        if not exist or not self.is_complete(day_end):
+            return False
+        data = encode_day(date_time_jst, values, exist)
+        if data is None:
+            return False
+        path = self.path(spid, houseid, day_start, app_type_ids)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, mode="wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"Failed to write electric day cache entry {path}: {e}")
+            self._remove(tmp_path)
+            return False
+        with self._lock:
+            self._stats["stored"] += 1
+            self._stats["stored_bytes"] += len(data)
+        self._add_bytes(len(data))
+        return True
+
+    def evict(self, target_bytes: Union[int, None] = None) -> int:
+        """
+        Remove the least recently used entries until the cache is at most `target_bytes`
+        (default: 90% of max_bytes, so that eviction does not run on every write).
+
+        :return: Number of entries removed.
+        """
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * 0.9)
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".bin"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        if total > target_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target_bytes:
+                    break
+                if self._remove(path):
+                    total -= size
+                    evicted += 1
+        with self._lock:
+            self._total_bytes = total
+            self._stats["evicted"] += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def take_stats(self) -> Dict[str, int]:
+        """
+        The counts since the last call (e.g. per task), resetting them.
+        """
+        with self._lock:
+            stats = self._stats
+            self._stats = dict.fromkeys(self.STATS_KEYS, 0)
+        return stats
+
+    def merge_stats(self, stats: Dict[str, int]) -> None:
+        """
+        Add the counts of a copy of the cache (in a worker process), including the bytes it wrote.
+        """
+        with self._lock:
+            for key in self.STATS_KEYS:
+                self._stats[key] += stats.get(key, 0)
+        self._add_bytes(stats.get("stored_bytes", 0))
+
+    def _add_bytes(self, n: int) -> None:
+        with self._lock:
+            unknown = self._total_bytes is None
+            if not unknown:
+                self._total_bytes += n
+            over = unknown or self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
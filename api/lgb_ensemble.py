@@ -0,0 +1,409 @@
+import numpy as np
+from typing import Callable, List, Dict, Tuple, Union
+
+from deadline import check_deadline
+
+
+# LightGBM decision_type bit layout (see LightGBM include/LightGBM/tree.h)
+CATEGORICAL_MASK = 1
+DEFAULT_LEFT_MASK = 2
+MISSING_TYPE_NONE = 0
+MISSING_TYPE_ZERO = 1
+MISSING_TYPE_NAN = 2
+K_ZERO_THRESHOLD = 1e-35
+
+
+def _parse_values(value: str, dtype) -> np.ndarray:
+    """
+    Parse a space separated value list of a LightGBM model file.
+    """
+    if value == "":
+        return np.empty(0, dtype=dtype)
+    return np.array(value.split(" "), dtype=np.float64).astype(dtype)
+
+
+def parse_model_file(path: str) -> Dict[str, Union[float, int, List[Dict[str, np.ndarray]]]]:
+    """
+    Parse a LightGBM text model file into its trees.
+
+    Only binary models with numerical splits are supported, which is what
+    `api/models/lgb` contains.
+    """
+    header = {}
+    trees = []
+    current = None
+    with open(path, mode="r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line == "end of trees":
+                break
+            if line.startswith("Tree="):
+                current = {}
+                trees.append(current)
+                continue
+            if "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            if current is None:
+                header[key] = value
+            else:
+                current[key] = value
+
+    objective = header.get("objective", "").split(" ")
+    if objective[0] != "binary":
+        raise ValueError(f"Unsupported objective in {path}: {header.get('objective')}")
+    sigmoid = 1.0
+    for option in objective[1:]:
+        if option.startswith("sigmoid:"):
+            sigmoid = float(option.split(":", 1)[1])
+    if int(header.get("num_tree_per_iteration", 1)) != 1:
+        raise ValueError(f"Unsupported num_tree_per_iteration in {path}.")
+    if "average_output" in header:
+        raise ValueError(f"Unsupported average_output model in {path}.")
+
+    parsed_trees = []
+    for tree in trees:
+        if int(tree.get("num_cat", 0)) != 0 or int(tree.get("is_linear", 0)) != 0:
+            raise ValueError(f"Unsupported categorical or linear tree in {path}.")
+        parsed_trees.append({
+            "split_feature": _parse_values(tree["split_feature"], np.int32),
+            "threshold": _parse_values(tree["threshold"], np.float64),
+            "decision_type": _parse_values(tree["decision_type"], np.int8),
+            "left_child": _parse_values(tree["left_child"], np.int32),
+            "right_child": _parse_values(tree["right_child"], np.int32),
+            "leaf_value": _parse_values(tree["leaf_value"], np.float64),
+        })
+
+    return {
+        "sigmoid": sigmoid,
+        "n_features": int(header["max_feature_idx"]) + 1,
+        "trees": parsed_trees,
+    }
+
+
+class LGBEnsemble:
+    """
+    Flat array representation of an ensemble of LightGBM binary boosters.
+
+    All trees of all boosters are stored in contiguous arrays. Internal node
+    children are global node indices (>= 0), leaves are encoded as `~leaf`
+    (< 0), so a row is evaluated on every tree at once by following
+    `left_child` / `right_child` until every pointer is negative.
+    """
+
+    def __init__(
+        self,
+        split_feature: np.ndarray,
+        threshold: np.ndarray,
+        decision_type: np.ndarray,
+        left_child: np.ndarray,
+        right_child: np.ndarray,
+        leaf_value: np.ndarray,
+        tree_root: np.ndarray,
+        booster_offsets: np.ndarray,
+        sigmoid: np.ndarray,
+        n_features: int,
+        chunk_size: int = 256
+    ):
+        """
+        :param split_feature: Feature index of each internal node.
+        :param threshold: Split threshold of each internal node.
+        :param decision_type: LightGBM decision type of each internal node.
+        :param left_child: Encoded left child of each internal node.
+        :param right_child: Encoded right child of each internal node.
+        :param leaf_value: Output value of each leaf.
+        :param tree_root: Encoded root of each tree.
+        :param booster_offsets: Index of the first tree of each booster, followed by the number of trees.
+        :param sigmoid: Sigmoid parameter of each booster.
+        :param n_features: Number of input features.
+        :param chunk_size: Maximum number of rows evaluated in one pass.
+        """
+        if np.any(decision_type & CATEGORICAL_MASK):
+            raise ValueError("Categorical splits are not supported.")
+
+        self.split_feature = np.ascontiguousarray(split_feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.decision_type = np.ascontiguousarray(decision_type, dtype=np.int8)
+        self.default_left = np.ascontiguousarray((decision_type & DEFAULT_LEFT_MASK) > 0)
+        self.missing_type = np.ascontiguousarray((decision_type >> 2) & 3, dtype=np.int8)
+        self.left_child = np.ascontiguousarray(left_child, dtype=np.int32)
+        self.right_child = np.ascontiguousarray(right_child, dtype=np.int32)
+        self.leaf_value = np.ascontiguousarray(leaf_value, dtype=np.float64)
+        self.tree_root = np.ascontiguousarray(tree_root, dtype=np.int32)
+        self.booster_offsets = np.ascontiguousarray(booster_offsets, dtype=np.int64)
+        self.sigmoid = np.ascontiguousarray(sigmoid, dtype=np.float64)
+        self.n_features = n_features
+        self.chunk_size = chunk_size
+
+        # missing types other than None are handled by a slower path
+        self._has_missing_handling = bool(np.any(self.missing_type != MISSING_TYPE_NONE))
+        # early exit plans by step size (see predict_mean_early_exit)
+        self._early_exit_plans = {}
+
+    @property
+    def n_boosters(self) -> int:
+        return len(self.sigmoid)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.tree_root)
+
+    def __len__(self) -> int:
+        return self.n_boosters
+
+    @classmethod
+    def from_model_files(cls, paths: List[str], chunk_size: int = 256) -> "LGBEnsemble":
+        """
+        Build the ensemble from LightGBM text model files.
+        """
+        return cls.from_parsed_models([parse_model_file(path) for path in paths], chunk_size)
+
+    @classmethod
+    def from_parsed_models(cls, models: List[Dict], chunk_size: int = 256) -> "LGBEnsemble":
+        """
+        Build the ensemble from the output of `parse_model_file`.
+        """
+        if len(models) == 0:
+            raise ValueError("No models to build the ensemble from.")
+        n_features = {model["n_features"] for model in models}
+        if len(n_features) != 1:
+            raise ValueError(f"Models have different numbers of features: {sorted(n_features)}")
+
+        split_feature, threshold, decision_type = [], [], []
+        left_child, right_child, leaf_value, tree_root = [], [], [], []
+        booster_offsets, sigmoid = [], []
+        n_nodes = 0
+        n_leaves = 0
+        n_trees = 0
+        for model in models:
+            booster_offsets.append(n_trees)
+            sigmoid.append(model["sigmoid"])
+            for tree in model["trees"]:
+                left = tree["left_child"].astype(np.int32)
+                right = tree["right_child"].astype(np.int32)
+                # internal child -> global node index, leaf child (~leaf) -> ~global leaf index
+                left_child.append(np.where(left >= 0, left + n_nodes, left - n_leaves))
+                right_child.append(np.where(right >= 0, right + n_nodes, right - n_leaves))
+                split_feature.append(tree["split_feature"])
+                threshold.append(tree["threshold"])
+                decision_type.append(tree["decision_type"])
+                leaf_value.append(tree["leaf_value"])
+                # a tree without split is a single leaf
+                tree_root.append(n_nodes if len(left) > 0 else ~n_leaves)
+                n_nodes += len(left)
+                n_leaves += len(tree["leaf_value"])
+                n_trees += 1
+        booster_offsets.append(n_trees)
+
+        return cls(
+            split_feature=np.concatenate(split_feature),
+            threshold=np.concatenate(threshold),
+            decision_type=np.concatenate(decision_type),
+            left_child=np.concatenate(left_child),
+            right_child=np.concatenate(right_child),
+            leaf_value=np.concatenate(leaf_value),
+            tree_root=np.array(tree_root, dtype=np.int32),
+            booster_offsets=np.array(booster_offsets, dtype=np.int64),
+            sigmoid=np.array(sigmoid, dtype=np.float64),
+            n_features=n_features.pop(),
+            chunk_size=chunk_size,
+        )
+
+    def _go_left(self, node: np.ndarray, fval: np.ndarray) -> np.ndarray:
+        """
+        Decide the direction at `node` for the feature values `fval` (LightGBM NumericalDecision).
+        """
+        threshold = self.threshold[node]
+        if not self._has_missing_handling:
+            # missing type None: NaN is treated as 0.0
+            return np.where(np.isnan(fval), 0.0, fval) <= threshold
+
+        missing_type = self.missing_type[node]
+        is_nan = np.isnan(fval)
+        fval = np.where(is_nan & (missing_type != MISSING_TYPE_NAN), 0.0, fval)
+        use_default = (
+            ((missing_type == MISSING_TYPE_ZERO) & (np.abs(fval) <= K_ZERO_THRESHOLD))
+            | ((missing_type == MISSING_TYPE_NAN) & is_nan)
+        )
+        return np.where(use_default, self.default_left[node], fval <= threshold)
+
+    def _leaf_outputs(self, X: np.ndarray, tree_root: Union[np.ndarray, None] = None) -> np.ndarray:
+        """
+        Return the leaf output of every tree (or of the trees of `tree_root`) for every row, shape (n_rows, n_trees).
+        """
+        if tree_root is None:
+            tree_root = self.tree_root
+        n_rows = X.shape[0]
+        n_trees = len(tree_root)
+        pointer = np.tile(tree_root, n_rows)
+        row_index = np.repeat(np.arange(n_rows), n_trees)
+        active = np.flatnonzero(pointer >= 0)
+        while active.size:
+            check_deadline("lightgbm")
+            node = pointer[active]
+            fval = X[row_index[active], self.split_feature[node]]
+            child = np.where(self._go_left(node, fval), self.left_child[node], self.right_child[node])
+            pointer[active] = child
+            active = active[child >= 0]
+        return self.leaf_value[~pointer].reshape(n_rows, n_trees)
+
+    def _check_input(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"The number of features in data ({X.shape[-1]}) is not the same as it was in training data ({self.n_features})."
+            )
+        return X
+
+    def predict_raw(self, X: np.ndarray) -> np.ndarray:
+        """
+        Return the raw score of every booster for every row, shape (n_rows, n_boosters).
+        """
+        X = self._check_input(X)
+        raw = np.empty((X.shape[0], self.n_boosters), dtype=np.float64)
+        for start in range(0, X.shape[0], self.chunk_size):
+            stop = start + self.chunk_size
+            leaf_outputs = self._leaf_outputs(X[start:stop])
+            raw[start:stop] = np.add.reduceat(leaf_outputs, self.booster_offsets[:-1], axis=1)
+        return raw
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Return the probability of every booster for every row, shape (n_rows, n_boosters).
+        """
+        return 1.0 / (1.0 + np.exp(-self.sigmoid * self.predict_raw(X)))
+
+    def predict_mean(self, X: np.ndarray) -> np.ndarray:
+        """
+        Return the soft voting probability (mean over boosters) for every row, shape (n_rows,).
+        """
+        return np.mean(self.predict(X), axis=1)
+
+    def probability_bounds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the minimum and maximum probability of every booster over all inputs, from the
+        sum of the minimum and maximum leaf outputs of its trees, shape (n_boosters,) each.
+        """
+        n_nodes = len(self.split_feature)
+        # tree of every internal node (the nodes of a tree are contiguous, from its root) and of every leaf
+        with_nodes = np.flatnonzero(self.tree_root >= 0)
+        node_tree = with_nodes[np.searchsorted(self.tree_root[with_nodes], np.arange(n_nodes), side="right") - 1]
+        leaf_tree = np.empty(len(self.leaf_value), dtype=np.int64)
+        for child in (self.left_child, self.right_child):
+            is_leaf = child < 0
+            leaf_tree[~child[is_leaf]] = node_tree[is_leaf]
+        single_leaf = np.flatnonzero(self.tree_root < 0)
+        leaf_tree[~self.tree_root[single_leaf]] = single_leaf
+
+        tree_min = np.full(self.n_trees, np.inf)
+        tree_max = np.full(self.n_trees, -np.inf)
+        np.minimum.at(tree_min, leaf_tree, self.leaf_value)
+        np.maximum.at(tree_max, leaf_tree, self.leaf_value)
+        raw_min = np.add.reduceat(tree_min, self.booster_offsets[:-1])
+        raw_max = np.add.reduceat(tree_max, self.booster_offsets[:-1])
+        # a negative sigmoid parameter swaps the bounds
+        p_a = 1.0 / (1.0 + np.exp(-self.sigmoid * raw_min))
+        p_b = 1.0 / (1.0 + np.exp(-self.sigmoid * raw_max))
+        return np.minimum(p_a, p_b), np.maximum(p_a, p_b)
+
+    def _early_exit_plan(self, step: int) -> dict:
+        """
+        Order of evaluation of the boosters for `predict_mean_early_exit`: by decreasing width of their
+        probability bounds (ties by index), in steps of `step` boosters, with the bounds on the sum of
+        the probabilities of the boosters not evaluated before each step.
+        """
+        plan = self._early_exit_plans.get(step)
+        if plan is not None:
+            return plan
+        p_min, p_max = self.probability_bounds()
+        order = np.argsort(-(p_max - p_min), kind="stable")
+        steps = []
+        for start in range(0, self.n_boosters, step):
+            boosters = np.sort(order[start:start + step])
+            trees = [np.arange(self.booster_offsets[b], self.booster_offsets[b + 1]) for b in boosters]
+            steps.append({
+                "boosters": boosters,
+                "tree_root": self.tree_root[np.concatenate(trees)],
+                "offsets": np.cumsum([0] + [len(t) for t in trees[:-1]]),
+            })
+        # rest_min[k] / rest_max[k]: bounds on the sum over the boosters of steps k, k + 1, ...
+        step_min = np.array([p_min[s["boosters"]].sum() for s in steps] + [0.0])
+        step_max = np.array([p_max[s["boosters"]].sum() for s in steps] + [0.0])
+        plan = {
+            "steps": steps,
+            "rest_min": np.cumsum(step_min[::-1])[::-1],
+            "rest_max": np.cumsum(step_max[::-1])[::-1],
+        }
+        self._early_exit_plans[step] = plan
+        return plan
+
+    def predict_mean_early_exit(
+        self,
+        X: np.ndarray,
+        decided: Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray],
+        step: int = 25
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Soft voting probability of every row, evaluating the boosters `step` at a time (widest
+        probability bounds first) and stopping for a row as soon as its result is decided.
+
+        Before each step, `decided(rows, lower, upper)` is called with the indices of the rows still
+        evaluated and guaranteed bounds on their soft voting probability, and returns a boolean array
+        of the rows whose result cannot change within those bounds. A row evaluated on every booster
+        gets the same probability as `predict_mean`; a row decided earlier gets the estimate of the
+        evaluated boosters plus the midpoint of the bounds of the others (within the bounds).
+
+        :return: (probability, number of boosters evaluated) of every row, shape (n_rows,) each.
+        """
+        if step < 1:
+            raise ValueError(f"step must be >= 1, got {step}.")
+        X = self._check_input(X)
+        plan = self._early_exit_plan(step)
+        n_rows = X.shape[0]
+        n_boosters = self.n_boosters
+        proba = np.zeros((n_rows, n_boosters), dtype=np.float64)
+        result = np.empty(n_rows, dtype=np.float64)
+        evaluated_sum = np.zeros(n_rows, dtype=np.float64)
+        n_evaluated = np.zeros(n_rows, dtype=np.int64)
+        active = np.arange(n_rows)
+        for k, step_plan in enumerate(plan["steps"]):
+            lower = (evaluated_sum[active] + plan["rest_min"][k]) / n_boosters
+            upper = (evaluated_sum[active] + plan["rest_max"][k]) / n_boosters
+            done = np.asarray(decided(active, lower, upper), dtype=bool)
+            result[active[done]] = (lower[done] + upper[done]) / 2
+            active = active[~done]
+            if active.size == 0:
+                return result, n_evaluated
+
+            boosters = step_plan["boosters"]
+            for start in range(0, active.size, self.chunk_size):
+                rows = active[start:start + self.chunk_size]
+                leaf_outputs = self._leaf_outputs(X[rows], step_plan["tree_root"])
+                raw = np.add.reduceat(leaf_outputs, step_plan["offsets"], axis=1)
+                p = 1.0 / (1.0 + np.exp(-self.sigmoid[boosters] * raw))
+                proba[np.ix_(rows, boosters)] = p
+                evaluated_sum[rows] += p.sum(axis=1)
+            n_evaluated[active] += len(boosters)
+
+        # every booster evaluated: same mean (same values and order) as predict_mean
+        result[active] = np.mean(proba[active], axis=1)
+        return result, n_evaluated
+
+
+if __name__ == "__main__":
+    # Check the ensemble against lightgbm on random inputs
+    import glob
+    import lightgbm as lgb
+
+    paths = sorted(glob.glob("models/lgb/*.txt"))
+    ensemble = LGBEnsemble.from_model_files(paths)
+    boosters = [lgb.Booster(model_file=path) for path in paths]
+
+    rng = np.random.default_rng(0)
+    X = rng.uniform(-0.5, 1.5, size=(64, ensemble.n_features))
+    X[rng.uniform(size=X.shape) < 0.05] = np.nan
+    expected = np.mean([booster.predict(X) for booster in boosters], axis=0)
+    actual = ensemble.predict_mean(X)
+    print(f"boosters={ensemble.n_boosters}, trees={ensemble.n_trees}, max abs diff={np.max(np.abs(actual - expected)):.3e}")
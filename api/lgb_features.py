@@ -0,0 +1,120 @@
+import numpy as np
+from typing import Sequence, Tuple, Union
+
+
+class LGBFeatureTransform:
+    """
+    Fused scaler transform and SANITIZER selection of the LightGBM input.
+
+    The LightGBM input has 57 columns: 7 behavior features, 2 datetime features, 16 usage
+    features (8 daytime, 8 midnight) and 32 interactions (datetime x usage, row-major as
+    `np.outer`), of which the models only use the SANITIZER columns. From the 25 base
+    features (behavior, datetime, usage), `transform` computes only the used columns (an
+    interaction as the product of its two base features) and scales them with the `scale_`
+    and `min_` of the MinMaxScaler for those columns, with the same float64 operations as
+    `MinMaxScaler.transform`, so the result is identical to `transform(X)[:, SANITIZER]`.
+    """
+
+    N_BEHAVIOR = 7
+    N_DATETIME = 2
+    N_USAGE = 16
+    N_BASE = N_BEHAVIOR + N_DATETIME + N_USAGE
+    N_FEATURES = N_BASE + N_DATETIME * N_USAGE
+
+    def __init__(
+        self,
+        columns: Sequence[int],
+        scale: np.ndarray,
+        min_: np.ndarray,
+        clip_range: Union[Tuple[float, float], None] = None
+    ):
+        """
+        :param columns: Used columns of the 57-column input, in the order of the model features.
+        :param scale: `scale_` of the scaler for those columns.
+        :param min_: `min_` of the scaler for those columns.
+        :param clip_range: Feature range to clip to (the scaler's `feature_range` if `clip`), or None.
+        """
+        self.columns = np.asarray(columns, dtype=np.int64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.min_ = np.asarray(min_, dtype=np.float64)
+        self.clip_range = clip_range
+        # each used column as the product of two columns of the base features extended with a column of ones
+        factors = np.array([self.factor_indices(column) for column in self.columns], dtype=np.int64).reshape(-1, 2)
+        self._left = factors[:, 0]
+        self._right = factors[:, 1]
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    @classmethod
+    def from_scaler(cls, scaler, sanitizer: Sequence[bool]) -> "LGBFeatureTransform":
+        """
+        Extract the `scale_` and `min_` of the used columns from a fitted MinMaxScaler.
+        """
+        if not (hasattr(scaler, "scale_") and hasattr(scaler, "min_")):
+            raise TypeError(f"Expected a fitted MinMaxScaler, got {type(scaler).__name__}.")
+        if len(sanitizer) != cls.N_FEATURES or len(scaler.scale_) != cls.N_FEATURES:
+            raise ValueError(
+                f"Expected {cls.N_FEATURES} features, got sanitizer of {len(sanitizer)} and scaler of {len(scaler.scale_)}."
+            )
+        columns = np.flatnonzero(np.asarray(sanitizer, dtype=bool))
+        clip_range = tuple(scaler.feature_range) if getattr(scaler, "clip", False) else None
+        return cls(columns, np.asarray(scaler.scale_)[columns], np.asarray(scaler.min_)[columns], clip_range)
+
+    @classmethod
+    def factor_indices(cls, column: int) -> Tuple[int, int]:
+        """
+        (left, right) indices of a column of the 57-column input in the base features extended
+        with a column of ones (index N_BASE): the column is base[left] * base[right].
+        """
+        if column < cls.N_BASE:
+            return int(column), cls.N_BASE
+        if column >= cls.N_FEATURES:
+            raise ValueError(f"column must be < {cls.N_FEATURES}, got {column}.")
+        datetime_index, usage_index = divmod(column - cls.N_BASE, cls.N_USAGE)
+        return cls.N_BEHAVIOR + datetime_index, cls.N_BEHAVIOR + cls.N_DATETIME + usage_index
+
+    @classmethod
+    def base_features(
+        cls, age: int, sex: int, edu: int, solo: int, array_datetime: np.ndarray, array_daytime: np.ndarray,
+        array_midnight: np.ndarray
+    ) -> np.ndarray:
+        """
+        The 25 base features: behavior (age, sex_1, sex_2, edu_0, edu_1, solo_0, solo_1), datetime and usage.
+        """
+        array_behavior = np.array([age, sex == 1, sex == 2, edu > 9, edu <= 9, solo == 0, solo == 1])
+        return np.hstack([array_behavior, array_datetime, array_daytime, array_midnight]).astype(np.float64)
+
+    @classmethod
+    def full_features(cls, base: np.ndarray) -> np.ndarray:
+        """
+        The 57-column input (base features and every interaction) of base feature rows.
+        """
+        base = np.atleast_2d(base)
+        array_datetime = base[:, cls.N_BEHAVIOR:cls.N_BEHAVIOR + cls.N_DATETIME]
+        elec_total = base[:, cls.N_BEHAVIOR + cls.N_DATETIME:cls.N_BASE]
+        interactions = (array_datetime[:, :, None] * elec_total[:, None, :]).reshape(len(base), -1)
+        return np.hstack([base, interactions])
+
+    def transform(self, base: np.ndarray) -> np.ndarray:
+        """
+        Scaled used features (n_rows, len(self)) of base feature rows (n_rows, N_BASE) or one row.
+        """
+        base = np.atleast_2d(np.asarray(base, dtype=np.float64))
+        extended = np.hstack([base, np.ones((len(base), 1))])
+        return self._scale(extended[:, self._left] * extended[:, self._right])
+
+    def transform_full(self, X: np.ndarray) -> np.ndarray:
+        """
+        Scaled used features of 57-column input rows (same as the scaler transform and SANITIZER).
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        return self._scale(X[:, self.columns])
+
+    def _scale(self, X: np.ndarray) -> np.ndarray:
+        # same operations as MinMaxScaler.transform
+        X *= self.scale
+        X += self.min_
+        if self.clip_range is not None:
+            np.clip(X, self.clip_range[0], self.clip_range[1], out=X)
+        return X
@@ -0,0 +1,126 @@
+import numpy as np
+from functools import lru_cache
+from typing import List, Tuple
+
+
+class LogisticEnsemble:
+    """
+    Stacked representation of an ensemble of binary sklearn LogisticRegression models.
+
+    The coefficients of all models are stacked into one (n_features, n_models) matrix,
+    so the probabilities of every model are computed with one matmul. Single-row
+    predictions are memoized on the discretized (age, sex, edu_bin, solo) input.
+    """
+    DEFAULT_CACHE_SIZE = 1024
+    # Maximum absolute difference from the per-model predict_proba accepted by `verify_equivalence`
+    EQUIVALENCE_TOLERANCE = 1e-9
+
+    def __init__(self, scaler, coef: np.ndarray, intercept: np.ndarray, cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        :param scaler: Fitted scaler applied to the (age, sex, edu_bin, solo) input.
+        :param coef: Stacked coefficients, shape (n_models, n_features).
+        :param intercept: Stacked intercepts, shape (n_models,).
+        :param cache_size: Maximum number of memoized inputs.
+        """
+        self.scaler = scaler
+        self.coef_T = np.ascontiguousarray(np.asarray(coef, dtype=np.float64).T)
+        self.intercept = np.ascontiguousarray(intercept, dtype=np.float64)
+        self.predict_one = lru_cache(maxsize=cache_size)(self._predict_one)
+
+    def __len__(self) -> int:
+        return len(self.intercept)
+
+    @classmethod
+    def from_models(cls, scaler, models: list, cache_size: int = DEFAULT_CACHE_SIZE) -> "LogisticEnsemble":
+        """
+        Stack fitted binary LogisticRegression models.
+
+        Models fitted with multi_class="multinomial" are rejected: their binary probability
+        is sigmoid(2 * decision), not the sigmoid(decision) computed here.
+        """
+        if len(models) == 0:
+            raise ValueError("No models to build the ensemble from.")
+        for model in models:
+            if model.coef_.shape[0] != 1 or len(model.classes_) != 2:
+                raise ValueError(f"Only binary models are supported: classes={model.classes_}")
+            if getattr(model, "multi_class", "auto") == "multinomial":
+                raise ValueError("Models fitted with multi_class='multinomial' are not supported.")
+        coef = np.vstack([model.coef_ for model in models])
+        intercept = np.hstack([model.intercept_ for model in models])
+        return cls(scaler, coef, intercept, cache_size)
+
+    def predict_proba_models(self, X: np.ndarray) -> np.ndarray:
+        """
+        Return the positive class probability of every model for every row, shape (n_rows, n_models).
+
+        :param X: Unscaled (age, sex, edu_bin, solo) rows.
+        """
+        X_scaled = self.scaler.transform(np.asarray(X, dtype=np.float64).reshape(-1, self.coef_T.shape[0]))
+        decision = X_scaled @ self.coef_T + self.intercept
+        return 1.0 / (1.0 + np.exp(-decision))
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        Return the soft voting probability (mean over models) for every row, shape (n_rows,).
+        """
+        return np.mean(self.predict_proba_models(X), axis=1)
+
+    def _predict_one(self, age: int, sex: int, edu_bin: int, solo: int) -> float:
+        return float(self.predict_batch(np.array([[age, sex, edu_bin, solo]]))[0])
+
+    def cache_info(self):
+        return self.predict_one.cache_info()
+
+    def cache_clear(self) -> None:
+        self.predict_one.cache_clear()
+
+
+def check_equivalence(scaler, models: list, X: np.ndarray) -> Tuple[float, float]:
+    """
+    Compare the stacked ensemble with the per-model `predict_proba` loop.
+
+    :param X: Unscaled (age, sex, edu_bin, solo) rows.
+    :return: Maximum absolute difference of the mean probabilities for the batch and the memoized path.
+    """
+    ensemble = LogisticEnsemble.from_models(scaler, models)
+    X_scaled = scaler.transform(X)
+    expected = np.mean([model.predict_proba(X_scaled)[:, 1] for model in models], axis=0)
+    batch_diff = float(np.max(np.abs(ensemble.predict_batch(X) - expected)))
+    memoized = np.array([ensemble.predict_one(*(int(v) for v in row)) for row in X])
+    memoized_diff = float(np.max(np.abs(memoized - expected)))
+    return batch_diff, memoized_diff
+
+
+def verify_equivalence(scaler, models: list) -> None:
+    """
+    Raise ValueError if the stacked ensemble differs from the per-model `predict_proba` loop
+    by more than `LogisticEnsemble.EQUIVALENCE_TOLERANCE` on the demographic grid.
+    """
+    batch_diff, memoized_diff = check_equivalence(scaler, models, demographic_grid(list(range(40, 111))))
+    if max(batch_diff, memoized_diff) > LogisticEnsemble.EQUIVALENCE_TOLERANCE:
+        raise ValueError(
+            f"Stacked Logistic Regression ensemble differs from the models: "
+            f"max abs diff batch={batch_diff:.3e}, memoized={memoized_diff:.3e}"
+        )
+
+
+def demographic_grid(ages: List[int]) -> np.ndarray:
+    """
+    Return every (age, sex, edu_bin, solo) combination for the given ages.
+    """
+    return np.array([[age, sex, edu_bin, solo] for age in ages for sex in (1, 2) for edu_bin in (0, 1) for solo in (0, 1)])
+
+
+if __name__ == "__main__":
+    import glob
+    import pickle
+
+    with open("scaler/logi_scaler.pickle", mode="rb") as f:
+        scaler = pickle.load(f)
+    models = []
+    for path in sorted(glob.glob("models/logistic/*.pkl")):
+        with open(path, mode="rb") as f:
+            models.append(pickle.load(f))
+
+    batch_diff, memoized_diff = check_equivalence(scaler, models, demographic_grid(list(range(40, 111))))
+    print(f"models={len(models)}, max abs diff: batch={batch_diff:.3e}, memoized={memoized_diff:.3e}")
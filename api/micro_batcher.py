@@ -0,0 +1,139 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Union
+
+from stage_metrics import StageMetrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent requests into batches for one call of a batch function.
+
+    `submit` queues a record and returns a Future. A worker thread takes the first queued
+    record, waits at most `max_wait` seconds for more (up to `max_batch_size` records), calls
+    `batch_func(records)` once for the batch and resolves each Future with the result at the
+    same index (or with the exception of the call). Batches are processed one at a time, in
+    the order of submission.
+
+    If `metrics` is given, the wait of each record in the queue is recorded as the stage
+    "queue_wait" and the duration of each batch call as "batch".
+    """
+
+    def __init__(
+        self,
+        batch_func: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait: float = 0.01,
+        metrics: Union[StageMetrics, None] = None,
+        name: str = "micro-batcher"
+    ):
+        """
+        :param batch_func: Function of a list of records returning the list of their results.
+        :param max_batch_size: Maximum number of records per batch.
+        :param max_wait: Maximum time in seconds a batch waits for more records after its first one.
+        :param metrics: Metrics recording the queue wait and batch durations.
+        :param name: Name of the worker thread.
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be >= 1, got {max_batch_size}.")
+        if max_wait < 0:
+            raise ValueError(f"max_wait must be >= 0, got {max_wait}.")
+        self.batch_func = batch_func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"records": 0, "batches": 0, "failed_batches": 0, "max_batch_size": 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, record: Any) -> Future:
+        """
+        Queue a record and return the Future of its result.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed.")
+            self._queue.put((record, future, time.perf_counter()))
+        return future
+
+    def pending(self) -> int:
+        """
+        Number of records waiting for a batch (approximate).
+        """
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Number of records, batches and failed batches, mean and maximum batch size.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["mean_batch_size"] = stats["records"] / stats["batches"] if stats["batches"] else 0.0
+        stats["pending"] = self.pending()
+        return stats
+
+    def close(self, timeout: Union[float, None] = None) -> None:
+        """
+        Stop accepting records, process the queued ones and stop the worker thread.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        closing = False
+        while not closing:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            self._process(batch)
+
+    def _process(self, batch: list) -> None:
+        started = time.perf_counter()
+        if self.metrics is not None:
+            for _, _, queued_at in batch:
+                self.metrics.observe("queue_wait", started - queued_at)
+        failed = False
+        try:
+            results = self.batch_func([record for record, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"batch_func returned {len(results)} results for {len(batch)} records.")
+        except Exception as e:
+            logger.exception(f"Batch of {len(batch)} records failed")
+            failed = True
+            for _, future, _ in batch:
+                future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+        if self.metrics is not None:
+            self.metrics.observe("batch", time.perf_counter() - started)
+        with self._lock:
+            self._stats["records"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["failed_batches"] += int(failed)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
@@ -0,0 +1,259 @@
+import datetime
+import glob
+import hashlib
+import json
+import os
+import pickle
+import re
+import struct
+import numpy as np
+from typing import Dict, List, Union
+
+from lgb_ensemble import LGBEnsemble, parse_model_file
+from logistic_ensemble import LogisticEnsemble, verify_equivalence
+
+
+# File layout: MAGIC | format version (uint32 LE) | header length (uint32 LE) | JSON header | padding | arrays.
+# Every array starts at a multiple of ALIGNMENT from the start of the payload (the first array), so the
+# arrays are used in place from a read-only memory map.
+MAGIC = b"MCIBNDL\x00"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<8sII")
+
+# (name in the bundle, attribute of MinMaxScaler)
+_SCALER_ARRAYS = ("scale_", "min_", "data_min_", "data_max_", "data_range_")
+_LGB_ARRAYS = (
+    "split_feature", "threshold", "decision_type", "left_child", "right_child",
+    "leaf_value", "tree_root", "booster_offsets", "sigmoid"
+)
+
+
+def sorted_model_paths(pattern: str) -> List[str]:
+    """
+    Model file paths matching `pattern`, sorted by the model index in the file name (booster_10.txt -> 10).
+    """
+    def key(path: str):
+        match = re.search(r"(\d+)(?=\.[^.]*$)", os.path.basename(path))
+        return (0, int(match.group(1)), path) if match else (1, 0, path)
+    return sorted(glob.glob(pattern), key=key)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def source_checksum(paths: List[str]) -> str:
+    """
+    Checksum of model and scaler files (sha256 over the file names and contents, in the given order).
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, mode="rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def _load_pickle(path: str):
+    with open(path, mode="rb") as f:
+        return pickle.load(f)
+
+
+def build_bundle(
+    output_path: str,
+    lgb_model_paths: List[str],
+    logi_model_paths: List[str],
+    lgb_scaler_path: str,
+    logi_scaler_path: str,
+    bundle_version: Union[str, None] = None
+) -> Dict:
+    """
+    Compile the LightGBM models, the Logistic Regression models and the two scalers into one bundle file.
+
+    :param lgb_model_paths: LightGBM text model files, in ensemble order.
+    :param logi_model_paths: Pickled LogisticRegression models, in ensemble order.
+    :param bundle_version: Version string stored in the bundle (default: prefix of the source checksum).
+    :return: The header written to the bundle.
+    """
+    source_paths = list(lgb_model_paths) + list(logi_model_paths) + [lgb_scaler_path, logi_scaler_path]
+    source_sha256 = source_checksum(source_paths)
+
+    arrays = {}
+    ensemble = LGBEnsemble.from_parsed_models([parse_model_file(path) for path in lgb_model_paths])
+    lgb_arrays = {
+        "split_feature": ensemble.split_feature,
+        "threshold": ensemble.threshold,
+        "decision_type": ensemble.decision_type,
+        "left_child": ensemble.left_child,
+        "right_child": ensemble.right_child,
+        "leaf_value": ensemble.leaf_value,
+        "tree_root": ensemble.tree_root,
+        "booster_offsets": ensemble.booster_offsets,
+        "sigmoid": ensemble.sigmoid,
+    }
+    for name, array in lgb_arrays.items():
+        arrays[f"lgb/{name}"] = array
+
+    logi_models = [_load_pickle(path) for path in logi_model_paths]
+    verify_equivalence(_load_pickle(logi_scaler_path), logi_models)
+    stacked = LogisticEnsemble.from_models(None, logi_models)
+    arrays["logistic/coef"] = np.ascontiguousarray(stacked.coef_T.T)
+    arrays["logistic/intercept"] = stacked.intercept
+    arrays["logistic/classes"] = np.vstack([model.classes_ for model in logi_models])
+
+    scalers = {}
+    for name, path in (("lgb", lgb_scaler_path), ("logistic", logi_scaler_path)):
+        scaler = _load_pickle(path)
+        for attribute in _SCALER_ARRAYS:
+            arrays[f"scaler/{name}/{attribute}"] = np.asarray(getattr(scaler, attribute))
+        scalers[name] = {
+            "feature_range": list(scaler.feature_range),
+            "clip": bool(scaler.clip),
+            "n_samples_seen": int(scaler.n_samples_seen_),
+        }
+
+    table = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        table[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset, "nbytes": array.nbytes}
+        offset = _align(offset + array.nbytes)
+
+    payload = bytearray(offset)
+    for name, array in arrays.items():
+        start = table[name]["offset"]
+        payload[start:start + array.nbytes] = array.tobytes()
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "bundle_version": bundle_version or source_sha256[:12],
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "source_sha256": source_sha256,
+        "payload_sha256": hashlib.sha256(payload).hexdigest(),
+        "n_lgb_models": len(lgb_model_paths),
+        "n_logi_models": len(logi_model_paths),
+        "lgb_n_features": ensemble.n_features,
+        "scalers": scalers,
+        "arrays": table,
+    }
+    header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+    payload_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, mode="wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\x00" * (payload_start - _PREAMBLE.size - len(header_bytes)))
+        f.write(payload)
+    os.replace(tmp_path, output_path)
+    return header
+
+
+class ModelBundle:
+    """
+    Read-only view of a model bundle written by `build_bundle`.
+
+    The file is memory-mapped and the arrays are used in place, so loading does not
+    parse any model file.
+    """
+
+    def __init__(self, path: str, verify: bool = True):
+        """
+        :param path: Path of the bundle file.
+        :param verify: Check the payload checksum.
+        """
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, format_version, header_length = _PREAMBLE.unpack(bytes(self._data[:_PREAMBLE.size]))
+        if magic != MAGIC:
+            raise ValueError(f"Not a model bundle: {path}")
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported model bundle format version {format_version} in {path}, expected {FORMAT_VERSION}.")
+        self.header = json.loads(bytes(self._data[_PREAMBLE.size:_PREAMBLE.size + header_length]).decode("utf-8"))
+        self._payload = self._data[_align(_PREAMBLE.size + header_length):]
+        if verify and hashlib.sha256(self._payload).hexdigest() != self.header["payload_sha256"]:
+            raise ValueError(f"Model bundle checksum mismatch: {path}")
+
+    @property
+    def bundle_version(self) -> str:
+        return self.header["bundle_version"]
+
+    @property
+    def checksum(self) -> str:
+        """
+        Checksum of the bundle contents (sha256 of the payload).
+        """
+        return self.header["payload_sha256"]
+
+    def array(self, name: str) -> np.ndarray:
+        entry = self.header["arrays"][name]
+        start = entry["offset"]
+        buffer = self._payload[start:start + entry["nbytes"]]
+        return np.frombuffer(buffer, dtype=np.dtype(entry["dtype"])).reshape(entry["shape"])
+
+    def lgb_ensemble(self, chunk_size: int = 256) -> LGBEnsemble:
+        arrays = {name: self.array(f"lgb/{name}") for name in _LGB_ARRAYS}
+        return LGBEnsemble(n_features=self.header["lgb_n_features"], chunk_size=chunk_size, **arrays)
+
+    def scaler(self, name: str):
+        """
+        Rebuild a fitted MinMaxScaler ("lgb" or "logistic").
+        """
+        from sklearn.preprocessing import MinMaxScaler
+
+        params = self.header["scalers"][name]
+        scaler = MinMaxScaler(feature_range=tuple(params["feature_range"]), clip=params["clip"])
+        for attribute in _SCALER_ARRAYS:
+            setattr(scaler, attribute, self.array(f"scaler/{name}/{attribute}"))
+        scaler.n_features_in_ = len(scaler.scale_)
+        scaler.n_samples_seen_ = params["n_samples_seen"]
+        return scaler
+
+    def logistic_models(self) -> list:
+        """
+        Rebuild the fitted binary LogisticRegression models.
+        """
+        from sklearn.linear_model import LogisticRegression
+
+        coef = self.array("logistic/coef")
+        intercept = self.array("logistic/intercept")
+        classes = self.array("logistic/classes")
+        models = []
+        for i in range(len(intercept)):
+            model = LogisticRegression()
+            model.coef_ = coef[i:i + 1]
+            model.intercept_ = intercept[i:i + 1]
+            model.classes_ = classes[i]
+            model.n_features_in_ = coef.shape[1]
+            models.append(model)
+        return models
+
+    def logistic_ensemble(self, scaler, cache_size: int = LogisticEnsemble.DEFAULT_CACHE_SIZE) -> LogisticEnsemble:
+        return LogisticEnsemble(scaler, self.array("logistic/coef"), self.array("logistic/intercept"), cache_size)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or inspect the model bundle (run in the api directory).")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--output", default="models/model_bundle.bin", help="bundle path")
+    parser.add_argument("--lgb-models", default="models/lgb/*.txt")
+    parser.add_argument("--logi-models", default="models/logistic/*.pkl")
+    parser.add_argument("--lgb-scaler", default="scaler/lgb_scaler.pickle")
+    parser.add_argument("--logi-scaler", default="scaler/logi_scaler.pickle")
+    parser.add_argument("--bundle-version", default=None)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        header = build_bundle(
+            args.output, sorted_model_paths(args.lgb_models), sorted_model_paths(args.logi_models),
+            args.lgb_scaler, args.logi_scaler, args.bundle_version
+        )
+    else:
+        header = ModelBundle(args.output).header
+    summary = {key: value for key, value in header.items() if key != "arrays"}
+    print(json.dumps(summary, indent=2))
+    print(f"{args.output}: {os.path.getsize(args.output) / 1024 ** 2:.2f} MB")
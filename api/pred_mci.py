@@ -2,17 +2,29 @@ import os
 import pandas as pd
 import numpy as np
 import pickle
-import glob
 import datetime
 import lightgbm as lgb
-import signal
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import time
+import threading
 import logging
 from logging.handlers import RotatingFileHandler
-from typing import Union, List, Dict, Callable, Any
+from typing import Union, List, Dict, Callable, Any, Tuple
 
-from myexception import InvalidInputError, PredictionError, PredictionTimeOut, UnexpectedError, TIMEOUT, timeout_handler
+from myexception import InvalidInputError, PredictionError, PredictionTimeOut, TIMEOUT
+from deadline import check_deadline, time_limit
+from lgb_ensemble import LGBEnsemble, parse_model_file
+from lgb_features import LGBFeatureTransform
+from logistic_ensemble import LogisticEnsemble, verify_equivalence
+from model_bundle import ModelBundle, sorted_model_paths, source_checksum
+from prediction_cache import PredictionCache
+from stage_metrics import stage_timer
+from electric_data import (
+    ElectricData, ElectricDataSource, ElectricFeatureAccumulator, PackedElectricData, CSV_COLUMNS, CSV_ENGINES, day_runs,
+    read_electric_csv
+)
 
 
 # Logging configuration
@@ -62,12 +74,35 @@ class Predictor:
         False, False, False, False
     ]
 
+    # "lightgbm": evaluate each lgb.Booster, "numpy": evaluate all boosters at once with LGBEnsemble
+    LGB_BACKENDS = ("lightgbm", "numpy")
+    # "sklearn": evaluate each LogisticRegression, "stacked": one matmul with LogisticEnsemble (memoized)
+    LOGI_BACKENDS = ("sklearn", "stacked")
+    # Early exit of the LightGBM ensemble (opt-in, numpy backend): stop once the score ("score")
+    # or the side of SCORE_THRESHOLD ("decision") cannot change
+    EARLY_EXIT_MODES = ("score", "decision")
+    # Soft voting probability above which the score is 47 or more (see _score)
+    SCORE_THRESHOLD = 0.467
+    # Margin of the early exit bounds against floating point rounding
+    EARLY_EXIT_MARGIN = 1e-9
+
     def __init__(
         self, 
         lgb_models_dir_path: str,
         logi_models_dir_path: str,
         lgb_scaler_path: str,
-        logi_scaler_path: str
+        logi_scaler_path: str,
+        lgb_backend: str = "lightgbm",
+        logi_backend: str = "sklearn",
+        csv_engine: str = "c",
+        model_bundle_path: Union[str, None] = None,
+        load_workers: int = 1,
+        timeout: float = TIMEOUT,
+        prediction_cache_size: int = 0,
+        prediction_cache_path: Union[str, None] = None,
+        early_exit: Union[str, None] = None,
+        early_exit_step: int = 25,
+        batch_timeout: Union[float, None] = None
     ):
         """
         Initialize the Predictor with model and scaler paths.
@@ -76,15 +111,170 @@ class Predictor:
         :param logi_models_dir_path: Directory path for Logistic Regression models.
         :param lgb_scaler_path: Path to the LightGBM scaler.
         :param logi_scaler_path: Path to the Logistic Regression scaler.
+        :param lgb_backend: Backend for the LightGBM ensemble, "lightgbm" or "numpy".
+        :param logi_backend: Backend for the Logistic Regression ensemble, "sklearn" or "stacked".
+        :param csv_engine: Parser for electric data CSV files, "c" or "pyarrow" (see electric_data.read_electric_csv).
+        :param model_bundle_path: Model bundle built by model_bundle.py. If given, the models and scalers are
+                                  loaded from the bundle (the model and scaler paths are ignored) and
+                                  lgb_backend must be "numpy".
+        :param load_workers: Number of threads loading the model files. The models are ordered by
+                             the model index in their file names whatever the number of threads.
+                             The load time of each phase is kept in `load_timings` (seconds).
+        :param timeout: Time budget in seconds (may be fractional) of each prediction stage
+                        (LightGBM including the electric data loading, and Logistic Regression).
+                        A stage over budget gives status code 400. See deadline.py.
+        :param prediction_cache_size: Maximum number of memoized (LightGBM, Logistic Regression) probabilities
+                                      (0: no memoization). See prediction_cache.py.
+        :param prediction_cache_path: SQLite database file persisting the memoized probabilities
+                                      (requires prediction_cache_size >= 1).
+        :param early_exit: None (exact, all boosters), "score" or "decision". Evaluate the LightGBM boosters
+                           `early_exit_step` at a time and stop once the bounds on the remaining boosters
+                           (from their minimum and maximum leaf outputs) guarantee the score ("score", same
+                           score as exact) or the side of SCORE_THRESHOLD ("decision", the score is an
+                           estimate on the right side). Requires lgb_backend "numpy"; not used with debug.
+                           See LGBEnsemble.predict_mean_early_exit and `early_exit_info`.
+        :param early_exit_step: Number of boosters evaluated between two checks of the bounds.
+        :param batch_timeout: Time budget in seconds of each model stage of `calculate_scores_batch` for the
+                              whole batch (None: `timeout` times the number of records predicted). If a
+                              batch is over budget, its records are predicted again one at a time, each
+                              with its own `timeout`.
         """
+        if lgb_backend not in self.LGB_BACKENDS:
+            raise ValueError(f"Invalid lgb_backend: {lgb_backend}. Expected one of {self.LGB_BACKENDS}.")
+        if logi_backend not in self.LOGI_BACKENDS:
+            raise ValueError(f"Invalid logi_backend: {logi_backend}. Expected one of {self.LOGI_BACKENDS}.")
+        if csv_engine not in CSV_ENGINES:
+            raise ValueError(f"Invalid csv_engine: {csv_engine}. Expected one of {CSV_ENGINES}.")
+        self.lgb_backend = lgb_backend
+        self.logi_backend = logi_backend
+        self.csv_engine = csv_engine
+        if load_workers < 1:
+            raise ValueError(f"load_workers must be >= 1, got {load_workers}.")
+        self.load_workers = load_workers
+        self.load_timings = {}
+        if not timeout > 0:
+            raise ValueError(f"timeout must be > 0, got {timeout}.")
+        self.timeout = timeout
+        if batch_timeout is not None and not batch_timeout > 0:
+            raise ValueError(f"batch_timeout must be > 0 or None, got {batch_timeout}.")
+        self.batch_timeout = batch_timeout
+        if prediction_cache_size < 0:
+            raise ValueError(f"prediction_cache_size must be >= 0, got {prediction_cache_size}.")
+        if prediction_cache_path is not None and prediction_cache_size == 0:
+            raise ValueError("prediction_cache_path requires prediction_cache_size >= 1.")
+        self.prediction_cache = None
+        if early_exit is not None and early_exit not in self.EARLY_EXIT_MODES:
+            raise ValueError(f"Invalid early_exit: {early_exit}. Expected None or one of {self.EARLY_EXIT_MODES}.")
+        if early_exit is not None and lgb_backend != "numpy":
+            raise ValueError(f"early_exit requires lgb_backend='numpy', got {lgb_backend}.")
+        if early_exit_step < 1:
+            raise ValueError(f"early_exit_step must be >= 1, got {early_exit_step}.")
+        self.early_exit = early_exit
+        self.early_exit_step = early_exit_step
+        self._early_exit_lock = threading.Lock()
+        self._early_exit_stats = {"rows": 0, "exited": 0, "boosters": 0}
+
+        if model_bundle_path is not None:
+            if lgb_backend != "numpy":
+                raise ValueError(f"model_bundle_path requires lgb_backend='numpy', got {lgb_backend}.")
+            with self._load_phase("model_bundle"):
+                self._load_model_bundle(model_bundle_path)
+            if prediction_cache_size > 0:
+                self.prediction_cache = PredictionCache(
+                    self._model_version(self.model_bundle.header["source_sha256"]),
+                    prediction_cache_size, prediction_cache_path
+                )
+            return
 
         # scaler
-        self.lgb_scaler = self._get_scaler(lgb_scaler_path)
-        self.logi_scaler = self._get_scaler(logi_scaler_path)
+        with self._load_phase("scalers"):
+            self.lgb_scaler = self._get_scaler(lgb_scaler_path)
+            self.logi_scaler = self._get_scaler(logi_scaler_path)
+            self.lgb_transform = LGBFeatureTransform.from_scaler(self.lgb_scaler, self.SANITIZER)
 
         # models
-        self.lgb_models = self._load_models(lgb_models_dir_path, lambda path: lgb.Booster(model_file=path), 500)
-        self.logi_models = self._load_models(logi_models_dir_path, lambda path: pickle.load(open(path, 'rb')), 50)
+        with self._load_phase("lgb_models"):
+            if self.lgb_backend == "numpy":
+                self.lgb_models = LGBEnsemble.from_parsed_models(
+                    self._load_models(lgb_models_dir_path, parse_model_file, 500)
+                )
+            else:
+                self.lgb_models = self._load_models(lgb_models_dir_path, lambda path: lgb.Booster(model_file=path), 500)
+        with self._load_phase("logi_models"):
+            self.logi_models = self._load_models(logi_models_dir_path, self._load_pickle, 50)
+            if self.logi_backend == "stacked":
+                verify_equivalence(self.logi_scaler, self.logi_models)
+                self.logi_models = LogisticEnsemble.from_models(self.logi_scaler, self.logi_models)
+
+        if prediction_cache_size > 0:
+            # same checksum as the source_sha256 of a bundle built from these files
+            checksum = source_checksum(
+                sorted_model_paths(lgb_models_dir_path) + sorted_model_paths(logi_models_dir_path)
+                + [lgb_scaler_path, logi_scaler_path]
+            )
+            self.prediction_cache = PredictionCache(
+                self._model_version(checksum), prediction_cache_size, prediction_cache_path
+            )
+
+    @contextmanager
+    def _load_phase(self, phase: str):
+        """
+        Record the time spent in a loading phase in `load_timings`.
+        """
+        start = time.perf_counter()
+        yield
+        self.load_timings[phase] = time.perf_counter() - start
+
+    def _load_model_bundle(self, path: str) -> None:
+        """
+        Load the scalers and models from a model bundle, without parsing the model files.
+        """
+        try:
+            bundle = ModelBundle(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Model bundle not found: {path}. Please build it with model_bundle.py.")
+        for key, expected_count in (("n_lgb_models", 500), ("n_logi_models", 50)):
+            if bundle.header[key] != expected_count:
+                raise ValueError(f"Requested number of models ({expected_count}) does not match the number of models in the bundle ({bundle.header[key]}).")
+
+        self.model_bundle = bundle
+        self.lgb_scaler = bundle.scaler("lgb")
+        self.logi_scaler = bundle.scaler("logistic")
+        self.lgb_transform = LGBFeatureTransform.from_scaler(self.lgb_scaler, self.SANITIZER)
+        self.lgb_models = bundle.lgb_ensemble()
+        if self.logi_backend == "stacked":
+            self.logi_models = bundle.logistic_ensemble(self.logi_scaler)
+        else:
+            self.logi_models = bundle.logistic_models()
+
+    def _model_version(self, checksum: str) -> str:
+        """
+        Version of the models for the prediction cache: checksum of the model and scaler files and the backends.
+        """
+        return f"{checksum}/{self.lgb_backend}/{self.logi_backend}"
+
+    def prediction_cache_info(self) -> Union[Dict[str, Union[int, float, str, None]], None]:
+        """
+        Hit and miss counts and hit rate of the prediction cache (None if disabled).
+        """
+        return self.prediction_cache.info() if self.prediction_cache is not None else None
+
+    def early_exit_info(self) -> Union[Dict[str, Union[int, float, str]], None]:
+        """
+        Number of houses predicted with early exit, of those stopped before the last booster and
+        mean number of boosters evaluated per house (None if disabled).
+        """
+        if self.early_exit is None:
+            return None
+        with self._early_exit_lock:
+            stats = dict(self._early_exit_stats)
+        return {
+            "mode": self.early_exit,
+            "rows": stats["rows"],
+            "exited": stats["exited"],
+            "mean_boosters": stats["boosters"] / stats["rows"] if stats["rows"] else 0.0,
+            "n_boosters": self.lgb_models.n_boosters,
+        }
 
     @staticmethod
     def _get_current_datetime() -> datetime.datetime:
@@ -96,9 +286,9 @@ class Predictor:
     @staticmethod
     def _get_models_paths(path: str, n: Union[int, None] = None) -> List[str]:
         """
-        Get the list of model file paths.
+        Get the list of model file paths, sorted by the model index in the file names.
         """
-        models_path_lst = glob.glob(path)
+        models_path_lst = sorted_model_paths(path)
         if n is not None:
             if n != len(models_path_lst):
                 raise ValueError(f"Requested number of models ({n}) does not match the number of available models ({len(models_path_lst)}).")
@@ -116,9 +306,21 @@ class Predictor:
         except FileNotFoundError as e:
             raise FileNotFoundError(f"Scaler file not found: {path}. Please ensure the scaler file exists.")
 
+    @staticmethod
+    def _load_pickle(path: str) -> Any:
+        with open(path, mode='rb') as f:
+            return pickle.load(f)
+
     def _load_models(self, dir_path: str, loader_func: Callable, expected_count: int) -> list:
+        """
+        Load the model files matching `dir_path` with `loader_func`, on `load_workers` threads.
+        The models keep the order of `_get_models_paths`.
+        """
         paths = self._get_models_paths(dir_path, expected_count)
-        return [loader_func(path) for path in paths]
+        if self.load_workers == 1 or len(paths) <= 1:
+            return [loader_func(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=min(self.load_workers, len(paths))) as executor:
+            return list(executor.map(loader_func, paths))
 
     @staticmethod
     def _datetime_encode(d: datetime.datetime) -> List[float]:
@@ -130,6 +332,35 @@ class Predictor:
         sin_day_of_year = np.sin(2 * np.pi * day_of_year / 365)
         return [cos_day_of_year, sin_day_of_year]
 
+    @classmethod
+    def _datetime_features(cls, date_time_jst: np.ndarray) -> np.ndarray:
+        """Sum the `_datetime_encode` features over all rows.
+
+        Every minute of a day shares one value, so `_datetime_encode` is called once per run of
+        rows on the same day and the values are repeated by the run lengths. The repeated array
+        is identical to encoding every row, so the sum matches the per-row encoding exactly.
+
+        Args:
+            date_time_jst (np.ndarray): datetime64 array of the rows
+        Returns:
+            np.ndarray: [sum of cos_day_of_year, sum of sin_day_of_year]
+        """
+        return cls._datetime_features_from_runs(*day_runs(date_time_jst))
+
+    @classmethod
+    def _datetime_features_from_runs(cls, run_days: np.ndarray, run_lengths: np.ndarray) -> np.ndarray:
+        """Sum the `_datetime_encode` features over runs of rows on the same day (see `_datetime_features`).
+
+        Args:
+            run_days (np.ndarray): datetime64[D] array, the day of each run
+            run_lengths (np.ndarray): number of rows of each run
+        Returns:
+            np.ndarray: [sum of cos_day_of_year, sum of sin_day_of_year]
+        """
+        run_days = run_days.astype("datetime64[s]").astype(datetime.datetime)
+        run_values = np.array([cls._datetime_encode(d) for d in run_days]).reshape(-1, 2)
+        return np.sum(np.repeat(run_values, run_lengths, axis=0), axis=0)
+
     def _divide_array(self, array:np.ndarray, nighttime_hour_0=5, nighttime_hour_1=2) -> tuple[np.ndarray, np.ndarray]:
         """arrayを日中帯と深夜帯のそれぞれに分割し返す関数
 
@@ -153,51 +384,55 @@ class Predictor:
         # 22:00〜23:59 (28, 120, 13)
         array_midnight_1 = array[:, -1 * nighttime_hour_1 * 60:, :]
 
-        # midnight_0とmidnight_1をあわせて整形
-        array_midnight = np.concatenate([array_midnight_0, array_midnight_1], axis=1)
-        array_midnight = array_midnight.reshape(self.N_DAY_ELECTRIC_DATA * (nighttime_hour_0 * 60 + nighttime_hour_1 * 60), channels)
-
-        # daytimeを整形
-        daytime_minutes = (24 - nighttime_hour_0 - nighttime_hour_1) * 60
-        array_daytime = array_daytime.reshape(self.N_DAY_ELECTRIC_DATA * daytime_minutes, channels)
-
-        array_daytime_usage_time = np.sum(array_daytime > 0, axis=0)
-        array_midnight_usage_time = np.sum(array_midnight > 0, axis=0)
+        # 日・分の軸で集計（midnight_0とmidnight_1は連結せずに合計する）
+        array_daytime_usage_time = np.sum(array_daytime > 0, axis=(0, 1))
+        array_midnight_usage_time = np.sum(array_midnight_0 > 0, axis=(0, 1)) + np.sum(array_midnight_1 > 0, axis=(0, 1))
 
         return array_daytime_usage_time, array_midnight_usage_time
     
-    def _load_data(self, csv_path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    def _get_electric_data(
+        self, csv_path: ElectricDataSource
+    ) -> Union[ElectricData, PackedElectricData, ElectricFeatureAccumulator]:
         """
-        Load data from a CSV file and preprocess it.
+        Get the electric data from a CSV file path or in-memory data in the CSV format.
+        Packed data and accumulated features are returned as is.
         """
+        if isinstance(csv_path, (ElectricData, PackedElectricData, ElectricFeatureAccumulator)):
+            electric_data = csv_path
+        elif isinstance(csv_path, (pd.DataFrame, np.ndarray, list)):
+            df = csv_path if isinstance(csv_path, pd.DataFrame) else pd.DataFrame(csv_path)
+            self._check_electric_data_shape(df.shape)
+            if not isinstance(csv_path, pd.DataFrame):
+                df.columns = CSV_COLUMNS
+            electric_data = ElectricData.from_dataframe(df)
         # Check if the CSV file exists
-        if os.path.exists(csv_path):
-            df = pd.read_csv(csv_path, encoding='utf-8')
+        elif os.path.exists(csv_path):
+            electric_data = read_electric_csv(csv_path, self.csv_engine)
         else:
             raise FileNotFoundError(
                 f"File not found: {csv_path}. Please ensure the file exists."
             )
 
-        # Check the shape of the DataFrame
-        if not df.shape == (self.N_ROWS_ELECTRIC_DATA, 10):
-            raise InvalidInputError(
-                201,
-                f"DataFrame shape is {df.shape}, expected ({self.N_ROWS_ELECTRIC_DATA}, 10). "
-                "Please ensure the CSV file has the correct format."
-            )
+        self._check_electric_data_shape(electric_data.shape)
+        return electric_data
 
-        # Check if the required columns are present
-        try:
-            df = df[['date_time_jst', 'air_conditioner', 'clothes_washer', 'microwave', 'rice_cooker', 'TV', 'cleaner', 'IH', 'Heater']]
-        except KeyError as e:
+    def _check_electric_data_shape(self, shape: tuple) -> None:
+        """
+        Check the shape of the electric data in the CSV format.
+        """
+        if not shape == (self.N_ROWS_ELECTRIC_DATA, len(CSV_COLUMNS)):
             raise InvalidInputError(
                 201,
-                f"Missing required columns in DataFrame: {e}. ",
-                f"Expected columns: ['date_time_jst', 'air_conditioner', 'clothes_washer', 'microwave', 'rice_cooker', 'TV', 'cleaner', 'IH', 'Heater']",
+                f"DataFrame shape is {shape}, expected ({self.N_ROWS_ELECTRIC_DATA}, {len(CSV_COLUMNS)}). "
+                "Please ensure the electric data has the correct format."
             )
 
+    def _check_electric_rate(self, daily_n_nan: np.ndarray) -> None:
+        """
+        Check the electric rate from the number of missing rows per day.
+        """
         # Check the electric rate
-        if (electric_rate := (self.N_ROWS_ELECTRIC_DATA - df.air_conditioner.isna().sum()) / self.N_ROWS_ELECTRIC_DATA) < self.THRESHOLD_ELECTRIC_DATA:
+        if (electric_rate := (self.N_ROWS_ELECTRIC_DATA - daily_n_nan.sum()) / self.N_ROWS_ELECTRIC_DATA) < self.THRESHOLD_ELECTRIC_DATA:
             raise InvalidInputError(
                 202,
                 f"Electric rate is {electric_rate:.3f}, expected >= {self.THRESHOLD_ELECTRIC_DATA}"
@@ -205,24 +440,45 @@ class Predictor:
 
         # Check the number of days with sufficient electric data
         threshold = int(self.N_MINUTES_PER_DAY * (1 - self.THRESHOLD_ELECTRIC_DATA)) # limit of lack rows per day
-        daily_n_nan = np.sum(
-            np.isnan(df.air_conditioner.values.reshape(self.N_DAY_ELECTRIC_DATA, self.N_MINUTES_PER_DAY)), 
-            axis=1
-        ) # daily number of lack rows
         if (n_over_threshold_per_day := np.sum(daily_n_nan > threshold)) > self.N_DAY_LIMIT_ELECTRIC_DATA:
             raise InvalidInputError(
                 202,
                 f"Electric rate >= 95% is only {n_over_threshold_per_day} days, expected >= 25 days"
             )
 
+    def _load_data(self, csv_path: ElectricDataSource) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Load data from a CSV file or in-memory electric data and preprocess it.
+        """
+        # Check the shape and the required columns
+        electric_data = self._get_electric_data(csv_path)
+        check_deadline("load_data")
+
+        if isinstance(electric_data, ElectricFeatureAccumulator):
+            # features accumulated while fetching, without the minute table
+            self._check_electric_rate(electric_data.daily_missing[:, 0]) # missing rows of air_conditioner
+            array_datetime = self._datetime_features_from_runs(*electric_data.day_runs())
+            return array_datetime, electric_data.daytime_usage_time, electric_data.midnight_usage_time
+
+        if isinstance(electric_data, PackedElectricData):
+            # usage counts by popcount of the packed flags
+            self._check_electric_rate(electric_data.daily_missing[:, 0]) # missing rows of air_conditioner
+            array_datetime = self._datetime_features_from_runs(*electric_data.day_runs())
+            return (array_datetime,) + electric_data.day_night_usage_time()
+
+        missing = electric_data.missing[:, 0] # missing rows of air_conditioner
+        daily_n_nan = np.sum(
+            missing.reshape(self.N_DAY_ELECTRIC_DATA, self.N_MINUTES_PER_DAY), 
+            axis=1
+        ) # daily number of lack rows
+        self._check_electric_rate(daily_n_nan)
+
         # encode datetime features
-        df.date_time_jst = df.date_time_jst.apply(
-            lambda x: datetime.datetime.strptime(x, "%Y/%m/%d %H:%M:%S")
-        )
-        array_datetime = np.sum(np.array(list(map(self._datetime_encode, df.date_time_jst))), axis=0)
+        array_datetime = self._datetime_features(electric_data.datetimes())
+        check_deadline("load_data")
 
         # Divide the electric usage data into daytime and midnight usage
-        array_daytime_usage_time, array_midnight_usage_time = self._divide_array(df.iloc[:, 1:].values)
+        array_daytime_usage_time, array_midnight_usage_time = self._divide_array(electric_data.flags)
 
         return array_datetime, array_daytime_usage_time, array_midnight_usage_time
 
@@ -233,6 +489,7 @@ class Predictor:
         """
         results = []
         for model in models:
+            check_deadline(method)
             try:
                 if method == "lightgbm":
                     results.append(model.predict(X)[0])
@@ -245,33 +502,147 @@ class Predictor:
                     raise PredictionError(312, f"{method} prediction failed: {e}")
         return float(np.mean(results))
 
-    @calc_func_time()
-    def predict_lightgbm(self, age: int, sex: int, edu: int, solo: int, csv_path: str) -> float:
+    @staticmethod
+    def _predict_soft_voting_batch(models, X: np.ndarray, method: str) -> np.ndarray:
         """
-        Predict using the LightGBM model.
+        Perform soft voting prediction for every row of X, calling each model once.
         """
-        sex_1 = sex == 1
-        sex_2 = sex == 2
-        edu_0 = edu > 9
-        edu_1 = edu <= 9
-        solo_0 = solo == 0
-        solo_1 = solo == 1
+        results = []
+        for model in models:
+            check_deadline(method)
+            try:
+                if method == "lightgbm":
+                    results.append(model.predict(X))
+                elif method == "logistic":
+                    results.append(model.predict_proba(X)[:, 1])
+            except Exception as e:
+                if method == "lightgbm":
+                    raise PredictionError(302, f"{method} prediction failed: {e}")
+                elif method == "logistic":
+                    raise PredictionError(312, f"{method} prediction failed: {e}")
+        # (n_rows, n_models) so that each row is averaged in the same order as `_predict_soft_voting`
+        return np.mean(np.ascontiguousarray(np.transpose(results)), axis=1)
+
+    @staticmethod
+    def _predict_ensemble(ensemble: LGBEnsemble, X: np.ndarray) -> float:
+        """
+        Perform soft voting prediction with all boosters of the ensemble at once.
+        """
+        try:
+            return float(ensemble.predict_mean(X)[0])
+        except PredictionTimeOut:
+            raise
+        except Exception as e:
+            raise PredictionError(302, f"lightgbm prediction failed: {e}")
 
+    @staticmethod
+    def _predict_ensemble_batch(ensemble: LGBEnsemble, X: np.ndarray) -> np.ndarray:
+        """
+        Perform soft voting prediction for every row of X with all boosters of the ensemble at once.
+        """
         try:
-            array_datetime, array_daytime, array_midnight = self._load_data(csv_path)
+            return ensemble.predict_mean(X)
+        except PredictionTimeOut:
+            raise
+        except Exception as e:
+            raise PredictionError(302, f"lightgbm prediction failed: {e}")
+
+    def _lgb_base_features(self, age: int, sex: int, edu: int, solo: int, csv_path: ElectricDataSource) -> np.ndarray:
+        """
+        Build the unscaled behavior, datetime and usage features of the LightGBM input (without the interactions).
+        """
+        try:
+            with stage_timer("load_data"):
+                array_datetime, array_daytime, array_midnight = self._load_data(csv_path)
         except InvalidInputError as e:
             raise e
         except FileNotFoundError as e:
             raise e
 
-        elec_total = np.hstack([array_daytime, array_midnight])
-        interactions = np.outer(array_datetime, elec_total).flatten()
-        array_behavior = np.array([age, sex_1, sex_2, edu_0, edu_1, solo_0, solo_1])
-        array_new = np.hstack([array_behavior, array_datetime, elec_total, interactions])
+        return LGBFeatureTransform.base_features(age, sex, edu, solo, array_datetime, array_daytime, array_midnight)
 
-        X_scaled = self.lgb_scaler.transform(array_new.reshape(1, -1)).reshape(-1)
-        array_sanitized = X_scaled[self.SANITIZER].reshape(1, -1)
-        return self._predict_soft_voting(self.lgb_models, array_sanitized, "lightgbm")
+    def _lgb_transform_features(self, base: np.ndarray) -> np.ndarray:
+        """
+        Compute and scale only the features used by the models from base feature rows
+        (same values as the scaler transform and SANITIZER of the full input, see LGBFeatureTransform
+        and benchmarks/bench_feature_transform.py).
+        """
+        with stage_timer("scaler"):
+            return self.lgb_transform.transform(base)
+
+    @calc_func_time()
+    def predict_lightgbm(self, age: int, sex: int, edu: int, solo: int, csv_path: ElectricDataSource) -> float:
+        """
+        Predict using the LightGBM model.
+        """
+        base = self._lgb_base_features(age, sex, edu, solo, csv_path)
+        return self._predict_lightgbm_sanitized(self._lgb_transform_features(base))
+
+    def _predict_lightgbm_sanitized(self, array_sanitized: np.ndarray) -> float:
+        """
+        Predict one scaled and sanitized LightGBM input row using the LightGBM model.
+        """
+        with stage_timer("lgb_ensemble"):
+            if self.lgb_backend == "numpy":
+                return self._predict_ensemble(self.lgb_models, array_sanitized)
+            return self._predict_soft_voting(self.lgb_models, array_sanitized, "lightgbm")
+
+    def _predict_lightgbm_early_exit_batch(
+        self, array_sanitized: np.ndarray, y_pred_proba_logi: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict every scaled and sanitized LightGBM input row with early exit, given the Logistic
+        Regression probability of each row.
+
+        :return: (LightGBM probability, whether it is exact, i.e. every booster was evaluated) of every row.
+        """
+        y_pred_proba_logi = np.asarray(y_pred_proba_logi, dtype=np.float64)
+        with stage_timer("lgb_ensemble"):
+            try:
+                y_pred_proba_lgb, n_evaluated = self.lgb_models.predict_mean_early_exit(
+                    array_sanitized,
+                    lambda rows, lower, upper: self._early_exit_decided(y_pred_proba_logi[rows], lower, upper),
+                    self.early_exit_step
+                )
+            except PredictionTimeOut:
+                raise
+            except Exception as e:
+                raise PredictionError(302, f"lightgbm prediction failed: {e}")
+        exact = n_evaluated == self.lgb_models.n_boosters
+        with self._early_exit_lock:
+            self._early_exit_stats["rows"] += len(n_evaluated)
+            self._early_exit_stats["exited"] += int(np.count_nonzero(~exact))
+            self._early_exit_stats["boosters"] += int(n_evaluated.sum())
+        return y_pred_proba_lgb, exact
+
+    def _early_exit_decided(self, y_pred_proba_logi: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """
+        Whether the result of each row cannot change, given bounds on its LightGBM probability.
+        """
+        # bounds on the soft voting probability
+        lower = (lower + y_pred_proba_logi) / 2 - self.EARLY_EXIT_MARGIN
+        upper = (upper + y_pred_proba_logi) / 2 + self.EARLY_EXIT_MARGIN
+        if self.early_exit == "decision":
+            return (lower > self.SCORE_THRESHOLD) | (upper <= self.SCORE_THRESHOLD)
+        # the score is non-decreasing in the probability
+        return np.array([self._score(lo) == self._score(hi) for lo, hi in zip(lower, upper)], dtype=bool)
+
+    def predict_lightgbm_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predict every row of the unscaled LightGBM input matrix X using the LightGBM model.
+        """
+        with stage_timer("scaler"):
+            array_sanitized = self.lgb_transform.transform_full(X)
+        return self._predict_lightgbm_sanitized_batch(array_sanitized)
+
+    def _predict_lightgbm_sanitized_batch(self, array_sanitized: np.ndarray) -> np.ndarray:
+        """
+        Predict every scaled and sanitized LightGBM input row using the LightGBM model.
+        """
+        with stage_timer("lgb_ensemble"):
+            if self.lgb_backend == "numpy":
+                return self._predict_ensemble_batch(self.lgb_models, array_sanitized)
+            return self._predict_soft_voting_batch(self.lgb_models, array_sanitized, "lightgbm")
 
     @calc_func_time()
     def predict_logistic(self, age: int, sex: int, edu: int, solo: int) -> float:
@@ -279,9 +650,42 @@ class Predictor:
         Predict using the Logistic Regression model.
         """
         edu = 1 if edu > 9 else 0
-        X_scaled = self.logi_scaler.transform(np.array([age, sex, edu, solo]).reshape(1, -1))
-        return self._predict_soft_voting(self.logi_models, X_scaled, "logistic")
+        if self.logi_backend == "stacked":
+            # the scaler is folded into the stacked models
+            with stage_timer("logi_ensemble"):
+                try:
+                    return self.logi_models.predict_one(int(age), int(sex), edu, int(solo))
+                except Exception as e:
+                    raise PredictionError(312, f"logistic prediction failed: {e}")
+        with stage_timer("scaler"):
+            X_scaled = self.logi_scaler.transform(np.array([age, sex, edu, solo]).reshape(1, -1))
+        with stage_timer("logi_ensemble"):
+            return self._predict_soft_voting(self.logi_models, X_scaled, "logistic")
+
+    def predict_logistic_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predict every row of the (age, sex, edu, solo) matrix X using the Logistic Regression model.
+        """
+        X = np.array(X)
+        X[:, 2] = X[:, 2] > 9
+        if self.logi_backend == "stacked":
+            with stage_timer("logi_ensemble"):
+                try:
+                    return self.logi_models.predict_batch(X)
+                except Exception as e:
+                    raise PredictionError(312, f"logistic prediction failed: {e}")
+        with stage_timer("scaler"):
+            X_scaled = self.logi_scaler.transform(X)
+        with stage_timer("logi_ensemble"):
+            return self._predict_soft_voting_batch(self.logi_models, X_scaled, "logistic")
     
+    @staticmethod
+    def _logistic_input(age: int, sex: int, edu: int, solo: int) -> List[int]:
+        """
+        The (age, sex, edu_bin, solo) input of the Logistic Regression model.
+        """
+        return [age, sex, 1 if edu > 9 else 0, solo]
+
     @staticmethod
     def _return_result(status_code: int, score: Union[int, None] = None) -> dict:
         return {
@@ -289,83 +693,74 @@ class Predictor:
             "score": score
         }
 
+    @staticmethod
+    def _validate_arguments(age: int, male: int, edu: int, solo: int) -> None:
+        """
+        Validate the behavior arguments. Raise InvalidInputError (211) if invalid.
+        """
+        if not isinstance(age, int):
+            raise InvalidInputError(211, f"Invalid type for age: {type(age)}. Expected int.")
+
+        if not isinstance(male, int):
+            raise InvalidInputError(211, f"Invalid type for male: {type(male)}. Expected int.")
+
+        if not male in [0, 1]:
+            raise InvalidInputError(211, f"Invalid argument male: {male}. Expected 1 or 0.")
+
+        if not isinstance(edu, int):
+            raise InvalidInputError(211, f"Invalid type for edu: {type(edu)}. Expected int.")
+
+        if not isinstance(solo, int):
+            raise InvalidInputError(211, f"Invalid type for solo: {type(solo)}. Expected int.")
+
+        if not solo in [0, 1]:
+            raise InvalidInputError(211, f"Invalid argument solo: {solo}. Expected 1 or 0.")
+
     def calculate_score(
             self, 
             age: int, 
             male: int, 
             edu: int, 
             solo: int, 
-            csv_path: str,
+            csv_path: ElectricDataSource,
             debug: bool = False
         ) -> Dict[int, Union[int, float, None]]:
         """
-        Calculate the score based on the provided parameters and the CSV data.
+        Calculate the score based on the provided parameters and the electric data.
+
+        `csv_path` is the path of the electric data CSV, or the same data in memory
+        (ElectricData, DataFrame or rows in the CSV format).
         """
         # Validate input types
-        if not isinstance(age, int):
-            status_code = 211
-            message = f"Invalid type for age: {type(age)}. Expected int."
-            if debug:
-                raise InvalidInputError(status_code, message)
-            else:
-                return self._return_result(status_code)
-        
-        if not isinstance(male, int):
-            status_code = 211
-            message = f"Invalid type for male: {type(male)}. Expected int."
-            if debug:
-                raise InvalidInputError(status_code, message)
-            else:
-                return self._return_result(status_code)
-
-        if not male in [0, 1]:
-            status_code = 211
-            message = f"Invalid argument male: {male}. Expected 1 or 0."
-            if debug:
-                raise InvalidInputError(status_code, message)
-            else:
-                return self._return_result(status_code)
-        
-        if not isinstance(edu, int):
-            status_code = 211
-            message = f"Invalid type for edu: {type(edu)}. Expected int."
-            if debug:
-                raise InvalidInputError(status_code, message)
-            else:
-                return self._return_result(status_code)
-        
-        if not isinstance(solo, int):
-            status_code = 211
-            message = f"Invalid type for solo: {type(solo)}. Expected int."
+        try:
+            self._validate_arguments(age, male, edu, solo)
+        except InvalidInputError as e:
             if debug:
-                raise InvalidInputError(status_code, message)
+                raise e
             else:
-                return self._return_result(status_code)
-        
-        if not solo in [0, 1]:
-            status_code = 211
-            message = f"Invalid argument solo: {solo}. Expected 1 or 0."
-            if debug:
-                raise InvalidInputError(status_code, message)
-            else:   
-                return self._return_result(status_code)
+                return self._return_result(e.status_code)
 
         # convert argument
         sex = 1 if male == 1 else 2
+        # with early exit, the LightGBM ensemble is evaluated after the Logistic Regression
+        early_exit = self.early_exit is not None and not debug
 
-        # Predict using LightGBM
+        # Predict using LightGBM (or serve both probabilities from the prediction cache)
+        cache_key = None
         try:
-            # timeout signal
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(TIMEOUT)
-            try:
-                y_pred_proba_lgb = self.predict_lightgbm(age, sex, edu, solo, csv_path)
-            except PredictionTimeOut as e:
-                # Handle timeout error
-                raise e
-            finally:
-                # Cancel the alarm
-                signal.alarm(0)
+            with time_limit(self.timeout, "lightgbm"):
+                if self.prediction_cache is None and not early_exit:
+                    y_pred_proba_lgb = self.predict_lightgbm(age, sex, edu, solo, csv_path)
+                else:
+                    base = self._lgb_base_features(age, sex, edu, solo, csv_path)
+                    array_sanitized = self._lgb_transform_features(base)
+                    if self.prediction_cache is not None:
+                        cache_key = self.prediction_cache.key(array_sanitized, self._logistic_input(age, sex, edu, solo))
+                        cached = self.prediction_cache.get(cache_key)
+                        if cached is not None:
+                            return self._soft_voting_result(*cached, debug)
+                    if not early_exit:
+                        y_pred_proba_lgb = self._predict_lightgbm_sanitized(array_sanitized)
         except InvalidInputError as e:
             if debug:
                 raise e
@@ -390,17 +785,8 @@ class Predictor:
 
         # Predict using Logistic Regression
         try:
-            # timeout signal
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(TIMEOUT)
-            try:
+            with time_limit(self.timeout, "logistic"):
                 y_pred_proba_logi = self.predict_logistic(age, sex, edu, solo)
-            except PredictionTimeOut as e:
-                # Handle timeout error
-                raise e
-            finally:
-                # Cancel the alarm
-                signal.alarm(0)
         except PredictionTimeOut as e:
             # Handle timeout error
             if debug:
@@ -413,11 +799,33 @@ class Predictor:
             else:
                 return self._return_result(312)
 
+        if early_exit:
+            try:
+                with time_limit(self.timeout, "lightgbm"):
+                    y_pred_proba_lgb, exact = self._predict_lightgbm_early_exit_batch(array_sanitized, [y_pred_proba_logi])
+            except PredictionTimeOut:
+                return self._return_result(400)
+            except Exception:
+                return self._return_result(302)
+            y_pred_proba_lgb = float(y_pred_proba_lgb[0])
+            if not exact[0]:
+                # an estimate: same score (or side of the threshold), not memoized
+                return self._soft_voting_result(y_pred_proba_lgb, y_pred_proba_logi, debug)
+
+        if cache_key is not None:
+            self.prediction_cache.put(cache_key, y_pred_proba_lgb, y_pred_proba_logi)
+        return self._soft_voting_result(y_pred_proba_lgb, y_pred_proba_logi, debug)
+
+    @classmethod
+    def _soft_voting_result(cls, y_pred_proba_lgb: float, y_pred_proba_logi: float, debug: bool = False) -> dict:
+        """
+        Combine the LightGBM and Logistic Regression probabilities into the result.
+        """
         # soft voting
         y_pred_proba = np.mean([y_pred_proba_lgb, y_pred_proba_logi])
         
         if debug:
-            return self._return_result(
+            return cls._return_result(
                 100,
                 {
                     "lightgbm": y_pred_proba_lgb,
@@ -426,14 +834,187 @@ class Predictor:
                 }
             )
         else:
-            # y_pred_probaがthreshold=0.467上の場合の対応
-            if 0.47 > y_pred_proba > 0.467:
-                y_pred_proba = 0.470
-            elif 0.467 >= y_pred_proba >= 0.46:
-                y_pred_proba = 0.460
-            else:
-                pass
-            return self._return_result(100, int(y_pred_proba * 100))
+            return cls._return_result(100, cls._score(y_pred_proba))
+
+    @staticmethod
+    def _score(y_pred_proba: float) -> int:
+        """
+        The score (integer percentage) of the soft voting probability, non-decreasing in the probability.
+        """
+        # y_pred_probaがthreshold=0.467上の場合の対応
+        if 0.47 > y_pred_proba > 0.467:
+            y_pred_proba = 0.470
+        elif 0.467 >= y_pred_proba >= 0.46:
+            y_pred_proba = 0.460
+        else:
+            pass
+        return int(y_pred_proba * 100)
+
+    def calculate_scores_batch(
+            self,
+            records: List[tuple],
+            debug: bool = False
+        ) -> List[Dict[int, Union[int, float, None]]]:
+        """
+        Calculate the scores of many houses at once.
+
+        Each record is a tuple (age, male, edu, solo, csv_path) as in `calculate_score`. The features
+        of all valid records are stacked into one matrix, so each model is called once per batch
+        instead of once per house.
+        An error of a record only sets the status code of that record; unlike `calculate_score`,
+        errors are not raised even if `debug` is True.
+        """
+        results = [None] * len(records)
+        lgb_rows = []
+        logi_rows = []
+        indices = []
+        for i, (age, male, edu, solo, csv_path) in enumerate(records):
+            try:
+                self._validate_arguments(age, male, edu, solo)
+            except InvalidInputError as e:
+                results[i] = self._return_result(e.status_code)
+                continue
+
+            # convert argument
+            sex = 1 if male == 1 else 2
+
+            try:
+                with time_limit(self.timeout, "load_data"):
+                    lgb_rows.append(self._lgb_base_features(age, sex, edu, solo, csv_path))
+            except InvalidInputError as e:
+                results[i] = self._return_result(e.status_code)
+                continue
+            except FileNotFoundError:
+                results[i] = self._return_result(200)
+                continue
+            except PredictionTimeOut:
+                results[i] = self._return_result(400)
+                continue
+            except Exception:
+                results[i] = self._return_result(302)
+                continue
+
+            logi_rows.append([age, sex, edu, solo])
+            indices.append(i)
+
+        if len(indices) == 0:
+            return results
+
+        try:
+            lgb_rows = self._lgb_transform_features(np.vstack(lgb_rows))
+            logi_rows = np.array(logi_rows)
+            cache_keys = None
+            if self.prediction_cache is not None:
+                # Serve the records with memoized probabilities and predict only the others
+                keys = [
+                    self.prediction_cache.key(row, self._logistic_input(*logi_row))
+                    for row, logi_row in zip(lgb_rows, logi_rows.tolist())
+                ]
+                pending = []
+                for k, (i, key) in enumerate(zip(indices, keys)):
+                    cached = self.prediction_cache.get(key)
+                    if cached is not None:
+                        results[i] = self._soft_voting_result(*cached, debug)
+                    else:
+                        pending.append(k)
+                if len(pending) == 0:
+                    return results
+                indices = [indices[k] for k in pending]
+                lgb_rows = lgb_rows[pending]
+                logi_rows = logi_rows[pending]
+                cache_keys = [keys[k] for k in pending]
+        except Exception:
+            return self._fill_results(results, indices, 302)
+
+        # Predict all valid records at once within the budget of the batch
+        try:
+            return self._predict_rows(
+                results, indices, lgb_rows, logi_rows, cache_keys, self._batch_timeout(len(indices)), debug
+            )
+        except PredictionTimeOut:
+            if len(indices) == 1:
+                return self._fill_results(results, indices, 400)
+        except PredictionError as e:
+            return self._fill_results(results, indices, e.status_code)
+
+        # The batch is over budget: predict each record with its own deadline, as calculate_score
+        logger.warning(f"Batch of {len(indices)} records timed out, predicting them one at a time")
+        for k, i in enumerate(indices):
+            try:
+                self._predict_rows(
+                    results, [i], lgb_rows[k:k + 1], logi_rows[k:k + 1],
+                    None if cache_keys is None else cache_keys[k:k + 1], self.timeout, debug
+                )
+            except PredictionTimeOut:
+                self._fill_results(results, [i], 400)
+            except PredictionError as e:
+                self._fill_results(results, [i], e.status_code)
+        return results
+
+    def _batch_timeout(self, n_records: int) -> float:
+        """
+        Time budget of each model stage of a batch of `n_records` records.
+        """
+        if self.batch_timeout is not None:
+            return self.batch_timeout
+        return self.timeout * n_records
+
+    def _predict_rows(
+            self,
+            results: list,
+            indices: List[int],
+            lgb_rows: np.ndarray,
+            logi_rows: np.ndarray,
+            cache_keys: Union[List[str], None],
+            timeout: float,
+            debug: bool
+        ) -> list:
+        """
+        Predict the scaled LightGBM and the Logistic Regression input rows at once and set the result
+        of each record. Raise PredictionTimeOut if a model stage is over `timeout`, or PredictionError
+        with the status code of the failed model.
+        """
+        # with early exit, the LightGBM ensemble after the Logistic Regression
+        early_exit = self.early_exit is not None and not debug
+        exact = None
+        if not early_exit:
+            try:
+                with time_limit(timeout, "lightgbm"):
+                    y_pred_proba_lgb = self._predict_lightgbm_sanitized_batch(lgb_rows)
+            except PredictionTimeOut:
+                raise
+            except Exception as e:
+                raise PredictionError(302, f"LightGBM prediction failed: {e}")
+
+        try:
+            with time_limit(timeout, "logistic"):
+                y_pred_proba_logi = self.predict_logistic_batch(logi_rows)
+        except PredictionTimeOut:
+            raise
+        except Exception as e:
+            raise PredictionError(312, f"Logistic Regression prediction failed: {e}")
+
+        if early_exit:
+            try:
+                with time_limit(timeout, "lightgbm"):
+                    y_pred_proba_lgb, exact = self._predict_lightgbm_early_exit_batch(lgb_rows, y_pred_proba_logi)
+            except PredictionTimeOut:
+                raise
+            except Exception as e:
+                raise PredictionError(302, f"LightGBM prediction failed: {e}")
+
+        for k, i in enumerate(indices):
+            # early exit estimates are not memoized
+            if cache_keys is not None and (exact is None or exact[k]):
+                self.prediction_cache.put(cache_keys[k], y_pred_proba_lgb[k], y_pred_proba_logi[k])
+            results[i] = self._soft_voting_result(float(y_pred_proba_lgb[k]), float(y_pred_proba_logi[k]), debug)
+        return results
+
+    @classmethod
+    def _fill_results(cls, results: list, indices: List[int], status_code: int) -> list:
+        for i in indices:
+            results[i] = cls._return_result(status_code)
+        return results
 
 
 class PredictorWithLogging(Predictor):
@@ -442,18 +1023,57 @@ class PredictorWithLogging(Predictor):
         lgb_models_dir_path: str,
         logi_models_dir_path: str,
         lgb_scaler_path: str,
-        logi_scaler_path: str
+        logi_scaler_path: str,
+        lgb_backend: str = "lightgbm",
+        logi_backend: str = "sklearn",
+        csv_engine: str = "c",
+        model_bundle_path: Union[str, None] = None,
+        load_workers: int = 1,
+        timeout: float = TIMEOUT,
+        prediction_cache_size: int = 0,
+        prediction_cache_path: Union[str, None] = None,
+        early_exit: Union[str, None] = None,
+        early_exit_step: int = 25,
+        batch_timeout: Union[float, None] = None
     ):
-        logger.info("Initializing Predictor...")
-        self.lgb_scaler = self._get_scaler(lgb_scaler_path)
-        self.logi_scaler = self._get_scaler(logi_scaler_path)
-
-        self.lgb_models = self._load_models(lgb_models_dir_path, lambda path: lgb.Booster(model_file=path), 500)
-        self.logi_models = self._load_models(logi_models_dir_path, lambda path: pickle.load(open(path, 'rb')), 50)
+        logger.info(
+            f"Initializing Predictor... (lgb_backend={lgb_backend}, logi_backend={logi_backend}, "
+            f"model_bundle_path={model_bundle_path}, load_workers={load_workers}, timeout={timeout}, "
+            f"prediction_cache_size={prediction_cache_size}, prediction_cache_path={prediction_cache_path}, "
+            f"early_exit={early_exit}, early_exit_step={early_exit_step}, batch_timeout={batch_timeout})"
+        )
+        super().__init__(
+            lgb_models_dir_path, logi_models_dir_path, lgb_scaler_path, logi_scaler_path,
+            lgb_backend, logi_backend, csv_engine, model_bundle_path, load_workers, timeout,
+            prediction_cache_size, prediction_cache_path, early_exit, early_exit_step, batch_timeout
+        )
+        timings = ", ".join(f"{phase}={seconds:.3f}s" for phase, seconds in self.load_timings.items())
+        logger.info(f"Models loaded in {sum(self.load_timings.values()):.3f}s ({timings})")
+        if model_bundle_path is not None:
+            logger.info(f"Model bundle loaded. (bundle_version={self.model_bundle.bundle_version}, checksum={self.model_bundle.checksum})")
+        if self.prediction_cache is not None:
+            logger.info(f"Prediction cache enabled. (model_version={self.prediction_cache.model_version})")
         logger.info("Predictor initialized successfully.")
 
-    def _load_data(self, csv_path: str):
-        logger.info(f"Loading data from {csv_path}")
+    def _log_prediction_cache_info(self) -> None:
+        info = self.prediction_cache_info()
+        if info is not None:
+            logger.info(
+                f"Prediction cache: hits={info['hits']} (sqlite={info['sqlite_hits']}), misses={info['misses']}, "
+                f"hit_rate={info['hit_rate']:.3f}, size={info['size']}"
+            )
+
+    def _log_early_exit_info(self) -> None:
+        info = self.early_exit_info()
+        if info is not None:
+            logger.info(
+                f"Early exit ({info['mode']}): houses={info['rows']}, exited={info['exited']}, "
+                f"mean boosters evaluated={info['mean_boosters']:.1f}/{info['n_boosters']}"
+            )
+
+    def _load_data(self, csv_path: ElectricDataSource):
+        source = csv_path if isinstance(csv_path, (str, ElectricData, PackedElectricData, ElectricFeatureAccumulator)) else f"in-memory {type(csv_path).__name__}"
+        logger.info(f"Loading data from {source}")
         try:
             data = super()._load_data(csv_path)  # 元の処理
             logger.info("Data loaded successfully.")
@@ -462,7 +1082,7 @@ class PredictorWithLogging(Predictor):
             logger.error(f"Failed to load data: {e}")
             raise
 
-    def predict_lightgbm(self, age: int, sex: int, edu: int, solo: int, csv_path: str):
+    def predict_lightgbm(self, age: int, sex: int, edu: int, solo: int, csv_path: ElectricDataSource):
         logger.info(f"Predicting LightGBM: age={age}, sex={sex}, edu={edu}, solo={solo}")
         result = super().predict_lightgbm(age, sex, edu, solo, csv_path)
         logger.info(f"LightGBM prediction result: {result:.4f}")
@@ -479,11 +1099,26 @@ class PredictorWithLogging(Predictor):
         try:
             result = super().calculate_score(age, male, edu, solo, csv_path, debug)
             logger.info(f"Score calculation completed. Result: {result}")
+            self._log_prediction_cache_info()
+            self._log_early_exit_info()
             return result
         except Exception as e:
             logger.exception("Error occurred during score calculation")
             raise
 
+    def calculate_scores_batch(self, records, debug=False):
+        logger.info(f"Starting batch score calculation... (n_records={len(records)})")
+        try:
+            results = super().calculate_scores_batch(records, debug)
+            n_success = sum(1 for result in results if result["status_code"] == 100)
+            logger.info(f"Batch score calculation completed. Success: {n_success}/{len(results)}")
+            self._log_prediction_cache_info()
+            self._log_early_exit_info()
+            return results
+        except Exception:
+            logger.exception("Error occurred during batch score calculation")
+            raise
+
 
 if __name__ == "__main__":
     p = PredictorWithLogging(
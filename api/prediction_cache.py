@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Tuple, Union
+
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """
+    Bounded cache of the (LightGBM, Logistic Regression) probabilities of a house.
+
+    Entries are keyed by a hash of the model version (checksum of the model and scaler
+    files), the scaled and sanitized LightGBM input and the Logistic Regression input, so
+    a house whose features have not changed is not predicted again, and changing the
+    models invalidates every entry. The entries are kept in an in-memory LRU of at most
+    `max_entries` and, if `sqlite_path` is given, in a SQLite database that survives
+    restarts and is shared by processes (entries of other model versions are deleted when
+    it is opened, and the least recently used entries above `max_entries` are trimmed).
+
+    The last use of the entries read from SQLite is written with the next `put` (or every
+    `TRIM_INTERVAL` hits), not on each hit. A SQLite error in `get` or `put` is logged and
+    treated as a miss or as a write to memory only, so a broken cache never fails a
+    prediction.
+    """
+
+    TABLE = "prediction_cache"
+    # Number of SQLite writes between two trims of the table
+    TRIM_INTERVAL = 100
+
+    def __init__(self, model_version: str, max_entries: int = 10000, sqlite_path: Union[str, None] = None):
+        """
+        :param model_version: Version of the models the cached probabilities were computed with.
+        :param max_entries: Maximum number of entries in memory and (approximately) in SQLite.
+        :param sqlite_path: SQLite database file of the persistent cache (None: in memory only).
+        """
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be >= 1, got {max_entries}.")
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.sqlite_path = sqlite_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "sqlite_hits": 0, "misses": 0}
+        self._sqlite = None
+        self._sqlite_pid = None
+        self._inherited_connections = []
+        self._writes_since_trim = 0
+        self._touched = {}
+        if sqlite_path is not None:
+            with self._lock:
+                connection = self._connection()
+                connection.execute(f"DELETE FROM {self.TABLE} WHERE model_version != ?", (model_version,))
+                connection.commit()
+                # the cache is usually created before the worker processes are forked: open the
+                # connection again in the process that uses it
+                connection.close()
+                self._sqlite = None
+
+    def key(self, lgb_input: np.ndarray, logi_input: np.ndarray) -> str:
+        """
+        Hash of the model version and the model inputs.
+
+        :param lgb_input: Scaled and sanitized LightGBM input row.
+        :param logi_input: Unscaled (age, sex, edu_bin, solo) row.
+        """
+        digest = hashlib.sha256(self.model_version.encode("utf-8"))
+        for array in (lgb_input, logi_input):
+            array = np.ascontiguousarray(array, dtype=np.float64).ravel()
+            digest.update(len(array).to_bytes(4, "little"))
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Union[Tuple[float, float], None]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return value
+            if self.sqlite_path is not None:
+                try:
+                    connection = self._connection()
+                    row = connection.execute(
+                        f"SELECT lgb, logi FROM {self.TABLE} WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        self._touched[key] = time.time()
+                        if len(self._touched) >= self.TRIM_INTERVAL:
+                            self._flush_touched(connection)
+                            connection.commit()
+                except (sqlite3.Error, OSError) as e:
+                    self._sqlite_failed("read", e)
+                    row = None
+                if row is not None:
+                    value = (float(row[0]), float(row[1]))
+                    self._remember(key, value)
+                    self._stats["hits"] += 1
+                    self._stats["sqlite_hits"] += 1
+                    return value
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, lgb_proba: float, logi_proba: float) -> None:
+        value = (float(lgb_proba), float(logi_proba))
+        with self._lock:
+            self._remember(key, value)
+            if self.sqlite_path is not None:
+                try:
+                    connection = self._connection()
+                    self._touched.pop(key, None)
+                    self._flush_touched(connection)
+                    connection.execute(
+                        f"INSERT OR REPLACE INTO {self.TABLE} (key, model_version, lgb, logi, used_at) VALUES (?, ?, ?, ?, ?)",
+                        (key, self.model_version) + value + (time.time(),)
+                    )
+                    self._writes_since_trim += 1
+                    if self._writes_since_trim >= self.TRIM_INTERVAL:
+                        self._trim(connection)
+                    connection.commit()
+                except (sqlite3.Error, OSError) as e:
+                    self._sqlite_failed("write", e)
+
+    def info(self) -> Dict[str, Union[int, float, str, None]]:
+        """
+        Hit and miss counts of this process, hit rate and current size.
+        """
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "model_version": self.model_version,
+                "sqlite_path": self.sqlite_path,
+            }
+
+    def clear(self) -> None:
+        """
+        Remove every entry (also from SQLite) and reset the counts.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._stats = dict.fromkeys(self._stats, 0)
+            self._touched.clear()
+            if self.sqlite_path is not None:
+                connection = self._connection()
+                connection.execute(f"DELETE FROM {self.TABLE}")
+                connection.commit()
+
+    def _remember(self, key: str, value: Tuple[float, float]) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _flush_touched(self, connection: sqlite3.Connection) -> None:
+        """
+        Write the last use of the entries read from SQLite since the last flush (not committed).
+        """
+        if self._touched:
+            connection.executemany(
+                f"UPDATE {self.TABLE} SET used_at = ? WHERE key = ?",
+                [(used_at, key) for key, used_at in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _sqlite_failed(self, operation: str, error: Exception) -> None:
+        """
+        Log a SQLite error and drop the connection (it is opened again on the next call).
+        """
+        logger.warning(f"Prediction cache {operation} failed on {self.sqlite_path}: {error!r}")
+        self._touched.clear()
+        if self._sqlite is not None:
+            try:
+                self._sqlite.close()
+            except sqlite3.Error:
+                pass
+        self._sqlite = None
+
+    def _trim(self, connection: sqlite3.Connection) -> None:
+        self._writes_since_trim = 0
+        (count,) = connection.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()
+        if count > self.max_entries:
+            connection.execute(
+                f"DELETE FROM {self.TABLE} WHERE key IN "
+                f"(SELECT key FROM {self.TABLE} ORDER BY used_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        SQLite connection of this process (a connection is not used across fork).
+        """
+        if self._sqlite is not None and self._sqlite_pid != os.getpid():
+            # A connection inherited across fork must not be used or closed in this process (closing
+            # it would touch the locks and WAL index of the parent): keep it referenced so that it
+            # is not garbage collected, and open a new one
+            self._inherited_connections.append(self._sqlite)
+            self._sqlite = None
+        if self._sqlite is None:
+            connection = sqlite3.connect(self.sqlite_path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+                "key TEXT PRIMARY KEY, model_version TEXT NOT NULL, lgb REAL NOT NULL, logi REAL NOT NULL, "
+                "used_at REAL NOT NULL)"
+            )
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {self.TABLE}_used_at ON {self.TABLE} (used_at)")
+            connection.commit()
+            self._sqlite = connection
+            self._sqlite_pid = os.getpid()
+        return self._sqlite
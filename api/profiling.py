@@ -0,0 +1,137 @@
+import cProfile
+import datetime
+import glob
+import io
+import logging
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterable, List, Union
+
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the files written by HouseProfiler (in the directory of predictor.log)
+FILE_PREFIX = "predictor_profile"
+
+
+class HouseProfiler:
+    """
+    On-demand cProfile and tracemalloc of selected houses (or of any block).
+
+    A house is selected if its task_house_id is in `task_house_ids`, or if it is every
+    `every`-th house seen by `select` in this process. Each profiled block writes, in
+    `output_dir`, a cProfile file (`.prof`, for pstats / snakeviz), a tracemalloc snapshot
+    (`.tracemalloc`, for tracemalloc.Snapshot.load) and a text summary (`.txt`: top
+    functions by cumulative time and top allocations by line).
+
+    cProfile only sees the thread that runs the block, and only one block is profiled at
+    a time: a block started while another one is profiled (e.g. by another thread) runs
+    without profiling.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        every: int = 0,
+        task_house_ids: Iterable[int] = (),
+        tracemalloc_frames: int = 10,
+        top: int = 30
+    ):
+        """
+        :param output_dir: Directory of the profile files.
+        :param every: Profile every `every`-th house (0: only `task_house_ids`).
+        :param task_house_ids: task_house_ids to profile.
+        :param tracemalloc_frames: Number of frames kept per allocation traceback.
+        :param top: Number of functions and allocation lines in the text summary.
+        """
+        if every < 0:
+            raise ValueError(f"every must be >= 0, got {every}.")
+        self.output_dir = output_dir
+        self.every = every
+        self.task_house_ids = {int(task_house_id) for task_house_id in task_house_ids}
+        self.tracemalloc_frames = tracemalloc_frames
+        self.top = top
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+        self._n_seen = 0
+        self._selected = set()
+
+    def select(self, task_house_id: int) -> bool:
+        """
+        Count the house and return whether it is selected (call once per house).
+        """
+        with self._lock:
+            self._n_seen += 1
+            if int(task_house_id) in self.task_house_ids or (self.every > 0 and self._n_seen % self.every == 0):
+                self._selected.add(int(task_house_id))
+                return True
+            return False
+
+    def is_selected(self, task_house_id: int) -> bool:
+        """
+        Whether `select` selected the house.
+        """
+        with self._lock:
+            return int(task_house_id) in self._selected
+
+    @contextmanager
+    def profile(self, name: str):
+        """
+        Profile the block and write its files as `<FILE_PREFIX>_<name>_<time>_<pid>.*`.
+        """
+        if not self._active.acquire(blocking=False):
+            logger.info(f"Skipped profiling {name}: another block is being profiled.")
+            yield
+            return
+        started_tracemalloc = False
+        profiler = cProfile.Profile()
+        try:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.tracemalloc_frames)
+                started_tracemalloc = True
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # another profiler (e.g. a debugger) is active in this process
+                logger.warning(f"Skipped cProfile of {name}: {e}")
+                profiler = None
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                snapshot = tracemalloc.take_snapshot()
+                self._write(name, profiler, snapshot)
+        finally:
+            if started_tracemalloc:
+                tracemalloc.stop()
+            self._active.release()
+
+    def _write(self, name: str, profiler: Union[cProfile.Profile, None], snapshot: tracemalloc.Snapshot) -> None:
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+            base = os.path.join(self.output_dir, f"{FILE_PREFIX}_{name}_{stamp}_{os.getpid()}")
+            summary = io.StringIO()
+            if profiler is not None:
+                profiler.dump_stats(base + ".prof")
+                pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(self.top)
+            snapshot.dump(base + ".tracemalloc")
+            summary.write(f"Top {self.top} allocations by line:\n")
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                summary.write(f"{stat}\n")
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(summary.getvalue())
+            logger.info(f"Profile of {name} written to {base}.*")
+        except Exception as e:
+            logger.warning(f"Failed to write the profile of {name}: {e}")
+
+
+def profile_files(output_dir: str) -> List[str]:
+    """
+    Profile files written by HouseProfiler in `output_dir`.
+    """
+    return sorted(glob.glob(os.path.join(output_dir, f"{FILE_PREFIX}_*")))
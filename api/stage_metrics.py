@@ -0,0 +1,237 @@
+import json
+import math
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, List, Union
+
+
+# Stages of the prediction pipeline recorded by main.py, pred_mci.py and server.py
+STAGES = (
+    "fetch_day",      # Energy Gateway API request of one day
+    "convert",        # conversion of one day of API response to the minute matrix
+    "csv_write",      # archival CSV write of one house
+    "load_data",      # Predictor._load_data (checks and features of the electric data)
+    "scaler",         # scaler transform (LightGBM and Logistic Regression inputs)
+    "lgb_ensemble",   # evaluation of the LightGBM ensemble
+    "logi_ensemble",  # evaluation of the Logistic Regression ensemble
+    "db_write",       # task_houses / task_results writes
+    "gcs_upload",     # Cloud Storage upload (archival CSV, predictor.log)
+    "request",        # prediction request of the service (server.py), end to end
+    "queue_wait",     # wait of a request for its micro-batch (micro_batcher.py)
+    "batch",          # one batched prediction of the service
+)
+# Upper bounds (seconds) of the histogram buckets: 0.1 ms to about 10 minutes, 4 buckets per doubling
+BUCKET_BOUNDS = tuple(1e-4 * 2 ** (k / 4) for k in range(91))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class StageMetrics:
+    """
+    Histograms of the duration of each stage of the prediction pipeline.
+
+    Each stage keeps the count, sum, min and max of its durations and the counts per
+    bucket of `BUCKET_BOUNDS`, so the state has a constant size whatever the number of
+    houses, can be merged across worker processes (`take` / `merge`) and exported as JSON
+    or in the Prometheus text format. Quantiles are estimated from the buckets (within
+    about 10%). Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            state = self._stages.get(stage)
+            if state is None:
+                state = self._stages[stage] = self._empty_state()
+            state["count"] += 1
+            state["sum"] += seconds
+            state["min"] = min(state["min"], seconds)
+            state["max"] = max(state["max"], seconds)
+            state["buckets"][self._bucket_index(seconds)] += 1
+
+    def timer(self, stage: str) -> "StageTimer":
+        return StageTimer(self, stage)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        State of every stage ({stage: {"count", "sum", "min", "max", "buckets"}}), JSON serializable.
+        """
+        with self._lock:
+            return {stage: dict(state, buckets=list(state["buckets"])) for stage, state in self._stages.items()}
+
+    def take(self) -> Dict[str, dict]:
+        """
+        Return the snapshot and reset the state (e.g. in a worker process, before returning it).
+        """
+        with self._lock:
+            stages = self._stages
+            self._stages = {}
+        return stages
+
+    def merge(self, stages: Dict[str, dict]) -> None:
+        """
+        Add a snapshot (e.g. of a worker process or of a task).
+        """
+        with self._lock:
+            for stage, other in stages.items():
+                state = self._stages.get(stage)
+                if state is None:
+                    state = self._stages[stage] = self._empty_state()
+                state["count"] += other["count"]
+                state["sum"] += other["sum"]
+                state["min"] = min(state["min"], other["min"])
+                state["max"] = max(state["max"], other["max"])
+                state["buckets"] = [a + b for a, b in zip(state["buckets"], other["buckets"])]
+
+    def quantile(self, stage: str, q: float) -> Union[float, None]:
+        """
+        Estimated q-quantile (0 <= q <= 1) of the durations of the stage (None if not recorded).
+        """
+        with self._lock:
+            state = self._stages.get(stage)
+            if state is None or state["count"] == 0:
+                return None
+            return self._quantile(state, q)
+
+    def summary(self, n_houses: Union[int, None] = None, elapsed: Union[float, None] = None) -> Dict[str, object]:
+        """
+        Summary of the recorded stages: count, total and mean time, estimated p50/p95/p99 and max per stage,
+        and the throughput (houses per second) if `n_houses` is given.
+
+        :param elapsed: Wall time in seconds (default: since the creation of the object).
+        """
+        if elapsed is None:
+            elapsed = time.time() - self.started_at
+        with self._lock:
+            stages = {}
+            for stage in self._ordered(self._stages):
+                state = self._stages[stage]
+                stages[stage] = {
+                    "count": state["count"],
+                    "total_s": state["sum"],
+                    "mean_s": state["sum"] / state["count"] if state["count"] else 0.0,
+                    **{f"p{int(q * 100)}_s": self._quantile(state, q) for q in QUANTILES},
+                    "max_s": state["max"] if state["count"] else None,
+                }
+        summary = {"elapsed_s": elapsed, "stages": stages}
+        if n_houses is not None:
+            summary["houses"] = n_houses
+            summary["houses_per_s"] = n_houses / elapsed if elapsed > 0 else None
+        return summary
+
+    def to_json(self, **extra) -> str:
+        """
+        JSON of the bucket bounds and the state of every stage, with `extra` as additional top-level keys.
+        """
+        return json.dumps({"bucket_bounds": list(BUCKET_BOUNDS), "stages": self.snapshot(), **extra}, indent=2)
+
+    def to_prometheus(self, name: str = "mci_stage_duration_seconds", labels: Union[Dict[str, str], None] = None) -> str:
+        """
+        The histograms in the Prometheus text exposition format (cumulative buckets, `stage` label).
+        """
+        extra = "".join(f',{key}="{value}"' for key, value in (labels or {}).items())
+        lines = [
+            f"# HELP {name} Duration of a stage of the MCI prediction pipeline.",
+            f"# TYPE {name} histogram",
+        ]
+        stages = self.snapshot()
+        for stage in self._ordered(stages):
+            state = stages[stage]
+            cumulative = 0
+            for bound, count in zip(BUCKET_BOUNDS, state["buckets"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}"{extra},le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}"{extra},le="+Inf"}} {state["count"]}')
+            lines.append(f'{name}_sum{{stage="{stage}"{extra}}} {state["sum"]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"{extra}}} {state["count"]}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _empty_state() -> dict:
+        # the last bucket holds the durations above the last bound
+        return {"count": 0, "sum": 0.0, "min": math.inf, "max": 0.0, "buckets": [0] * (len(BUCKET_BOUNDS) + 1)}
+
+    @staticmethod
+    def _bucket_index(seconds: float) -> int:
+        if seconds <= BUCKET_BOUNDS[0]:
+            return 0
+        return min(len(BUCKET_BOUNDS), math.ceil(4 * math.log2(seconds / BUCKET_BOUNDS[0]) - 1e-9))
+
+    @staticmethod
+    def _quantile(state: dict, q: float) -> float:
+        rank = q * state["count"]
+        cumulative = 0
+        for index, count in enumerate(state["buckets"]):
+            if count and cumulative + count >= rank:
+                lower = BUCKET_BOUNDS[index - 1] if index > 0 else 0.0
+                upper = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else state["max"]
+                value = lower + (upper - lower) * (rank - cumulative) / count
+                return min(max(value, state["min"]), state["max"])
+            cumulative += count
+        return state["max"]
+
+    @staticmethod
+    def _ordered(stages) -> List[str]:
+        """Stages in the order of STAGES, then the others by name."""
+        return [stage for stage in STAGES if stage in stages] + sorted(stage for stage in stages if stage not in STAGES)
+
+
+class StageTimer:
+    """
+    Context manager recording the duration of its block in a StageMetrics (also when the block raises).
+    """
+
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics: StageMetrics, stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self) -> "StageTimer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+# Metrics recorded by stage_timer (None: disabled). One per process, shared by its threads
+_active_metrics = None
+_DISABLED = nullcontext()
+
+
+def enable_metrics(metrics: Union[StageMetrics, None] = None) -> StageMetrics:
+    """
+    Record the stages of this process in `metrics` (a new StageMetrics if None).
+
+    A forked process inherits the metrics of its parent with the counts recorded so far, so a
+    worker process whose metrics are merged back into the parent must call this again first.
+    """
+    global _active_metrics
+    _active_metrics = metrics if metrics is not None else StageMetrics()
+    return _active_metrics
+
+
+def disable_metrics() -> None:
+    global _active_metrics
+    _active_metrics = None
+
+
+def active_metrics() -> Union[StageMetrics, None]:
+    return _active_metrics
+
+
+def stage_timer(stage: str):
+    """
+    Context manager recording the duration of its block as `stage` in the active metrics.
+    When disabled it returns a shared no-op context manager, so instrumented code costs one
+    global lookup per block.
+    """
+    metrics = _active_metrics
+    if metrics is None:
+        return _DISABLED
+    return StageTimer(metrics, stage)
@@ -0,0 +1,141 @@
+"""
+Benchmark of the conversion of one day of Energy Gateway API response to minute data.
+
+Compares the previous per-timestamp loop (every appliance type, `app_type_ids.index` and
+`float()` per minute) with `main.convert_electric_data_day` (one NumPy column per
+appliance type), and checks that both give exactly the same CSV rows, on realistic
+responses and on edge cases (nulls, unknown or duplicated appliance types, short or
+missing powers lists, string and non-numeric values, non-integer timestamps).
+
+    $ python benchmarks/bench_api_convert.py
+"""
+import argparse
+import copy
+import os
+import sys
+import timeit
+from datetime import datetime as dt, timedelta, timezone
+
+import numpy as np
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+
+import main
+
+APP_TYPE_IDS = [2, 5, 20, 24, 25, 30, 31, 37, 301]
+STS = 1734620400  # 2024/12/20 00:00 JST
+
+
+def convert_previous(response_data, app_type_ids):
+    """The previous per-timestamp loop of main.py."""
+    arr = []
+    exist_day = False
+    timestamps = response_data['data'][0]['timestamps']
+    appliance_types = response_data['data'][0]['appliance_types']
+    for i, timestamp in enumerate(timestamps):
+        date_time_jst = dt.fromtimestamp(timestamp).astimezone(
+            timezone(timedelta(hours=+9))).strftime('%Y/%m/%d %H:%M:00')
+        line = [None] * 9
+        exist = False
+        for appliance_type in appliance_types:
+            try:
+                j = app_type_ids.index(int(appliance_type['appliance_type_id']))
+                if appliance_type['appliances'][0]['powers'][i] is not None:
+                    if float(appliance_type['appliances'][0]['powers'][i]) > 0.0:
+                        flag = 1
+                    else:
+                        flag = 0
+                    line[j] = flag
+                    exist = True
+            except (Exception,):
+                continue
+        if exist:
+            exist_day = True
+            for k, row in enumerate(line):
+                if row is None:
+                    line[k] = 0
+        arr.append([date_time_jst] + line)
+    return arr, exist_day
+
+
+def convert_current(response_data, app_type_ids):
+    date_time_jst, values, exist_day = main.convert_electric_data_day(response_data, app_type_ids)
+    return main.electric_data_rows(date_time_jst, values), exist_day
+
+
+def make_response(seed: int, n: int = 1440, null_rate: float = 0.01) -> dict:
+    rng = np.random.default_rng(seed)
+    timestamps = [STS + 60 * i for i in range(n)]
+    appliance_types = []
+    for app_type_id in APP_TYPE_IDS:
+        powers = np.round(rng.uniform(size=n) * 100, 1)
+        powers[rng.uniform(size=n) < 0.5] = 0.0
+        values = [None if rng.uniform() < null_rate else float(v) for v in powers]
+        appliance_types.append({"appliance_type_id": app_type_id, "appliances": [{"powers": values}]})
+    return {"data": [{"timestamps": timestamps, "appliance_types": appliance_types}]}
+
+
+def edge_cases() -> list:
+    cases = []
+    base = make_response(1, n=180)
+    types = base["data"][0]["appliance_types"]
+
+    response = copy.deepcopy(base)
+    for appliance_type in response["data"][0]["appliance_types"]:
+        appliance_type["appliances"][0]["powers"][60:120] = [None] * 60   # all null for an hour
+    cases.append(("all null rows", response))
+
+    response = copy.deepcopy(base)
+    response["data"][0]["appliance_types"] = types[:3] + [{"appliance_type_id": 999, "appliances": [{"powers": [1.0] * 180}]}]
+    cases.append(("unknown and absent appliance types", response))
+
+    response = copy.deepcopy(base)
+    response["data"][0]["appliance_types"].append(
+        {"appliance_type_id": "2", "appliances": [{"powers": [None, 0.0, 5.0] * 60}]})
+    cases.append(("duplicated appliance type", response))
+
+    response = copy.deepcopy(base)
+    response["data"][0]["appliance_types"][0]["appliances"][0]["powers"] = [1.0] * 50
+    response["data"][0]["appliance_types"][1]["appliances"] = []
+    response["data"][0]["appliance_types"][2]["appliances"][0]["powers"] = None
+    cases.append(("short or missing powers", response))
+
+    response = copy.deepcopy(base)
+    powers = response["data"][0]["appliance_types"][3]["appliances"][0]["powers"]
+    powers[0:4] = ["1.5", "0", "abc", {"w": 1}]
+    powers[4:7] = [float("nan"), True, -3]
+    cases.append(("strings and non-numeric values", response))
+
+    response = copy.deepcopy(base)
+    response["data"][0]["timestamps"] = [t + 30.7 for t in response["data"][0]["timestamps"]]
+    cases.append(("non-integer timestamps", response))
+
+    response = {"data": [{"timestamps": [], "appliance_types": []}]}
+    cases.append(("empty", response))
+    return cases
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="number of timing repeats")
+    args = parser.parse_args()
+
+    cases = [(f"random day {seed}", make_response(seed)) for seed in range(3)] + edge_cases()
+    for name, response in cases:
+        expected = convert_previous(response, APP_TYPE_IDS)
+        actual = convert_current(response, APP_TYPE_IDS)
+        if expected != actual:
+            raise AssertionError(f"Mismatch for {name}")
+    print(f"rows match exactly for {len(cases)} responses")
+
+    response = make_response(0)
+    previous = min(timeit.repeat(lambda: convert_previous(response, APP_TYPE_IDS), number=1, repeat=args.repeat))
+    current = min(timeit.repeat(lambda: main.convert_electric_data_day(response, APP_TYPE_IDS), number=1, repeat=args.repeat))
+    print(f"previous:   {previous * 1000:8.2f} ms / day")
+    print(f"vectorized: {current * 1000:8.2f} ms / day")
+    print(f"speedup:    {previous / current:8.1f}x")
+
+
+if __name__ == "__main__":
+    main_()
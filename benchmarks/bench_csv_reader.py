@@ -0,0 +1,133 @@
+"""
+Benchmark of the electric data CSV readers.
+
+Writes synthetic 28-day electric data CSVs (40320 rows x 10 columns, 0/1 values with
+missing rows, as main.py writes them) to a temporary directory and compares the previous
+`pd.read_csv` of the whole file with `electric_data.read_electric_csv` ("c" and, if
+installed, "pyarrow"). For each reader it reports the median parse time of one file,
+the peak memory while parsing one file (tracemalloc), the total time for `--n-files`
+files and the memory kept by holding all parsed results, and checks that every reader
+gives the same usage flags and missing mask.
+
+    $ python benchmarks/bench_csv_reader.py --n-files 1000
+"""
+import argparse
+import csv
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(base_dir, 'api'))
+
+from electric_data import ElectricData, CSV_COLUMNS, DATETIME_FORMAT, USAGE_COLUMNS, pyarrow, read_electric_csv
+
+N_ROWS = 28 * 1440
+
+
+def write_csv(path: str, seed: int, start: datetime.datetime, nan_rate: float = 0.01) -> None:
+    rng = np.random.default_rng(seed)
+    values = (rng.uniform(size=(N_ROWS, len(CSV_COLUMNS) - 1)) < 0.2).astype(int).astype(object)
+    values[rng.uniform(size=N_ROWS) < nan_rate] = None
+    timestamps = np.datetime64(start, "m") + np.arange(N_ROWS).astype("timedelta64[m]")
+    date_time_jst = pd.Series(timestamps).dt.strftime(DATETIME_FORMAT)
+    with open(path, mode='w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for d, row in zip(date_time_jst, values):
+            writer.writerow([d] + list(row))
+
+
+def read_pandas_default(path: str) -> pd.DataFrame:
+    """The previous reader: every column with inferred dtypes."""
+    return pd.read_csv(path, encoding='utf-8')
+
+
+def to_flags(result) -> tuple:
+    if isinstance(result, ElectricData):
+        return result.flags, result.missing
+    usage = result[USAGE_COLUMNS].to_numpy(dtype=np.float64)
+    return (usage > 0).astype(np.int8), np.isnan(usage)
+
+
+def measure(reader, paths: list, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        reader(paths[0])
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    reader(paths[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    results = [reader(path) for path in paths]
+    total = time.perf_counter() - start
+    del results
+
+    # tracemalloc slows down allocations, so the retained memory is measured in a separate pass
+    tracemalloc.start()
+    results = [reader(path) for path in paths]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "peak_mb": peak / 1024 ** 2,
+        "total_s": total,
+        "retained_mb": retained / 1024 ** 2,
+        "first": results[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-files", type=int, default=100, help="number of CSV files to read")
+    parser.add_argument("--repeat", type=int, default=10, help="number of single-file timing repeats")
+    args = parser.parse_args()
+
+    readers = {
+        "pd.read_csv (previous)": read_pandas_default,
+        "read_electric_csv c": lambda path: read_electric_csv(path, "c"),
+    }
+    if pyarrow is not None:
+        readers["read_electric_csv pyarrow"] = lambda path: read_electric_csv(path, "pyarrow")
+    else:
+        print("pyarrow is not installed, skipping the pyarrow engine")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # a few distinct files, reused to reach n_files without writing thousands of them
+        n_distinct = min(args.n_files, 10)
+        distinct = []
+        for i in range(n_distinct):
+            path = os.path.join(tmp_dir, f"house_{i}.csv")
+            write_csv(path, i, datetime.datetime(2024, 12, 20) + datetime.timedelta(days=i))
+            distinct.append(path)
+        paths = [distinct[i % n_distinct] for i in range(args.n_files)]
+
+        expected = None
+        print(f"{'reader':28s} {'median':>10s} {'peak':>10s} {'total':>10s} {'retained':>12s}")
+        for name, reader in readers.items():
+            result = measure(reader, paths, args.repeat)
+            flags, missing = to_flags(result["first"])
+            if expected is None:
+                expected = (flags, missing)
+            elif not (np.array_equal(flags, expected[0]) and np.array_equal(missing, expected[1])):
+                raise AssertionError(f"{name} gives different usage flags")
+            print(
+                f"{name:28s} {result['median_ms']:8.2f}ms {result['peak_mb']:8.2f}MB "
+                f"{result['total_s']:9.2f}s {result['retained_mb']:10.1f}MB"
+            )
+    print(f"usage flags match for all readers ({args.n_files} files)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark of the datetime feature encoding in Predictor._load_data.
+
+Compares the previous per-row implementation (strptime through DataFrame.apply and
+`_datetime_encode` for every minute) with the bulk parse + per-day encoding, and checks
+that both give exactly the same features, including 28-day windows across a year boundary.
+
+    $ python benchmarks/bench_datetime_encode.py
+"""
+import argparse
+import datetime
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(base_dir, 'api'))
+
+from pred_mci import Predictor
+from electric_data import ElectricData, DATETIME_FORMAT
+
+
+def make_date_time_jst(start: datetime.datetime) -> np.ndarray:
+    """40320 rows of minute timestamps (CSV format) from `start`."""
+    minutes = np.arange(Predictor.N_ROWS_ELECTRIC_DATA).astype("timedelta64[m]")
+    timestamps = np.datetime64(start, "m") + minutes
+    return pd.Series(timestamps).dt.strftime(DATETIME_FORMAT).to_numpy(dtype=object)
+
+
+def encode_per_row(date_time_jst: np.ndarray) -> np.ndarray:
+    """The previous implementation of _load_data."""
+    df = pd.DataFrame({"date_time_jst": date_time_jst})
+    df.date_time_jst = df.date_time_jst.apply(
+        lambda x: datetime.datetime.strptime(x, "%Y/%m/%d %H:%M:%S")
+    )
+    return np.sum(np.array(list(map(Predictor._datetime_encode, df.date_time_jst))), axis=0)
+
+
+def encode_vectorized(date_time_jst: np.ndarray) -> np.ndarray:
+    """The current implementation of _load_data."""
+    electric_data = ElectricData(date_time_jst, np.zeros((len(date_time_jst), 8)), np.zeros((len(date_time_jst), 8)))
+    return Predictor._datetime_features(electric_data.datetimes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="number of timing repeats")
+    args = parser.parse_args()
+
+    starts = [
+        datetime.datetime(2024, 6, 1),
+        datetime.datetime(2024, 12, 20),   # across a year boundary
+        datetime.datetime(2023, 12, 31, 12, 30),   # not aligned to midnight
+        datetime.datetime(2024, 2, 15),   # leap day
+    ]
+    for start in starts:
+        date_time_jst = make_date_time_jst(start)
+        expected = encode_per_row(date_time_jst)
+        actual = encode_vectorized(date_time_jst)
+        if not np.array_equal(expected, actual):
+            raise AssertionError(f"Mismatch for start={start}: {expected} != {actual}")
+    print(f"features match exactly for {len(starts)} windows")
+
+    date_time_jst = make_date_time_jst(starts[1])
+    per_row = min(timeit.repeat(lambda: encode_per_row(date_time_jst), number=1, repeat=args.repeat))
+    vectorized = min(timeit.repeat(lambda: encode_vectorized(date_time_jst), number=1, repeat=args.repeat))
+    print(f"per-row:    {per_row * 1000:8.2f} ms")
+    print(f"vectorized: {vectorized * 1000:8.2f} ms")
+    print(f"speedup:    {per_row / vectorized:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark of the early exit of the LightGBM ensemble (`Predictor(early_exit=...)`).
+
+On the synthetic houses (`synthetic_data.py`) and on random feature rows with random
+behavior inputs, compares `calculate_scores_batch` with exact evaluation and with each
+early exit mode, checks that "score" gives exactly the same scores and "decision" the
+same side of `Predictor.SCORE_THRESHOLD`, and that `predict_mean_early_exit` without exit
+gives exactly `predict_mean`. Reports the mean number of boosters evaluated per house
+and the time of each mode, for one house at a time and for a batch.
+
+    $ python benchmarks/bench_early_exit.py --n-rows 500
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(base_dir, 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import MODEL_PATHS
+from pred_mci import Predictor
+from synthetic_data import electric_data, scenario_matrix
+
+
+def synthetic_records(n_houses: int) -> list:
+    rng = np.random.default_rng(0)
+    records = []
+    for k in range(n_houses):
+        scenario = ("complete", "typical")[k % 2]
+        data = electric_data(*scenario_matrix(scenario, seed=k))
+        records.append((int(rng.integers(60, 100)), int(rng.integers(0, 2)), int(rng.integers(6, 17)), int(rng.integers(0, 2)), data))
+    return records
+
+
+def random_rows(predictor: Predictor, n_rows: int, seed: int) -> tuple:
+    """
+    Scaled LightGBM inputs of random base features and random Logistic Regression inputs.
+    """
+    rng = np.random.default_rng(seed)
+    age = rng.integers(60, 100, n_rows)
+    sex = rng.integers(1, 3, n_rows)
+    edu = rng.integers(6, 17, n_rows)
+    solo = rng.integers(0, 2, n_rows)
+    behavior = np.column_stack([age, sex == 1, sex == 2, edu > 9, edu <= 9, solo == 0, solo == 1])
+    usage = rng.integers(0, 40000, (n_rows, 16))
+    base = np.hstack([behavior, rng.uniform(-1.0, 1.0, (n_rows, 2)), usage]).astype(np.float64)
+    return predictor.lgb_transform.transform(base), np.column_stack([age, sex, edu, solo])
+
+
+def scores(predictor: Predictor, y_pred_proba_lgb: np.ndarray, y_pred_proba_logi: np.ndarray) -> np.ndarray:
+    return np.array([
+        predictor._soft_voting_result(float(lgb), float(logi))["score"] for lgb, logi in zip(y_pred_proba_lgb, y_pred_proba_logi)
+    ])
+
+
+def mean_boosters(predictor: Predictor) -> str:
+    """
+    Mean number of boosters evaluated since the last call, and reset the counts.
+    """
+    info = predictor.early_exit_info()
+    if info is None:
+        return f"{predictor.lgb_models.n_boosters:6d}"
+    predictor._early_exit_stats = {"rows": 0, "exited": 0, "boosters": 0}
+    return f"{info['mean_boosters']:6.1f} (exited {info['exited']}/{info['rows']})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-rows", type=int, default=500, help="number of random feature rows")
+    parser.add_argument("--n-houses", type=int, default=8, help="number of synthetic houses")
+    parser.add_argument("--step", type=int, default=25, help="early_exit_step")
+    parser.add_argument("--bundle", default=None, help="model bundle")
+    args = parser.parse_args()
+
+    predictors = {
+        mode: Predictor(**MODEL_PATHS, lgb_backend="numpy", model_bundle_path=args.bundle, early_exit=mode, early_exit_step=args.step)
+        for mode in (None,) + Predictor.EARLY_EXIT_MODES
+    }
+    exact = predictors[None]
+    ensemble = exact.lgb_models
+
+    # without exit, the early exit evaluation gives exactly predict_mean
+    X, logi_rows = random_rows(exact, args.n_rows, seed=0)
+    never = lambda rows, lower, upper: np.zeros(len(rows), dtype=bool)
+    y_pred_proba_lgb, n_evaluated = ensemble.predict_mean_early_exit(X, never, args.step)
+    if not (np.array_equal(y_pred_proba_lgb, ensemble.predict_mean(X)) and np.all(n_evaluated == ensemble.n_boosters)):
+        raise AssertionError("predict_mean_early_exit without exit differs from predict_mean")
+    p_min, p_max = ensemble.probability_bounds()
+    proba = ensemble.predict(X)
+    if not np.all((proba >= p_min) & (proba <= p_max)):
+        raise AssertionError("a booster probability is outside its bounds")
+    print(f"predict_mean_early_exit without exit matches predict_mean ({args.n_rows} rows)")
+
+    # scores on random rows
+    y_pred_proba_logi = exact.predict_logistic_batch(logi_rows)
+    expected = scores(exact, ensemble.predict_mean(X), y_pred_proba_logi)
+    for mode in Predictor.EARLY_EXIT_MODES:
+        predictor = predictors[mode]
+        start = time.perf_counter()
+        y_pred_proba_lgb, _ = predictor._predict_lightgbm_early_exit_batch(X, y_pred_proba_logi)
+        seconds = time.perf_counter() - start
+        actual = scores(predictor, y_pred_proba_lgb, y_pred_proba_logi)
+        if mode == "score" and not np.array_equal(actual, expected):
+            raise AssertionError(f"{mode}: {np.count_nonzero(actual != expected)} scores differ from exact")
+        if not np.array_equal(actual >= 47, expected >= 47):
+            raise AssertionError(f"{mode}: {np.count_nonzero((actual >= 47) != (expected >= 47))} decisions differ from exact")
+        print(f"random rows, {mode:8s}: mean boosters evaluated {mean_boosters(predictor)}, {seconds * 1000:8.1f} ms for the batch")
+    start = time.perf_counter()
+    ensemble.predict_mean(X)
+    print(f"random rows, exact   : {(time.perf_counter() - start) * 1000:8.1f} ms for the batch")
+
+    # end to end on the synthetic houses, one house at a time and as a batch
+    records = synthetic_records(args.n_houses)
+    expected = [exact.calculate_score(*record) for record in records]
+    for mode, predictor in predictors.items():
+        start = time.perf_counter()
+        single = [predictor.calculate_score(*record) for record in records]
+        single_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        batch = predictor.calculate_scores_batch(records)
+        batch_seconds = time.perf_counter() - start
+        for results in (single, batch):
+            statuses = [result["status_code"] for result in results]
+            if statuses != [result["status_code"] for result in expected]:
+                raise AssertionError(f"{mode}: status codes differ from exact")
+            actual_scores = [result["score"] for result in results]
+            expected_scores = [result["score"] for result in expected]
+            if mode == "decision":
+                actual_scores = [score is not None and score >= 47 for score in actual_scores]
+                expected_scores = [score is not None and score >= 47 for score in expected_scores]
+            if actual_scores != expected_scores:
+                raise AssertionError(f"{mode}: scores differ from exact")
+        print(f"synthetic houses, {str(mode):8s}: mean boosters evaluated {mean_boosters(predictor)}, "
+              f"{single_seconds / len(records) * 1000:8.2f} ms/house single, {batch_seconds / len(records) * 1000:8.2f} ms/house batch")
+    print("scores match exact evaluation (decision: same side of the threshold)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark of `lgb_features.LGBFeatureTransform` against the scaler transform and SANITIZER.
+
+Checks that the fused transform gives exactly the same scaled features as
+`lgb_scaler.transform(X)[:, SANITIZER]` of the 57-column input, for the features of the
+synthetic houses (`synthetic_data.py`) and for random base feature rows, one row and
+batches, and times both paths (one row, as in `calculate_score`, and a batch of
+`--batch` rows, as in `calculate_scores_batch`).
+
+    $ python benchmarks/bench_feature_transform.py --batch 1000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+api_dir = os.path.join(base_dir, 'api')
+sys.path.insert(0, api_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lgb_features import LGBFeatureTransform
+from myexception import InvalidInputError
+from pred_mci import Predictor
+from synthetic_data import SCENARIOS, electric_data, scenario_matrix
+
+
+def reference(scaler, X: np.ndarray) -> np.ndarray:
+    return scaler.transform(X)[:, Predictor.SANITIZER]
+
+
+def synthetic_rows(predictor: Predictor) -> np.ndarray:
+    rows = []
+    for scenario in SCENARIOS:
+        for seed in range(3):
+            try:
+                features = predictor._load_data(electric_data(*scenario_matrix(scenario, seed)))
+            except InvalidInputError:
+                continue
+            for age, sex, edu, solo in ((65, 1, 9, 0), (82, 2, 12, 1)):
+                rows.append(LGBFeatureTransform.base_features(age, sex, edu, solo, *features))
+    return np.vstack(rows)
+
+
+def random_rows(n_rows: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    behavior = np.column_stack([rng.integers(60, 100, n_rows), rng.integers(0, 2, (n_rows, 6))])
+    array_datetime = rng.uniform(0.8, 1.0, (n_rows, 2))
+    usage = rng.integers(0, 40000, (n_rows, 16))
+    return np.hstack([behavior, array_datetime, usage]).astype(np.float64)
+
+
+def check(scaler, transform: LGBFeatureTransform, base: np.ndarray, name: str) -> None:
+    full = LGBFeatureTransform.full_features(base)
+    expected = reference(scaler, full)
+    if not np.array_equal(transform.transform(base), expected):
+        raise AssertionError(f"{name}: fused transform differs from the scaler transform")
+    if not np.array_equal(transform.transform_full(full), expected):
+        raise AssertionError(f"{name}: transform_full differs from the scaler transform")
+    for row in base[:20]:
+        if not np.array_equal(transform.transform(row), reference(scaler, LGBFeatureTransform.full_features(row))):
+            raise AssertionError(f"{name}: fused transform of one row differs from the scaler transform")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=1000, help="number of rows of the batch")
+    parser.add_argument("--number", type=int, default=1000, help="number of calls per timing")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timing repeats")
+    args = parser.parse_args()
+
+    # only the scaler and the feature methods are used, so the models are not loaded
+    predictor = Predictor.__new__(Predictor)
+    predictor.csv_engine = "c"
+    scaler = Predictor._get_scaler(os.path.join(api_dir, "scaler", "lgb_scaler.pickle"))
+    transform = LGBFeatureTransform.from_scaler(scaler, Predictor.SANITIZER)
+
+    check(scaler, transform, synthetic_rows(predictor), "synthetic houses")
+    check(scaler, transform, random_rows(args.batch, seed=0), "random rows")
+    print(f"features match ({len(transform)} of {LGBFeatureTransform.N_FEATURES} columns used)")
+
+    base = random_rows(args.batch, seed=1)
+    row = base[0]
+    timings = {
+        "scaler, one row": lambda: reference(scaler, LGBFeatureTransform.full_features(row)),
+        "fused, one row": lambda: transform.transform(row),
+        f"scaler, {args.batch} rows": lambda: reference(scaler, LGBFeatureTransform.full_features(base)),
+        f"fused, {args.batch} rows": lambda: transform.transform(base),
+    }
+    for name, func in timings.items():
+        seconds = min(timeit.repeat(func, number=args.number, repeat=args.repeat)) / args.number
+        print(f"{name:22s} {seconds * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
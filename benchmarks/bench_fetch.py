@@ -0,0 +1,153 @@
+"""
+Benchmark of the Energy Gateway API fetch of one house (28 daily windows).
+
+Compares the previous loop (one `requests.get` per day, a new connection each time)
+with `main.fetch_electric_data_days` (pooled Session per spid, days fetched
+concurrently) for several numbers of workers, and with the on-disk cache of the
+converted days (`electric_day_cache.ElectricDayCache`, filled by the first repeat), and
+checks that every run returns the same rows in the same order.
+
+By default a stand-in of the Energy Gateway API with a fixed response latency is
+started in a separate process. Use `--url` to run against the mock API server
+(`MOCK_API_URL`, spid 9991) instead.
+
+    $ python benchmarks/bench_fetch.py --latency-ms 100 --workers 1 4 8
+    $ python benchmarks/bench_fetch.py --url http://localhost:8080/0.2/estimated_data --houseid 1
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import requests
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+
+import main
+from electric_day_cache import ElectricDayCache
+from bench_api_convert import convert_previous
+
+APP_TYPE_IDS = [2, 5, 20, 24, 25, 30, 31, 37, 301]
+DATE_FROM = "2024-12-20"
+DATE_TO = "2025-01-16"
+
+
+def make_response(sts: int, ets: int, seed: int) -> bytes:
+    """One window of minute data in the Energy Gateway API format."""
+    rng = np.random.default_rng(seed)
+    timestamps = list(range(sts, ets, 60))
+    powers = np.round(rng.uniform(size=(len(APP_TYPE_IDS), len(timestamps))) * 100, 1)
+    powers[:, rng.uniform(size=len(timestamps)) < 0.2] = 0.0
+    appliance_types = []
+    for j, app_type_id in enumerate(APP_TYPE_IDS):
+        values = [None if rng.uniform() < 0.01 else float(v) for v in powers[j]]
+        appliance_types.append({"appliance_type_id": app_type_id, "appliances": [{"powers": values}]})
+    body = {"data": [{"timestamps": timestamps, "appliance_types": appliance_types}]}
+    return json.dumps(body).encode()
+
+
+def serve(port: int, latency: float, ready) -> None:
+    cache = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            key = (int(query["sts"]), int(query["ets"]))
+            if key not in cache:
+                cache[key] = make_response(key[0], key[1], seed=key[0])
+            time.sleep(latency)
+            body = cache[key]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    ready.set()
+    server.serve_forever()
+
+
+def fetch_previous(url: str, spid, houseid) -> list:
+    """The previous loop: requests.get per day, then the per-timestamp row conversion."""
+    start, n_days = main.get_fetch_window(DATE_FROM, DATE_TO)
+    days = []
+    for day in range(n_days):
+        sts = start + datetime.timedelta(days=day)
+        ets = start + datetime.timedelta(days=(day + 1))
+        headers = {'Authorization': f"imSP {spid}:{os.environ.get('API_SHARED_PASSWORD')}"}
+        params = {'service_provider': spid, 'house': houseid, 'sts': int(sts.timestamp()),
+                  'ets': int(ets.timestamp()), 'time_units': 20}
+        res = requests.get(url, headers=headers, params=params, timeout=30)
+        res.raise_for_status()
+        days.append(convert_previous(res.json(), APP_TYPE_IDS))
+    return days
+
+
+def fetch_current(url: str, spid, houseid, workers: int, cache=None) -> list:
+    days = main.fetch_electric_data_days(url, url, APP_TYPE_IDS, spid, houseid, DATE_FROM, DATE_TO, workers,
+                                         cache=cache)
+    return [(main.electric_data_rows(date_time_jst, values), exist) for date_time_jst, values, exist in days]
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="API URL (default: start a local stand-in)")
+    parser.add_argument("--spid", default="9991")
+    parser.add_argument("--houseid", default="1")
+    parser.add_argument("--port", type=int, default=18181, help="port of the local stand-in")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="response latency of the local stand-in")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=serve, args=(args.port, args.latency_ms / 1000, ready), daemon=True)
+        server.start()
+        ready.wait()
+        url = f"http://127.0.0.1:{args.port}/0.2/estimated_data"
+
+    cache_dir = tempfile.TemporaryDirectory()
+    try:
+        # warm up the stand-in's response cache
+        expected = fetch_previous(url, args.spid, args.houseid)
+        runs = [("previous (requests.get)", lambda: fetch_previous(url, args.spid, args.houseid))]
+        for workers in args.workers:
+            runs.append((f"session, {workers} workers", lambda w=workers: fetch_current(url, args.spid, args.houseid, w)))
+        cache = ElectricDayCache(cache_dir.name)
+        runs.append(("day cache", lambda: fetch_current(url, args.spid, args.houseid, 1, cache)))
+
+        for name, run in runs:
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                days = run()
+                times.append(time.perf_counter() - start)
+                if days != expected:
+                    raise AssertionError(f"{name} returns different rows")
+            print(f"{name:26s} {min(times) * 1000:9.1f} ms / house")
+        print(f"rows match for all runs ({sum(len(rows) for rows, _ in expected)} rows), day cache {cache.stats()}")
+    finally:
+        cache_dir.cleanup()
+        if server is not None:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main_()
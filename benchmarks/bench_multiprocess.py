@@ -0,0 +1,88 @@
+"""
+Benchmark of the house throughput of `main.run_task_houses_multiprocess`.
+
+Scores `--n-houses` houses end to end (API fetch from a local stand-in of the Energy
+Gateway API, features, prediction) with 1, 2, 4, ... worker processes, and reports
+houses per second and the speedup over one worker. The DB writes are recorded in memory
+and every run must give the same results. Throughput can only scale up to the number
+of CPU cores of the machine (os.cpu_count()).
+
+    $ python benchmarks/bench_multiprocess.py --n-houses 32 --workers 1 2 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+
+import main
+from bench_fetch import serve, APP_TYPE_IDS, DATE_FROM, DATE_TO
+from electric_data import CSV_COLUMNS
+
+
+class RecordingWriter:
+    """TaskHouseWriter stand-in keeping the writes in memory."""
+
+    def __init__(self):
+        self.results = {}
+        self.progress = {}
+
+    def update(self, task_house_id, status, progress):
+        self.progress[task_house_id] = (status, progress)
+
+    def fail(self, task_house_id, progress):
+        self.progress[task_house_id] = (-1, progress)
+        self.results[task_house_id] = -1
+
+    def result(self, task_house_id, result):
+        self.results[task_house_id] = 100 - int(result)
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-houses", type=int, default=16)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=18182, help="port of the local stand-in")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="response latency of the local stand-in")
+    parser.add_argument("--predict-batch-size", type=int, default=100)
+    args = parser.parse_args()
+    print(f"cpu_count={os.cpu_count()}")
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(args.port, args.latency_ms / 1000, ready), daemon=True)
+    server.start()
+    ready.wait()
+    url = f"http://127.0.0.1:{args.port}/0.2/estimated_data"
+
+    fetch_config = main.FetchConfig(url, url, APP_TYPE_IDS, CSV_COLUMNS, max_workers=1, archive_csv=False)
+    task_houses = [(i, 9991, i, 60 + i % 40, 1 + i % 2, 6 + i % 12, i % 2) for i in range(args.n_houses)]
+    try:
+        main.get_predictor()
+        expected = None
+        baseline = None
+        for workers in args.workers:
+            writer = RecordingWriter()
+            start = time.perf_counter()
+            if workers == 1:
+                main.run_task_houses(writer, fetch_config, DATE_FROM, DATE_TO, task_houses, args.predict_batch_size)
+            else:
+                main.run_task_houses_multiprocess(
+                    writer, fetch_config, DATE_FROM, DATE_TO, task_houses, args.predict_batch_size, workers)
+            elapsed = time.perf_counter() - start
+            if expected is None:
+                expected = writer.results
+            elif writer.results != expected:
+                raise AssertionError(f"workers={workers} gives different results")
+            throughput = args.n_houses / elapsed
+            baseline = baseline or throughput
+            print(f"workers={workers:2d} {elapsed:8.2f} s {throughput:8.2f} houses/s  speedup {throughput / baseline:5.2f}x")
+        print(f"results match for all runs ({len(expected)} houses)")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,91 @@
+"""
+Benchmark of the memory and feature time of `electric_data.PackedElectricData`.
+
+For synthetic houses (`synthetic_data.py`), compares the memory of one house held as
+the float64 DataFrame of the CSV, as `ElectricData` and as `PackedElectricData`, the
+memory of `--n-houses` houses held at once (tracemalloc), and the time of
+`Predictor._load_data` on each, and checks that the packed data gives exactly the
+same features and the same status 202 for the missing-data scenarios.
+
+    $ python benchmarks/bench_packed_data.py --n-houses 1000
+"""
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(base_dir, 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from electric_data import ElectricData, PackedElectricData, CSV_COLUMNS
+from myexception import InvalidInputError
+from pred_mci import Predictor
+from synthetic_data import SCENARIOS, electric_rows, scenario_matrix
+
+
+def features(predictor: Predictor, data) -> tuple:
+    try:
+        return tuple(predictor._load_data(data))
+    except InvalidInputError as e:
+        return (e.status_code,)
+
+
+def same_features(a: tuple, b: tuple) -> bool:
+    return len(a) == len(b) and all(np.array_equal(x, y) for x, y in zip(a, b))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-houses", type=int, default=200, help="number of houses held in memory at once")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timing repeats")
+    args = parser.parse_args()
+
+    # only the feature methods are used, so the models are not loaded
+    predictor = Predictor.__new__(Predictor)
+    predictor.csv_engine = "c"
+
+    for scenario in SCENARIOS:
+        timestamps, values = scenario_matrix(scenario, seed=0)
+        electric_data = ElectricData.from_matrix(timestamps, values)
+        expected = features(predictor, electric_data)
+        if not same_features(expected, features(predictor, electric_data.pack())):
+            raise AssertionError(f"{scenario}: packed data gives different features")
+        packed = electric_data.pack()
+        if not (np.array_equal(packed.flags(), electric_data.flags) and np.array_equal(packed.missing(), electric_data.missing)):
+            raise AssertionError(f"{scenario}: packed data does not unpack to the same flags")
+    print(f"features match for all scenarios ({', '.join(SCENARIOS)})")
+
+    timestamps, values = scenario_matrix("typical", seed=0)
+    df = pd.DataFrame(electric_rows(timestamps, values), columns=CSV_COLUMNS)
+    df[CSV_COLUMNS[1:]] = df[CSV_COLUMNS[1:]].astype(np.float64)
+    electric_data = ElectricData.from_matrix(timestamps, values)
+    packed = electric_data.pack()
+    sizes = {
+        "DataFrame (float64)": df.memory_usage(deep=True).sum(),
+        "ElectricData": electric_data.flags.nbytes + electric_data.missing.nbytes + electric_data.date_time_jst.nbytes,
+        "PackedElectricData": packed.nbytes,
+    }
+    for name, size in sizes.items():
+        print(f"{name:22s} {size / 1024:10.1f} KB  ({sizes['DataFrame (float64)'] / size:5.1f}x smaller than the DataFrame)")
+
+    for name, build in (("ElectricData", lambda k: ElectricData.from_matrix(*scenario_matrix("typical", k))),
+                        ("PackedElectricData", lambda k: ElectricData.from_matrix(*scenario_matrix("typical", k)).pack())):
+        tracemalloc.start()
+        houses = [build(k % 10) for k in range(args.n_houses)]
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del houses
+        print(f"{args.n_houses} houses as {name:20s} {held / 1024 ** 2:8.1f} MB")
+
+    for name, data in (("ElectricData", electric_data), ("PackedElectricData", packed)):
+        seconds = min(timeit.repeat(lambda: predictor._load_data(data), number=1, repeat=args.repeat))
+        print(f"_load_data {name:20s} {seconds * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
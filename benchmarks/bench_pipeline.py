@@ -0,0 +1,228 @@
+"""
+Benchmark suite of the prediction pipeline of `pred_mci.Predictor`.
+
+Times each stage on synthetic houses (`synthetic_data.py`): `Predictor.__init__`,
+`_load_data` (from a CSV file, from rows in the CSV format and from `ElectricData`),
+`_divide_array`, `predict_lightgbm`, `predict_logistic` and end-to-end
+`calculate_score` for each missing-data scenario, including the two electric rate
+checks that give status 202. For each stage it reports the p50 and p95 of the call
+time, the throughput (calls per second) and the peak RSS while running the stage
+(reset per stage on Linux, otherwise the peak of the process so far).
+
+`--output` writes the results to JSON. `--compare` reads such a JSON as the baseline
+and flags every stage whose p50 is more than `--tolerance` slower than the baseline
+(exit status 1 if any), so a change to pred_mci.py can be checked against the
+results of the previous commit:
+
+    $ python benchmarks/bench_pipeline.py --output baseline.json
+    $ git checkout my-change
+    $ python benchmarks/bench_pipeline.py --compare baseline.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+api_dir = os.path.join(base_dir, 'api')
+sys.path.insert(0, api_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pred_mci import Predictor
+from synthetic_data import SCENARIOS, electric_data, electric_rows, scenario_matrix, write_electric_csv
+
+MODEL_PATHS = dict(
+    lgb_models_dir_path=os.path.join(api_dir, "models", "lgb", "*.txt"),
+    logi_models_dir_path=os.path.join(api_dir, "models", "logistic", "*.pkl"),
+    lgb_scaler_path=os.path.join(api_dir, "scaler", "lgb_scaler.pickle"),
+    logi_scaler_path=os.path.join(api_dir, "scaler", "logi_scaler.pickle"),
+)
+# Status code of calculate_score expected for each scenario
+EXPECTED_STATUS = {"complete": 100, "typical": 100, "low_rate": 202, "gappy_days": 202}
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak RSS of this process (Linux only). Returns False if not supported.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak RSS of this process in MB (since the last reset on Linux).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+
+
+def measure(func: Callable[[int], object], repeat: int) -> dict:
+    """
+    Call func(0), ..., func(repeat - 1) and summarize the call times.
+    """
+    func(0)  # warm up (imports, caches)
+    peak_reset = reset_peak_rss()
+    times = []
+    start = time.perf_counter()
+    for i in range(repeat):
+        call_start = time.perf_counter()
+        func(i)
+        times.append(time.perf_counter() - call_start)
+    total = time.perf_counter() - start
+    return {
+        "calls": repeat,
+        "p50_ms": float(np.percentile(times, 50)) * 1000,
+        "p95_ms": float(np.percentile(times, 95)) * 1000,
+        "mean_ms": statistics.fmean(times) * 1000,
+        "throughput_per_s": repeat / total if total > 0 else float("inf"),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_scope": "stage" if peak_reset else "process",
+    }
+
+
+def run_suite(args: argparse.Namespace, tmp_dir: str) -> Dict[str, dict]:
+    backend = dict(lgb_backend=args.lgb_backend, logi_backend=args.logi_backend, model_bundle_path=args.bundle)
+    stages = {}
+    stages["init"] = measure(lambda i: Predictor(**MODEL_PATHS, **backend), args.init_repeat)
+    predictor = Predictor(**MODEL_PATHS, **backend)
+
+    # houses of each scenario in every input form
+    houses = {}
+    for scenario in SCENARIOS:
+        houses[scenario] = []
+        for k in range(args.n_houses):
+            timestamps, values = scenario_matrix(scenario, seed=k)
+            path = os.path.join(tmp_dir, f"{scenario}_{k}.csv")
+            write_electric_csv(path, timestamps, values)
+            houses[scenario].append({
+                "csv": path,
+                "rows": electric_rows(timestamps, values),
+                "electric_data": electric_data(timestamps, values),
+                "demographics": (60 + 5 * (k % 6), 1 + k % 2, 9 + k % 6, k % 2),
+            })
+
+    typical = houses["typical"]
+    n = len(typical)
+    stages["load_data_csv"] = measure(lambda i: predictor._load_data(typical[i % n]["csv"]), args.repeat)
+    stages["load_data_rows"] = measure(lambda i: predictor._load_data(typical[i % n]["rows"]), args.repeat)
+    stages["load_data_electric_data"] = measure(
+        lambda i: predictor._load_data(typical[i % n]["electric_data"]), args.repeat
+    )
+    stages["divide_array"] = measure(
+        lambda i: predictor._divide_array(typical[i % n]["electric_data"].flags), args.repeat
+    )
+    stages["predict_lightgbm"] = measure(
+        lambda i: predictor.predict_lightgbm(*typical[i % n]["demographics"], typical[i % n]["electric_data"]),
+        args.repeat
+    )
+    stages["predict_logistic"] = measure(
+        lambda i: predictor.predict_logistic(*typical[i % n]["demographics"]), args.repeat
+    )
+
+    for scenario, scenario_houses in houses.items():
+        statuses = set()
+
+        def score(i: int, scenario_houses: List[dict] = scenario_houses, statuses: set = statuses) -> None:
+            house = scenario_houses[i % len(scenario_houses)]
+            age, sex, edu, solo = house["demographics"]
+            result = predictor.calculate_score(age, 1 if sex == 1 else 0, edu, solo, house["csv"])
+            statuses.add(result["status_code"])
+
+        stages[f"calculate_score_{scenario}"] = measure(score, args.repeat)
+        if statuses != {EXPECTED_STATUS[scenario]}:
+            raise AssertionError(f"{scenario} gives status codes {sorted(statuses)}, expected {EXPECTED_STATUS[scenario]}")
+    return stages
+
+
+def compare(stages: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    Print the p50 of each stage against the baseline and return the regressed stages.
+    """
+    regressions = []
+    print(f"\n{'stage':34s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, result in stages.items():
+        if name not in baseline:
+            print(f"{name:34s} {'-':>12s} {result['p50_ms']:10.2f}ms  (new)")
+            continue
+        before = baseline[name]["p50_ms"]
+        change = result["p50_ms"] / before - 1 if before > 0 else 0.0
+        regressed = change > tolerance
+        if regressed:
+            regressions.append(name)
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:34s} {before:10.2f}ms {result['p50_ms']:10.2f}ms {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="number of calls per stage")
+    parser.add_argument("--init-repeat", type=int, default=3, help="number of Predictor constructions")
+    parser.add_argument("--n-houses", type=int, default=4, help="number of synthetic houses per scenario")
+    parser.add_argument("--lgb-backend", default="lightgbm", choices=Predictor.LGB_BACKENDS)
+    parser.add_argument("--logi-backend", default="sklearn", choices=Predictor.LOGI_BACKENDS)
+    parser.add_argument("--bundle", default=None, help="model bundle (requires --lgb-backend numpy)")
+    parser.add_argument("--output", default=None, help="JSON file to write the results to")
+    parser.add_argument("--compare", default=None, help="JSON results of a baseline run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="p50 slowdown flagged as a regression")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stages = run_suite(args, tmp_dir)
+
+    print(f"{'stage':34s} {'p50':>10s} {'p95':>10s} {'calls/s':>10s} {'peak RSS':>10s}")
+    for name, result in stages.items():
+        print(
+            f"{name:34s} {result['p50_ms']:8.2f}ms {result['p95_ms']:8.2f}ms "
+            f"{result['throughput_per_s']:10.1f} {result['peak_rss_mb']:8.1f}MB"
+        )
+
+    if args.output is not None:
+        report = {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+            "config": vars(args),
+            "stages": stages,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.compare is not None:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+        regressions = compare(stages, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"no stage slower than the baseline by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
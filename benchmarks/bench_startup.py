@@ -0,0 +1,97 @@
+"""
+Benchmark of the model loading time of `pred_mci.Predictor`.
+
+Compares the construction of a Predictor from the model directories (500 LightGBM text
+models, 50 pickled Logistic Regression models and 2 pickled scalers), on one or more
+loading threads (`load_workers`), with the construction from the model bundle
+(`api/model_bundle.py`, one memory-mapped file). Prints the load time of each phase and
+checks that every configuration gives the same scores on synthetic houses. The bundle is
+built to a temporary file unless `--bundle` is given. Loading threads can only help on a
+machine with several CPU cores.
+
+    $ python benchmarks/bench_startup.py --repeat 5 --load-workers 1 4
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+api_dir = os.path.join(base_dir, 'api')
+sys.path.insert(0, api_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_csv_reader import write_csv
+from model_bundle import build_bundle, sorted_model_paths
+from pred_mci import Predictor
+
+MODEL_PATHS = dict(
+    lgb_models_dir_path=os.path.join(api_dir, "models", "lgb", "*.txt"),
+    logi_models_dir_path=os.path.join(api_dir, "models", "logistic", "*.pkl"),
+    lgb_scaler_path=os.path.join(api_dir, "scaler", "lgb_scaler.pickle"),
+    logi_scaler_path=os.path.join(api_dir, "scaler", "logi_scaler.pickle"),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="number of timing repeats")
+    parser.add_argument("--bundle", default=None, help="existing bundle (default: build one to a temporary file)")
+    parser.add_argument("--load-workers", type=int, nargs="+", default=[1, 4], help="numbers of loading threads")
+    parser.add_argument("--n-houses", type=int, default=4, help="number of synthetic houses to compare scores on")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bundle_path = args.bundle
+        if bundle_path is None:
+            bundle_path = os.path.join(tmp_dir, "model_bundle.bin")
+            start = time.perf_counter()
+            build_bundle(
+                bundle_path,
+                sorted_model_paths(MODEL_PATHS["lgb_models_dir_path"]),
+                sorted_model_paths(MODEL_PATHS["logi_models_dir_path"]),
+                MODEL_PATHS["lgb_scaler_path"], MODEL_PATHS["logi_scaler_path"]
+            )
+            print(f"bundle built in {time.perf_counter() - start:.2f} s ({os.path.getsize(bundle_path) / 1024 ** 2:.2f} MB)")
+
+        records = []
+        for i in range(args.n_houses):
+            path = os.path.join(tmp_dir, f"house_{i}.csv")
+            write_csv(path, i, datetime.datetime(2024, 12, 20), nan_rate=0.0)
+            records.append((60 + 5 * i, i % 2, 9 + i, i % 2, path))
+
+        configs = {}
+        for workers in args.load_workers:
+            configs[f"directories, lightgbm, {workers}w"] = dict(lgb_backend="lightgbm", load_workers=workers)
+            configs[f"directories, numpy, {workers}w"] = dict(lgb_backend="numpy", load_workers=workers)
+        configs.update({
+            "bundle, numpy/sklearn": dict(lgb_backend="numpy", model_bundle_path=bundle_path),
+            "bundle, numpy/stacked": dict(lgb_backend="numpy", logi_backend="stacked", model_bundle_path=bundle_path),
+        })
+        expected = None
+        baseline = None
+        for name, kwargs in configs.items():
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                predictor = Predictor(**MODEL_PATHS, **kwargs)
+                times.append(time.perf_counter() - start)
+            scores = [predictor.calculate_score(*record) for record in records]
+            if expected is None:
+                expected = scores
+            elif scores != expected:
+                raise AssertionError(f"{name} gives different scores")
+            median = statistics.median(times)
+            baseline = baseline or median
+            phases = " ".join(f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in predictor.load_timings.items())
+            print(f"{name:30s} {median * 1000:9.1f} ms  speedup {baseline / median:7.1f}x  ({phases})")
+    print(f"scores match for all configurations ({len(expected)} houses)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Check of the lease-based claiming of task_houses (`TASK_CLAIM_MODE=lease`) against MySQL.
+
+Creates a task with `--n-houses` houses in a scratch database, then runs `--workers`
+processes that each claim houses with `main.claim_task_houses` and finish them with
+`main.update_task_houses` until none are left, as concurrent job executions would. One
+extra worker claims a batch first and "crashes" without finishing it; its houses must be
+reclaimed once the lease (`--lease-seconds`) expires. Checks that every house is
+finished exactly once apart from the crashed batch, and that `main.finish_task_if_done`
+ends the task once. Requires MySQL 8.0 or later (SKIP LOCKED), e.g. a local container:
+
+    $ docker run -d --name mci-mysql -p 3306:3306 -e MYSQL_ROOT_PASSWORD=root -e MYSQL_DATABASE=test_mci mysql:8.0
+    $ python benchmarks/bench_task_claim.py --host 127.0.0.1 --database test_mci --setup
+
+`--setup` creates minimal `tasks` / `task_houses` tables (only the columns main.py uses)
+if they do not exist. Never point it at a production database.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+
+import mysql.connector
+
+import main
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS `tasks` (
+        id INT AUTO_INCREMENT PRIMARY KEY, date_from DATE, date_to DATE, algorithm INT,
+        starting_at DATETIME, start_at DATETIME NULL, end_at DATETIME NULL, status INT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS `task_houses` (
+        id INT AUTO_INCREMENT PRIMARY KEY, task_id INT, spid INT, houseid INT, age INT, sex INT,
+        education INT, solo INT, status INT DEFAULT 0, progress INT DEFAULT 0, updated_at DATETIME NULL,
+        lease_owner VARCHAR(128) NULL, lease_expires_at DATETIME NULL,
+        INDEX idx_task_houses_claim (task_id, status, lease_expires_at)
+    )""",
+]
+
+
+def connect(args):
+    return mysql.connector.connect(host=args.host, port=args.port, user=args.user, password=args.password,
+                                   database=args.database)
+
+
+def worker(args, task_id, name, crash, claimed):
+    cnx = connect(args)
+    cursor = cnx.cursor()
+    try:
+        while True:
+            task_houses = main.claim_task_houses(cnx, cursor, task_id, name, args.claim_size, args.lease_seconds)
+            if len(task_houses) == 0:
+                break
+            claimed.extend((name, task_house[0]) for task_house in task_houses)
+            if crash:
+                return
+            for task_house in task_houses:
+                main.update_task_houses(cnx, cursor, task_house[0], 1, 100)
+        main.finish_task_if_done(cnx, cursor, task_id)
+    finally:
+        cnx.close()
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="root")
+    parser.add_argument("--database", required=True)
+    parser.add_argument("--setup", action="store_true", help="create the tables if they do not exist")
+    parser.add_argument("--n-houses", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--claim-size", type=int, default=20)
+    parser.add_argument("--lease-seconds", type=int, default=3)
+    args = parser.parse_args()
+
+    cnx = connect(args)
+    cursor = cnx.cursor()
+    if args.setup:
+        for sql in SCHEMA:
+            cursor.execute(sql)
+    cursor.execute("INSERT INTO `tasks` (date_from, date_to, algorithm, starting_at) "
+                   "VALUES ('2024-12-20', '2025-01-16', 4, NOW())")
+    task_id = cursor.lastrowid
+    cursor.executemany(
+        "INSERT INTO `task_houses` (task_id, spid, houseid, age, sex, education, solo, status, progress) "
+        "VALUES (%s, %s, %s, 70, 1, 12, 0, 0, 0)",
+        [(task_id, 9991, i) for i in range(args.n_houses)])
+    cnx.commit()
+
+    with multiprocessing.Manager() as manager:
+        claimed = manager.list()
+        # a worker that claims one batch and never finishes it
+        crashed = multiprocessing.Process(target=worker, args=(args, task_id, "crashed", True, claimed))
+        crashed.start()
+        crashed.join()
+        crashed_ids = {house_id for _, house_id in claimed}
+
+        start = time.perf_counter()
+        workers = [multiprocessing.Process(target=worker, args=(args, task_id, f"worker-{i}", False, claimed))
+                   for i in range(args.workers)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - start
+        first_pass = list(claimed)
+
+        # the crashed batch is reclaimed once its lease has expired (by the workers if they ran long enough)
+        time.sleep(args.lease_seconds + 1)
+        worker(args, task_id, "reclaimer", False, claimed)
+        claims = list(claimed)
+
+    counts = Counter(house_id for _, house_id in claims)
+    duplicated = {house_id for house_id, n in counts.items() if n > 1 and house_id not in crashed_ids}
+    cursor.execute("SELECT COUNT(*) FROM `task_houses` WHERE task_id = %s AND status = 1", (task_id,))
+    (n_finished,) = cursor.fetchone()
+    cursor.execute("SELECT status, end_at IS NOT NULL FROM `tasks` WHERE id = %s", (task_id,))
+    task_status, task_ended = cursor.fetchone()
+    cnx.close()
+
+    if duplicated:
+        raise AssertionError(f"{len(duplicated)} houses were claimed by several workers: {sorted(duplicated)[:10]}")
+    if not crashed_ids <= {house_id for name, house_id in claims if name != "crashed"}:
+        raise AssertionError("the houses of the crashed worker were not reclaimed")
+    if n_finished != args.n_houses or not task_ended or task_status != 1:
+        raise AssertionError(f"{n_finished}/{args.n_houses} houses finished, task status {task_status}")
+    per_worker = Counter(name for name, _ in first_pass)
+    print(f"task {task_id}: {args.n_houses} houses claimed by {args.workers} workers in {elapsed:.2f} s "
+          f"({args.n_houses / elapsed:.0f} houses/s), per worker {dict(per_worker)}")
+    print(f"no house claimed twice, {len(crashed_ids)} houses of the crashed worker reclaimed, task finished once")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,114 @@
+"""
+Benchmark of the task_houses / task_results writes of one task.
+
+Replays the writes of `--n-houses` houses (progress 10, 20, 30, 50, the task_results
+INSERT and progress 100, with every `--fail-every`-th house failing after progress 20)
+through `main.TaskHouseWriter` (one UPDATE or INSERT and one commit per write) and
+`main.BatchedTaskHouseWriter` (coalesced progress, executemany, one transaction per
+batch of houses). The connection is a stand-in that sleeps `--rtt-ms` per round trip and
+`--commit-ms` per commit and counts them. As in mysql-connector, executemany of an
+INSERT ... VALUES is one multi-row statement and executemany of an UPDATE is one
+statement per row. Every writer must leave the same final status and task_results.
+
+    $ python benchmarks/bench_task_house_writer.py --n-houses 1000 --batch 10 100
+"""
+import argparse
+import os
+import sys
+import time
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+
+import main
+
+
+class Connection:
+    """MySQL connection stand-in keeping the rows and counting round trips and commits."""
+
+    def __init__(self, rtt: float, commit_time: float):
+        self.rtt = rtt
+        self.commit_time = commit_time
+        self.round_trips = 0
+        self.commits = 0
+        self.status = {}
+        self.results = []
+
+    def _round_trip(self):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+
+    def execute(self, sql, param):
+        self._round_trip()
+        if sql.startswith("UPDATE"):
+            status, progress, task_house_id = param
+            self.status[task_house_id] = (status, progress)
+        else:
+            self.results.append(param)
+
+    def executemany(self, sql, params):
+        if sql.startswith("UPDATE"):
+            for param in params:
+                self.execute(sql, param)
+        else:
+            self._round_trip()
+            self.results.extend(params)
+
+    def commit(self):
+        self.commits += 1
+        time.sleep(self.commit_time)
+
+    def rollback(self):
+        pass
+
+
+def replay(writer, n_houses: int, fail_every: int) -> None:
+    for task_house_id in range(n_houses):
+        for progress in (10, 20):
+            writer.update(task_house_id, 0, progress)
+        if fail_every and task_house_id % fail_every == 0:
+            writer.fail(task_house_id, 20)
+            continue
+        writer.update(task_house_id, 0, 30)
+        writer.update(task_house_id, 0, 50)
+        writer.result(task_house_id, task_house_id % 100)
+        writer.update(task_house_id, 1, 100)
+    writer.flush()
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-houses", type=int, default=500)
+    parser.add_argument("--batch", type=int, nargs="+", default=[10, 100], help="TASK_HOUSE_WRITE_BATCH values")
+    parser.add_argument("--interval", type=float, default=5.0, help="TASK_HOUSE_WRITE_INTERVAL (seconds)")
+    parser.add_argument("--fail-every", type=int, default=10, help="every n-th house fails (0: none)")
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="round trip time of the stand-in")
+    parser.add_argument("--commit-ms", type=float, default=2.0, help="commit (fsync) time of the stand-in")
+    args = parser.parse_args()
+
+    writers = [("TaskHouseWriter", lambda cnx: main.TaskHouseWriter(cnx, cnx, 1))]
+    for batch in args.batch:
+        writers.append((f"Batched, {batch} houses",
+                        lambda cnx, b=batch: main.BatchedTaskHouseWriter(cnx, cnx, 1, b, args.interval)))
+
+    expected = None
+    baseline = None
+    print(f"{'writer':24s} {'time':>9s} {'round trips':>12s} {'commits':>8s}")
+    for name, make_writer in writers:
+        cnx = Connection(args.rtt_ms / 1000, args.commit_ms / 1000)
+        start = time.perf_counter()
+        replay(make_writer(cnx), args.n_houses, args.fail_every)
+        elapsed = time.perf_counter() - start
+        state = (cnx.status, sorted(cnx.results))
+        if expected is None:
+            expected = state
+        elif state != expected:
+            raise AssertionError(f"{name} leaves a different final state")
+        load = cnx.round_trips + cnx.commits
+        baseline = baseline or load
+        print(f"{name:24s} {elapsed:8.2f}s {cnx.round_trips:12d} {cnx.commits:8d}  DB load {baseline / load:5.1f}x lower")
+    print(f"final status and task_results match for all writers ({args.n_houses} houses)")
+
+
+if __name__ == "__main__":
+    main_()
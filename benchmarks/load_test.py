@@ -0,0 +1,136 @@
+"""
+Load test of the prediction service (`server.py`).
+
+Sends `--requests` prediction requests for synthetic houses (`synthetic_data.py`) from
+`--concurrency` concurrent clients, as JSON rows (`--format json`) or CSV uploads
+(`--format csv`), and reports the client-side latency (p50 / p95 / p99), the throughput,
+the count per HTTP status and per prediction status code, and the server-side batch
+sizes and stage times from `/metrics?format=json`.
+
+    $ python server.py &
+    $ python benchmarks/load_test.py --url http://localhost:8080 --concurrency 16 --requests 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_data import SCENARIOS, electric_rows, scenario_matrix, write_electric_csv
+
+
+def payloads(n_houses: int, data_format: str) -> List[Tuple[str, bytes, str]]:
+    """
+    (path, body, content type) of the prediction request of each synthetic house.
+    """
+    rng = np.random.default_rng(0)
+    requests = []
+    for k in range(n_houses):
+        scenario = list(SCENARIOS)[k % len(SCENARIOS)]
+        timestamps, values = scenario_matrix(scenario, seed=k)
+        behavior = {"age": int(rng.integers(60, 100)), "male": int(rng.integers(0, 2)),
+                    "edu": int(rng.integers(6, 17)), "solo": int(rng.integers(0, 2))}
+        if data_format == "csv":
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, "electric_data.csv")
+                write_electric_csv(path, timestamps, values)
+                with open(path, "rb") as f:
+                    body = f.read()
+            requests.append((f"/predict?{urllib.parse.urlencode(behavior)}", body, "text/csv"))
+        else:
+            body = json.dumps(dict(behavior, electric_data=electric_rows(timestamps, values))).encode("utf-8")
+            requests.append(("/predict", body, "application/json"))
+    return requests
+
+
+def send(url: str, request: Tuple[str, bytes, str], timeout: float) -> Tuple[float, int, int]:
+    """
+    Send one request and return (latency in seconds, HTTP status, prediction status code or 0).
+    """
+    path, body, content_type = request
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(
+            urllib.request.Request(url + path, data=body, headers={"Content-Type": content_type}), timeout=timeout
+        ) as response:
+            http_status = response.status
+            payload = json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        http_status = e.code
+        payload = {}
+        e.read()
+    return time.perf_counter() - started, http_status, payload.get("status_code", 0)
+
+
+def percentile(values: List[float], q: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8080", help="URL of the prediction service")
+    parser.add_argument("--concurrency", type=int, default=16, help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="number of requests")
+    parser.add_argument("--houses", type=int, default=8, help="number of distinct synthetic houses")
+    parser.add_argument("--format", default="json", choices=("json", "csv"), help="request format")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request (seconds)")
+    parser.add_argument("--output", default=None, help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    with urllib.request.urlopen(args.url + "/health", timeout=args.timeout) as response:
+        print(f"health: {response.read().decode('utf-8')}")
+    requests = payloads(args.houses, args.format)
+    print(f"{len(requests)} houses, {statistics.mean(len(body) for _, body, _ in requests) / 1024:.0f} KB per request")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda i: send(args.url, requests[i % len(requests)], args.timeout), range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, http_status, _ in results if http_status == 200]
+    http_statuses = {}
+    status_codes = {}
+    for _, http_status, status_code in results:
+        http_statuses[http_status] = http_statuses.get(http_status, 0) + 1
+        if http_status == 200:
+            status_codes[status_code] = status_codes.get(status_code, 0) + 1
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_s": elapsed,
+        "requests_per_s": args.requests / elapsed,
+        "http_statuses": http_statuses,
+        "status_codes": status_codes,
+    }
+    if latencies:
+        report.update({f"p{q}_s": percentile(latencies, q) for q in (50, 95, 99)})
+    with urllib.request.urlopen(args.url + "/metrics?format=json", timeout=args.timeout) as response:
+        server = json.loads(response.read())
+    report["server"] = {"batcher": server["batcher"], "stages": server["summary"]["stages"]}
+
+    print(f"{args.requests} requests in {elapsed:.2f}s ({report['requests_per_s']:.1f} req/s), "
+          f"HTTP statuses {http_statuses}, status codes {status_codes}")
+    if latencies:
+        print(f"latency p50 {report['p50_s'] * 1000:.1f} ms, p95 {report['p95_s'] * 1000:.1f} ms, p99 {report['p99_s'] * 1000:.1f} ms")
+    batcher = server["batcher"]
+    print(f"server batches {batcher['batches']}, mean batch size {batcher['mean_batch_size']:.1f}, max {batcher['max_batch_size']}")
+    for stage, stats in server["summary"]["stages"].items():
+        print(f"  {stage:14s} count {stats['count']:6d}  p50 {stats['p50_s'] * 1000:9.2f} ms  p95 {stats['p95_s'] * 1000:9.2f} ms")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
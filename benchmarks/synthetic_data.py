@@ -0,0 +1,129 @@
+"""
+Synthetic electric data of one house for the benchmarks.
+
+Generates 28 days of minute-level appliance data (40320 rows x 10 columns in the
+electric data CSV format, `electric_data.CSV_COLUMNS`) with an hour-of-day usage
+profile per appliance and usage in runs of several minutes, as a CSV file or in memory
+(rows in the CSV format, a minute matrix or `ElectricData`). Missing rows are
+configurable: scattered rows (`missing_rate`) and a gap of `gap_minutes` minutes on
+`gap_days` days. The scenarios in `SCENARIOS` cover the complete data, typical data
+and the two electric rate checks of `Predictor._check_electric_rate` (status 202).
+"""
+import csv
+import datetime
+import os
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(base_dir, 'api'))
+
+from electric_data import ElectricData, CSV_COLUMNS, DATETIME_FORMAT, MINUTES_PER_DAY
+
+N_DAYS = 28
+N_ROWS = N_DAYS * MINUTES_PER_DAY
+# Usage comes in runs of this many minutes
+RUN_MINUTES = 10
+START = datetime.datetime(2024, 12, 20)
+
+# Probability of use of each appliance (CSV_COLUMNS[1:]) per hour of day
+_HOURS = np.arange(24)
+_MEALS = np.isin(_HOURS, [6, 7, 11, 12, 18, 19]).astype(float)
+_AWAKE = ((_HOURS >= 6) & (_HOURS <= 22)).astype(float)
+USAGE_PROFILE = np.array([
+    0.15 + 0.35 * _AWAKE,                  # air_conditioner
+    0.02 + 0.15 * _AWAKE * (_HOURS < 12),  # clothes_washer
+    0.01 + 0.30 * _MEALS,                  # microwave
+    np.full(24, 0.95),                     # refrigerator
+    0.01 + 0.40 * _MEALS,                  # rice_cooker
+    0.02 + 0.50 * _AWAKE,                  # TV
+    0.01 + 0.08 * _AWAKE,                  # cleaner
+    0.01 + 0.35 * _MEALS,                  # IH
+    0.05 + 0.25 * (1 - _AWAKE),            # Heater
+]).T
+
+# name -> (missing_rate, gap_days, gap_minutes)
+SCENARIOS: Dict[str, Tuple[float, int, int]] = {
+    # every row present
+    "complete": (0.0, 0, 0),
+    # a few scattered missing rows (status 100)
+    "typical": (0.01, 0, 0),
+    # electric rate below 95% (status 202)
+    "low_rate": (0.06, 0, 0),
+    # electric rate >= 95% overall, but 26 days over the daily limit of missing rows (status 202)
+    "gappy_days": (0.0, 26, 75),
+}
+
+
+def minute_matrix(
+    seed: int,
+    missing_rate: float = 0.0,
+    gap_days: int = 0,
+    gap_minutes: int = 0,
+    start: datetime.datetime = START
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Minute timestamps (datetime64[m]) and appliance values (N_ROWS x 9, 0/1, NaN if missing).
+
+    :param seed: Seed of the random generator (same seed, same data).
+    :param missing_rate: Probability of each row to be missing.
+    :param gap_days: Number of days with a gap of missing rows.
+    :param gap_minutes: Length of the gap of each of those days.
+    :param start: First minute of the data.
+    """
+    rng = np.random.default_rng(seed)
+    n_runs = N_ROWS // RUN_MINUTES
+    run_hours = (np.arange(n_runs) * RUN_MINUTES // 60) % 24
+    in_use = rng.uniform(size=(n_runs, USAGE_PROFILE.shape[1])) < USAGE_PROFILE[run_hours]
+    values = np.repeat(in_use, RUN_MINUTES, axis=0).astype(np.float64)
+
+    missing = rng.uniform(size=N_ROWS) < missing_rate
+    if gap_days > 0:
+        days = rng.choice(N_DAYS, size=min(gap_days, N_DAYS), replace=False)
+        offsets = rng.integers(0, MINUTES_PER_DAY - gap_minutes + 1, size=len(days))
+        for day, offset in zip(days, offsets):
+            first = day * MINUTES_PER_DAY + offset
+            missing[first:first + gap_minutes] = True
+    values[missing] = np.nan
+
+    timestamps = np.datetime64(start, "m") + np.arange(N_ROWS).astype("timedelta64[m]")
+    return timestamps, values
+
+
+def scenario_matrix(scenario: str, seed: int, start: datetime.datetime = START) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    `minute_matrix` with the missing rows of a scenario in `SCENARIOS`.
+    """
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Invalid scenario: {scenario}. Expected one of {tuple(SCENARIOS)}.")
+    return minute_matrix(seed, *SCENARIOS[scenario], start=start)
+
+
+def electric_rows(timestamps: np.ndarray, values: np.ndarray) -> List[list]:
+    """
+    Rows in the CSV format (date_time_jst string, then 0/1 or None per appliance).
+    """
+    date_time_jst = pd.Series(timestamps).dt.strftime(DATETIME_FORMAT).tolist()
+    cells = values.astype(int).astype(object)
+    cells[np.isnan(values)] = None
+    return [[d] + row for d, row in zip(date_time_jst, cells.tolist())]
+
+
+def electric_data(timestamps: np.ndarray, values: np.ndarray) -> ElectricData:
+    """
+    `ElectricData` of the minute matrix, as main.py builds it from the API responses.
+    """
+    return ElectricData.from_matrix(timestamps, values)
+
+
+def write_electric_csv(path: str, timestamps: np.ndarray, values: np.ndarray) -> None:
+    """
+    Write the minute matrix as an electric data CSV, as main.py writes it.
+    """
+    with open(path, mode='w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(electric_rows(timestamps, values))
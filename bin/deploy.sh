@@ -152,6 +152,19 @@ if [ -n "$MOCK_API_URL" ]; then
     echo -e "${GREEN}✓ Mock API URL (spid=9991用): $MOCK_API_URL${NC}"
 fi
 
+# TASK_CLAIM_MODEが設定されている場合は追加（lease: 複数のCloud Runタスクで並行して処理）
+if [ -n "$TASK_CLAIM_MODE" ]; then
+    ENV_VARS="$ENV_VARS,TASK_CLAIM_MODE=$TASK_CLAIM_MODE"
+    echo -e "${GREEN}✓ タスクの取得方式: $TASK_CLAIM_MODE${NC}"
+fi
+
+# 1回のジョブ実行のCloud Runタスク数（2以上はTASK_CLAIM_MODE=leaseの場合のみ）
+JOB_TASKS="${JOB_TASKS:-1}"
+if [ "$JOB_TASKS" != "1" ] && [ "$TASK_CLAIM_MODE" != "lease" ]; then
+    echo -e "${RED}エラー: JOB_TASKSを2以上にする場合は、TASK_CLAIM_MODE=leaseを設定してください${NC}"
+    exit 1
+fi
+
 # デプロイコマンドの構築
 # タイムアウト: 24時間（デフォルト10分、最大24時間）
 # 計算根拠: 30秒 × 2000件（ハウス） = 60,000秒 = 約16時間40分 + 余裕
@@ -161,7 +174,8 @@ TASK_TIMEOUT="${TASK_TIMEOUT:-86400s}"
 DEPLOY_CMD="gcloud run jobs deploy $JOB_NAME \
   --image $IMAGE_NAME \
   --region $REGION \
-  --parallelism 1 \
+  --tasks $JOB_TASKS \
+  --parallelism $JOB_TASKS \
   --task-timeout $TASK_TIMEOUT \
   --set-env-vars \"$ENV_VARS\""
 
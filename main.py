@@ -1,11 +1,20 @@
+import contextlib
+import gc
 import glob
+import multiprocessing
 import os
 import logging
 import traceback
+import socket
 import sys
+import time
 
 import mysql.connector
+import numpy as np
 import requests
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime as dt, timedelta, timezone
 import csv
 from google.cloud import storage
@@ -47,24 +56,22 @@ except (TypeError, ModuleNotFoundError) as e:
         import glob as _glob
         import datetime as _datetime
         import lightgbm as _lgb
-        import signal as _signal
         from functools import wraps as _wraps
         import time as _time
         import logging as _logging
         from logging.handlers import RotatingFileHandler as _RotatingFileHandler
         from typing import Union, List, Dict, Callable, Any, Tuple as _Tuple
 
-        from myexception import InvalidInputError, PredictionError, PredictionTimeOut, UnexpectedError, TIMEOUT, timeout_handler
+        from myexception import InvalidInputError, PredictionError, PredictionTimeOut, TIMEOUT
 
         namespace = {
             'os': _os, 'pd': _pd, 'np': _np, 'pickle': _pickle, 'glob': _glob,
-            'datetime': _datetime, 'lgb': _lgb, 'signal': _signal, 'wraps': _wraps,
+            'datetime': _datetime, 'lgb': _lgb, 'wraps': _wraps,
             'time': _time, 'logging': _logging, 'RotatingFileHandler': _RotatingFileHandler,
             'Union': Union, 'List': List, 'Dict': Dict, 'Callable': Callable,
             'Any': Any, 'Tuple': _Tuple,
             'InvalidInputError': InvalidInputError, 'PredictionError': PredictionError,
-            'PredictionTimeOut': PredictionTimeOut, 'UnexpectedError': UnexpectedError,
-            'TIMEOUT': TIMEOUT, 'timeout_handler': timeout_handler,
+            'PredictionTimeOut': PredictionTimeOut, 'TIMEOUT': TIMEOUT,
         }
 
         compiled = compile(source_fixed, api_path, 'exec')
@@ -74,24 +81,166 @@ except (TypeError, ModuleNotFoundError) as e:
     else:
         raise
 
+from electric_data import ElectricData, ElectricFeatureAccumulator
+from electric_day_cache import ElectricDayCache
+from deadline import time_limit
+from myexception import TIMEOUT
+from stage_metrics import StageMetrics, active_metrics, enable_metrics, stage_timer
+from profiling import HouseProfiler, profile_files
+
 # PredictorWithLoggingインスタンスをグローバルで1度だけ初期化
 _predictor_instance = None
 
+# ハウスのプロファイル（get_house_profiler、無効の場合はNone）
+_house_profiler = None
+_house_profiler_loaded = False
+
+# spid毎のrequests.Session（get_http_session）
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+# タスク・ハウスの取得方式
+# exclusive: 他のジョブ実行が実行中の場合は終了し、未開始のタスクの全ハウスを処理する
+# lease: ハウスをリースで取得し、複数のジョブ実行・Cloud Runタスクで別々のハウスを並行して処理する
+TASK_CLAIM_MODES = ("exclusive", "lease")
+
+# 段階毎の処理時間（STAGE_METRICS）の出力形式
+STAGE_METRICS_FORMATS = ("json", "prometheus")
+
 def get_predictor():
     """PredictorWithLoggingのシングルトンインスタンスを取得"""
     global _predictor_instance
     if _predictor_instance is None:
         logger = logging.getLogger(__name__)
         logger.info("PredictorWithLoggingクラスを初期化中...")
+        # モデルバンドル（api/model_bundle.pyでビルド）。指定時はモデルファイルを読み込まない
+        model_bundle_path = os.environ.get('PREDICTOR_MODEL_BUNDLE') or None
         _predictor_instance = PredictorWithLogging(
             lgb_models_dir_path=os.path.join(base_dir, "api", "models", "lgb", "*.txt"),
             logi_models_dir_path=os.path.join(base_dir, "api", "models", "logistic", "*.pkl"),
             lgb_scaler_path=os.path.join(base_dir, "api", "scaler", "lgb_scaler.pickle"),
-            logi_scaler_path=os.path.join(base_dir, "api", "scaler", "logi_scaler.pickle")
+            logi_scaler_path=os.path.join(base_dir, "api", "scaler", "logi_scaler.pickle"),
+            # LightGBMアンサンブルの評価方式（lightgbm / numpy）。モデルバンドル使用時はnumpyのみ
+            lgb_backend=os.environ.get('PREDICTOR_LGB_BACKEND', 'numpy' if model_bundle_path else 'lightgbm'),
+            # Logistic回帰アンサンブルの評価方式（sklearn / stacked）
+            logi_backend=os.environ.get('PREDICTOR_LOGI_BACKEND', 'sklearn'),
+            model_bundle_path=model_bundle_path,
+            # モデルファイルを読み込むスレッド数
+            load_workers=int(os.environ.get('PREDICTOR_LOAD_WORKERS', '1')),
+            # 1ハウスの予測の段階（LightGBM・Logistic回帰）毎の制限時間（秒、小数可）
+            timeout=float(os.environ.get('PREDICT_TIMEOUT', str(TIMEOUT))),
+            # 予測値（LightGBM・Logistic回帰の確率）をメモ化する件数（0の場合はメモ化しない）
+            prediction_cache_size=int(os.environ.get('PREDICTION_CACHE_SIZE', '0')),
+            # メモ化した予測値を保存するSQLiteファイル（未設定の場合はメモリ上のみ）
+            prediction_cache_path=os.environ.get('PREDICTION_CACHE_PATH') or None,
+            # LightGBMアンサンブルの早期終了（score / decision、未設定の場合は全ブースターを評価）。numpyのみ
+            early_exit=os.environ.get('PREDICTOR_EARLY_EXIT', '').lower() or None,
+            # 早期終了の判定間隔（ブースター数）
+            early_exit_step=max(1, int(os.environ.get('PREDICTOR_EARLY_EXIT_STEP', '25'))),
+            # まとめて予測する場合のバッチ全体の段階毎の制限時間（秒、未設定の場合はPREDICT_TIMEOUT×件数）
+            batch_timeout=float(os.environ['PREDICT_BATCH_TIMEOUT']) if os.environ.get('PREDICT_BATCH_TIMEOUT') else None
         )
         logger.info("初期化完了")
     return _predictor_instance
 
+def get_electric_day_cache():
+    """
+    ELECTRIC_DAY_CACHE_DIRが設定されている場合、1日分の電力データのキャッシュを作成する
+
+    :return: ElectricDayCache。設定されていない場合はNone
+    """
+    cache_dir = os.environ.get('ELECTRIC_DAY_CACHE_DIR')
+    if not cache_dir:
+        return None
+    return ElectricDayCache(
+        cache_dir,
+        max_bytes=int(float(os.environ.get('ELECTRIC_DAY_CACHE_MAX_MB', '1024')) * 1024 ** 2),
+        settle_seconds=float(os.environ.get('ELECTRIC_DAY_CACHE_SETTLE_HOURS', '24')) * 60 * 60
+    )
+
+
+def get_profile_dir():
+    """プロファイルの出力先（PROFILE_DIR、未設定の場合はpredictor.logと同じカレントディレクトリ）"""
+    return os.environ.get('PROFILE_DIR') or os.getcwd()
+
+
+def get_house_profiler():
+    """
+    PROFILE_HOUSES_EVERY・PROFILE_TASK_HOUSE_IDS・PROFILE_JOBのいずれかが設定されている場合、
+    ハウス・ジョブのプロファイラ（cProfile・tracemalloc）を作成する（プロセス毎に1度だけ）
+
+    :return: HouseProfiler。設定されていない場合はNone
+    """
+    global _house_profiler, _house_profiler_loaded
+    if not _house_profiler_loaded:
+        every = max(0, int(os.environ.get('PROFILE_HOUSES_EVERY', '0')))
+        task_house_ids = [int(i) for i in os.environ.get('PROFILE_TASK_HOUSE_IDS', '').split(',') if i.strip()]
+        profile_job = os.environ.get('PROFILE_JOB', 'false').lower() == 'true'
+        if every > 0 or task_house_ids or profile_job:
+            _house_profiler = HouseProfiler(get_profile_dir(), every, task_house_ids)
+        _house_profiler_loaded = True
+    return _house_profiler
+
+
+def log_electric_day_cache_stats(cache, task_id):
+    """タスク毎の電力データキャッシュのヒット・ミス数をログに出力し、リセットする"""
+    logger = logging.getLogger(__name__)
+    stats = cache.take_stats()
+    logger.info("electric day cache. task_id: %s, hits: %s, misses: %s, bypassed: %s, stored: %s (%s bytes), "
+                "evicted: %s", task_id, stats['hits'], stats['misses'], stats['bypassed'], stats['stored'],
+                stats['stored_bytes'], stats['evicted'])
+
+
+def log_stage_metrics_summary(metrics, task_id, n_houses):
+    """
+    タスク毎の段階毎の処理時間（件数、p50/p95/p99、最大）とスループットをログに出力する
+
+    :return: StageMetrics.summaryにtask_idを加えた辞書
+    """
+    logger = logging.getLogger(__name__)
+    summary = dict(metrics.summary(n_houses), task_id=task_id)
+    logger.info("stage metrics. task_id: %s, houses: %s, elapsed: %.1fs, houses/s: %.3f", task_id, n_houses,
+                summary['elapsed_s'], summary['houses_per_s'] or 0.0)
+    for stage, stats in summary['stages'].items():
+        logger.info("stage metrics. task_id: %s, stage: %s, count: %s, total: %.3fs, p50: %.4fs, p95: %.4fs, "
+                    "p99: %.4fs, max: %.4fs", task_id, stage, stats['count'], stats['total_s'], stats['p50_s'],
+                    stats['p95_s'], stats['p99_s'], stats['max_s'])
+    return summary
+
+
+def export_stage_metrics(metrics, metrics_format, task_summaries):
+    """
+    ジョブ全体の段階毎の処理時間のヒストグラムを出力する（STAGE_METRICS_PATH、未設定の場合はlogディレクトリ）
+
+    jsonの場合はタスク毎のサマリも含める。GCS_LOG_BUCKETが設定されている場合はCloud Storageにもアップロードする。
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        if metrics_format == 'prometheus':
+            content = metrics.to_prometheus()
+            extension = 'prom'
+        else:
+            content = metrics.to_json(tasks=task_summaries, job=metrics.summary())
+            extension = 'json'
+        metrics_path = os.environ.get('STAGE_METRICS_PATH')
+        if not metrics_path:
+            os.makedirs(os.path.join(base_dir, 'log'), exist_ok=True)
+            metrics_path = os.path.join(base_dir, 'log', f"stage_metrics_{dt.now().strftime('%Y%m%d%H%M%S')}.{extension}")
+        with open(metrics_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        logger.info(f"Stage metrics written to {metrics_path}")
+
+        gcs_bucket_name = os.environ.get('GCS_LOG_BUCKET')
+        if gcs_bucket_name:
+            storage_client = storage.Client()
+            bucket = storage_client.bucket(gcs_bucket_name)
+            blob = bucket.blob(f"logs/{os.path.basename(metrics_path)}")
+            blob.upload_from_filename(metrics_path)
+            logger.info(f"Stage metrics uploaded to gs://{gcs_bucket_name}/logs/{os.path.basename(metrics_path)}")
+    except Exception as e:
+        logger.warning(f"Failed to export stage metrics: {e}")
+
+
 def get_status_message(status_code: int) -> str:
     """
     ステータスコードに対応するメッセージを取得
@@ -168,10 +317,31 @@ def main():
 
     logger.info("Start main.")
 
-    # 他のジョブ実行が実行中かチェック
-    if is_another_execution_running():
-        logger.info("別のCloud Run Jobが実行中のため、このジョブをスキップします")
-        sys.exit(0)
+    # 段階毎の処理時間の出力形式（json / prometheus、未設定の場合は計測しない）
+    stage_metrics_format = os.environ.get('STAGE_METRICS', '').lower() or None
+    if stage_metrics_format not in (None,) + STAGE_METRICS_FORMATS:
+        logger.error(f"Invalid STAGE_METRICS: {stage_metrics_format}. Expected one of {STAGE_METRICS_FORMATS}.")
+        sys.exit(1)
+    job_metrics = enable_metrics() if stage_metrics_format else None
+    task_summaries = []
+
+    # タスク・ハウスの取得方式（exclusive / lease）
+    task_claim_mode = os.environ.get('TASK_CLAIM_MODE', 'exclusive').lower()
+    if task_claim_mode not in TASK_CLAIM_MODES:
+        logger.error(f"Invalid TASK_CLAIM_MODE: {task_claim_mode}. Expected one of {TASK_CLAIM_MODES}.")
+        sys.exit(1)
+    # ハウスのリース期間（秒）。期限切れのハウスは他のジョブ実行が取得し直す
+    task_house_lease_seconds = max(1, int(os.environ.get('TASK_HOUSE_LEASE_SECONDS', '3600')))
+
+    if task_claim_mode == 'exclusive':
+        # 複数のCloud Runタスクで同じハウスを処理しないよう、タスク0のみ処理する
+        if int(os.environ.get('CLOUD_RUN_TASK_INDEX', '0')) != 0:
+            logger.info("TASK_CLAIM_MODE=exclusiveのため、CLOUD_RUN_TASK_INDEX=0以外のタスクはスキップします")
+            sys.exit(0)
+        # 他のジョブ実行が実行中かチェック
+        if is_another_execution_running():
+            logger.info("別のCloud Run Jobが実行中のため、このジョブをスキップします")
+            sys.exit(0)
 
     cnx = None
     should_upload_log = False  # タスク処理が行われた場合のみログをアップロード
@@ -182,6 +352,29 @@ def main():
     csv_header = ['date_time_jst', 'air_conditioner', 'clothes_washer', 'microwave', 'refrigerator', 'rice_cooker',
                   'TV', 'cleaner', 'IH', 'Heater']
     app_type_ids = [2, 5, 20, 24, 25, 30, 31, 37, 301]
+    # 1ハウスの電力データ取得（1日毎）の並列数
+    fetch_max_workers = max(1, int(os.environ.get('FETCH_MAX_WORKERS', '1')))
+    # 1回の予測でまとめて処理するハウス数
+    predict_batch_size = max(1, int(os.environ.get('PREDICT_BATCH_SIZE', '100')))
+    # 電力データのCSV出力（アーカイブ用）。デフォルトはGCS_LOG_BUCKETが設定されている場合のみ
+    archive_csv = os.environ.get(
+        'ARCHIVE_ELECTRIC_DATA_CSV', 'true' if os.environ.get('GCS_LOG_BUCKET') else 'false').lower() == 'true'
+    # パイプライン実行時に先読みするハウス数（0の場合はPREDICT_BATCH_SIZE件ずつ順に処理する）
+    pipeline_prefetch_houses = max(0, int(os.environ.get('PIPELINE_PREFETCH_HOUSES', '0')))
+    # ハウスの電力データ取得・予測を行う子プロセス数（1の場合はメインプロセスのみで処理する）
+    predict_workers = max(1, int(os.environ.get('PREDICT_WORKERS', '1')))
+    # task_housesの進捗・task_resultsをまとめて登録するハウス数（1の場合はハウスの進捗毎に登録する）
+    task_house_write_batch = max(1, int(os.environ.get('TASK_HOUSE_WRITE_BATCH', '1')))
+    # まとめて登録する場合に、進捗を登録する間隔（秒）
+    task_house_write_interval = float(os.environ.get('TASK_HOUSE_WRITE_INTERVAL', '5'))
+    # 1ハウスの電力データ取得の制限時間（秒、小数可）。0の場合は制限なし（1日毎のリクエストのタイムアウトのみ）
+    fetch_timeout = max(0.0, float(os.environ.get('HOUSE_FETCH_TIMEOUT', '0')))
+    # 1日分の電力データのキャッシュ（ディレクトリ未設定の場合はキャッシュしない）
+    electric_day_cache = get_electric_day_cache()
+    fetch_config = FetchConfig(
+        api_url, mock_api_url, app_type_ids, csv_header, fetch_max_workers, archive_csv, fetch_timeout,
+        electric_day_cache)
+    lease_owner = get_lease_owner()
 
     try:
         # Cloud SQL Proxy uses Unix socket, otherwise use host
@@ -207,9 +400,15 @@ def main():
 
         cursor = cnx.cursor()
 
-        sql = "SELECT id AS task_id, date_from, date_to from `tasks` " \
-              "WHERE start_at IS NULL AND starting_at < NOW() AND algorithm = %s " \
-              "ORDER BY starting_at "
+        if task_claim_mode == 'lease':
+            # 他のジョブ実行が開始済みのタスクも、未処理のハウスがあれば処理する
+            sql = "SELECT id AS task_id, date_from, date_to from `tasks` " \
+                  "WHERE end_at IS NULL AND starting_at < NOW() AND algorithm = %s " \
+                  "ORDER BY starting_at "
+        else:
+            sql = "SELECT id AS task_id, date_from, date_to from `tasks` " \
+                  "WHERE start_at IS NULL AND starting_at < NOW() AND algorithm = %s " \
+                  "ORDER BY starting_at "
         param = (4,)
         cursor.execute(sql, param)
 
@@ -229,216 +428,88 @@ def main():
         except (Exception,) as e:
             logger.warning("Warning Occurred. failed old csv files: exception: %s", e)
 
-        for (task_id, date_from, date_to) in tasks:
-            should_upload_log = True  # タスク処理開始
-            try:
-                # タスク毎
-                logger.debug("Start task. task_id: %s", task_id)
-
-                # task開始をDBに登録
-                sql = "UPDATE `tasks` SET start_at=NOW() WHERE id = %s "
-                param = (task_id,)
-                cursor.execute(sql, param)
-                cnx.commit()
-
-                sql = "SELECT id AS task_house_id, spid, houseid, age, sex, education, solo from `task_houses` WHERE task_id = %s ORDER BY spid, id"
-                param = (task_id,)
-                cursor.execute(sql, param)
-                task_houses = cursor.fetchall()
-
-                logger.debug("get task_houses. count: %s", len(task_houses))
-
-                for (task_house_id, spid, houseid, age, sex, education, solo) in task_houses:
-                    status = 0
-                    progress = 0
-                    try:
-                        # ハウス毎
-                        logger.debug("task_house. task_house_id: %s", task_house_id)
-
-                        progress = 10
-                        update_task_houses(cnx, cursor, task_house_id, status, progress)
-
-                        # csv登録用
-                        arr = []
-
-                        # API取得
-                        start = dt.strptime(f"{date_from} 00:00:00+0900", '%Y-%m-%d %H:%M:%S%z')
-                        end = dt.strptime(f"{date_to} 00:00:00+0900", '%Y-%m-%d %H:%M:%S%z')
-                        end = end + timedelta(days=1)
-                        sub = end - start
-                        exist_all = False
-                        for day in range(sub.days):
-                            sts = start + timedelta(days=day)
-                            ets = start + timedelta(days=(day + 1))
-                            # print(sts, ets)
-
-                            headers = {'Authorization': f"imSP {spid}:{os.environ.get('API_SHARED_PASSWORD')}"}
-                            params = {'service_provider': spid, 'house': houseid, 'sts': int(sts.timestamp()),
-                                      'ets': int(ets.timestamp()), 'time_units': 20}
-
-                            # spid=9991かつMOCK_API_URLが定義されている場合はモックサーバーを使用
-                            if str(spid) == '9991' and mock_api_url:
-                                url = mock_api_url
-                            else:
-                                url = api_url
-
-                            res = requests.get(url, headers=headers, params=params, timeout=30)
-                            res.raise_for_status()  # HTTPエラーの場合に例外を発生
-                            # print(r.json()['data'][0]['timestamps'])
-
-                            response_data = res.json()
-                            timestamps = response_data['data'][0]['timestamps']
-                            appliance_types = response_data['data'][0]['appliance_types']
-
-                            for i, timestamp in enumerate(timestamps):
-                                date_time_jst = dt.fromtimestamp(timestamp).astimezone(
-                                    timezone(timedelta(hours=+9))).strftime('%Y/%m/%d %H:%M:00')
-                                # print(date_time_jst)
-                                # print(appliance_types)
-
-                                line = [
-                                    None,
-                                    None,
-                                    None,
-                                    None,
-                                    None,
-                                    None,
-                                    None,
-                                    None,
-                                    None
-                                ]
-
-                                exist = False
-                                for appliance_type in appliance_types:
-                                    try:
-                                        # print(appliance_type['appliance_type_id'])
-                                        j = app_type_ids.index(int(appliance_type['appliance_type_id']))
-                                        # print(appliance_type)
-                                        # print(j)
-                                        if j >= 0:
-                                            # print('hit!')
-                                            # print(appliance_type['appliances'][0]['powers'][i])
-                                            if appliance_type['appliances'][0]['powers'][i] is not None:
-                                                if float(appliance_type['appliances'][0]['powers'][i]) > 0.0:
-                                                    flag = 1
-                                                else:
-                                                    flag = 0
-                                                line[j] = flag
-                                                exist = True
-                                        else:
-                                            continue
-                                    except (Exception,):
-                                        continue
-
-                                # 1つでもnullでなければ0を代入
-                                if exist:
-                                    exist_all = True
-                                    for k, row in enumerate(line):
-                                        if row is None:
-                                            line[k] = 0
-
-                                arr.append(
-                                    [date_time_jst,
-                                     line[0], line[1], line[2], line[3], line[4], line[5], line[6], line[7], line[8]])
-
-                        # print(arr)
-                        progress = 20
-                        update_task_houses(cnx, cursor, task_house_id, status, progress)
-
-                        # 前欠損エラー
-                        if (len(arr) == 0) or (exist_all is False):
-                            raise ValueError("Total loss error!")
-
-                        ts = dt.timestamp(dt.now())
-                        csv_filename = f"{start.strftime('%Y%m%d')}_{houseid}_{int(ts)}.csv"
-                        data_path = f"/tmp/data/{csv_filename}"  # input csv path
-                        # CSV出力
-                        with open(data_path, 'w') as f:
-                            writer = csv.writer(f)
-                            writer.writerow(csv_header)
-                            writer.writerows(arr)
-
-                        if (len(arr) == 0) or (exist_all is False):
-                            raise ValueError("Total loss error!")
-
-                        # CSVファイルをCloud Storageにバックアップ
-                        gcs_bucket_name = os.environ.get('GCS_LOG_BUCKET')
-                        if gcs_bucket_name:
-                            try:
-                                storage_client = storage.Client()
-                                bucket = storage_client.bucket(gcs_bucket_name)
-                                gcs_csv_path = f"data/{csv_filename}"
-                                blob = bucket.blob(gcs_csv_path)
-                                blob.upload_from_filename(data_path)
-                                logger.debug(f"CSV file uploaded to gs://{gcs_bucket_name}/{gcs_csv_path}")
-                            except Exception as e:
-                                logger.warning(f"Failed to upload CSV to GCS: {e}")
-
-                        progress = 30
-                        update_task_houses(cnx, cursor, task_house_id, status, progress)
-
-                        # data_path = f"/tmp/data/sample.csv"
-                        # MySQLから取得した値を明示的にint型に変換
-                        age_int = int(age) if age is not None else 0
-                        sex_int = int(sex) if sex is not None else 0
-                        edu_int = int(education) if education is not None else 0
-                        solo_int = int(solo) if solo is not None else 0
-
-                        args = Args(age_int, sex_int, edu_int, solo_int, data_path)
-
-                        result = api_main(args)
-                        logger.debug(f"api_main args: %s", json.dumps(vars(args)))
-
-                        progress = 50
-                        update_task_houses(cnx, cursor, task_house_id, status, progress)
-
-                        # 結果をDBに登録 (int)($float * 100.0 + 0.5);
-                        sql = "INSERT `task_results` (task_id, task_house_id, result, created_at) " \
-                              "value (%s, %s, %s, NOW())"
-                        param = (task_id, task_house_id, 100 - int(result))
+        # PROFILE_JOBの場合はタスクの処理全体をプロファイルする（job。この間はハウス毎のプロファイルは行わない）
+        profiler = get_house_profiler()
+        profile_job = profiler is not None and os.environ.get('PROFILE_JOB', 'false').lower() == 'true'
+        with profiler.profile("job") if profile_job else contextlib.nullcontext():
+            for (task_id, date_from, date_to) in tasks:
+                should_upload_log = True  # タスク処理開始
+                # タスク毎の処理時間（タスク終了時にジョブ全体に加算する）
+                task_metrics = enable_metrics() if job_metrics is not None else None
+                n_task_houses = 0
+                try:
+                    # タスク毎
+                    logger.debug("Start task. task_id: %s", task_id)
+
+                    # task開始をDBに登録（lease時は最初に開始したジョブ実行のみ）
+                    if task_claim_mode == 'lease':
+                        sql = "UPDATE `tasks` SET start_at=NOW() WHERE id = %s AND start_at IS NULL"
+                    else:
+                        sql = "UPDATE `tasks` SET start_at=NOW() WHERE id = %s "
+                    param = (task_id,)
+                    cursor.execute(sql, param)
+                    cnx.commit()
+
+                    if task_house_write_batch > 1:
+                        writer = BatchedTaskHouseWriter(
+                            cnx, cursor, task_id, task_house_write_batch, task_house_write_interval)
+                    else:
+                        writer = TaskHouseWriter(cnx, cursor, task_id)
+
+                    if task_claim_mode == 'lease':
+                        # 未処理のハウスをリースで取得しながら処理する（全子プロセスに1回分の予測が行き渡る件数ずつ）
+                        while True:
+                            task_houses = claim_task_houses(
+                                cnx, cursor, task_id, lease_owner, predict_batch_size * predict_workers,
+                                task_house_lease_seconds)
+                            if len(task_houses) == 0:
+                                break
+                            logger.debug("claim task_houses. count: %s", len(task_houses))
+                            n_task_houses += len(task_houses)
+                            process_task_houses(
+                                writer, fetch_config, date_from, date_to, task_houses, predict_batch_size,
+                                predict_workers, pipeline_prefetch_houses)
+
+                        # 全ハウスが終了した場合のみtask終了をDBに登録（他のジョブ実行が処理中の場合はそちらで登録する）
+                        if not finish_task_if_done(cnx, cursor, task_id):
+                            logger.debug("task_houses are still running in other executions. task_id: %s", task_id)
+                    else:
+                        sql = "SELECT id AS task_house_id, spid, houseid, age, sex, education, solo from `task_houses` WHERE task_id = %s ORDER BY spid, id"
+                        param = (task_id,)
                         cursor.execute(sql, param)
-                        cnx.commit()
+                        task_houses = cursor.fetchall()
 
-                        logger.debug(f"predicted. result: %s", result)
-
-                        status = 1
-                        progress = 100
-                        update_task_houses(cnx, cursor, task_house_id, status, progress)
-
-                    except Exception as e:
-                        print(traceback.format_exc())
-                        # ハウス毎のエラー
-                        logger.warning(f"Warning Occurred. failed task_house. exception: %s", e)
-                        try:
-                            status = -1
-                            update_task_houses(cnx, cursor, task_house_id, status, progress)
-
-                            sql = "INSERT `task_results` (task_id, task_house_id, result, created_at) value (%s, %s, %s, " \
-                                  "NOW()) "
-                            param = (task_id, task_house_id, -1,)
-                            cursor.execute(sql, param)
-                            cnx.commit()
-                        except Exception as e:
-                            logger.warning(f"Warning Occurred. failed update_task_houses. exception: %s", e)
-                        continue
-
-                # task終了をDBに登録
-                sql = "UPDATE `tasks` SET end_at=NOW(), status=%s WHERE id = %s"
-                param = (1, task_id,)
-                cursor.execute(sql, param)
-                cnx.commit()
-
-            except (Exception,) as e:
-                # タスク毎のエラー
-                logger.warning("Warning Occurred. failed task: exception: %s", e)
-
-                sql = "UPDATE `tasks` SET end_at=NOW(), status=%s WHERE id = %s"
-                param = (-1, task_id,)
-                cursor.execute(sql, param)
-                cnx.commit()
-                break
+                        logger.debug("get task_houses. count: %s", len(task_houses))
+                        n_task_houses = len(task_houses)
 
-            logger.debug(f"Completed task. task_id: %s", task_id)
+                        process_task_houses(
+                            writer, fetch_config, date_from, date_to, task_houses, predict_batch_size,
+                            predict_workers, pipeline_prefetch_houses)
+
+                        # task終了をDBに登録
+                        sql = "UPDATE `tasks` SET end_at=NOW(), status=%s WHERE id = %s"
+                        param = (1, task_id,)
+                        cursor.execute(sql, param)
+                        cnx.commit()
+
+                except (Exception,) as e:
+                    # タスク毎のエラー
+                    logger.warning("Warning Occurred. failed task: exception: %s", e)
+
+                    sql = "UPDATE `tasks` SET end_at=NOW(), status=%s WHERE id = %s"
+                    param = (-1, task_id,)
+                    cursor.execute(sql, param)
+                    cnx.commit()
+                    break
+                finally:
+                    if electric_day_cache is not None:
+                        log_electric_day_cache_stats(electric_day_cache, task_id)
+                    if task_metrics is not None:
+                        task_summaries.append(log_stage_metrics_summary(task_metrics, task_id, n_task_houses))
+                        job_metrics.merge(task_metrics.snapshot())
+                        enable_metrics(job_metrics)
+
+                logger.debug(f"Completed task. task_id: %s", task_id)
 
         # predictor.logをCloud Storageにアップロード
         upload_log_to_gcs(task_id)
@@ -452,11 +523,820 @@ def main():
         # タスク処理が行われた場合のみログをアップロード
         if should_upload_log:
             upload_log_to_gcs()
+            if job_metrics is not None:
+                export_stage_metrics(job_metrics, stage_metrics_format, task_summaries)
         if cnx is not None and cnx.is_connected():
             cnx.close()
             logger.debug("Closed Mysql!")
 
 
+class FetchConfig:
+    def __init__(self, api_url, mock_api_url, app_type_ids, csv_header, max_workers=1, archive_csv=False,
+                 timeout=0.0, cache=None):
+        """
+        電力データ取得の設定
+
+        :param max_workers: 1日毎の取得の並列数
+        :param archive_csv: 電力データをCSV出力するか
+        :param timeout: 1ハウスの取得の制限時間（秒）。0の場合は制限なし
+        :param cache: 1日分の電力データのキャッシュ（ElectricDayCache）。Noneの場合はキャッシュしない
+        """
+        self.api_url = api_url
+        self.mock_api_url = mock_api_url
+        self.app_type_ids = app_type_ids
+        self.csv_header = csv_header
+        self.max_workers = max_workers
+        self.archive_csv = archive_csv
+        self.timeout = timeout
+        self.cache = cache
+
+
+class TaskHouseWriter:
+    """task_housesの進捗・task_resultsをDBに登録する"""
+
+    def __init__(self, cnx, cursor, task_id):
+        self.cnx = cnx
+        self.cursor = cursor
+        self.task_id = task_id
+
+    def update(self, task_house_id, status, progress):
+        with stage_timer("db_write"):
+            update_task_houses(self.cnx, self.cursor, task_house_id, status, progress)
+
+    def fail(self, task_house_id, progress):
+        with stage_timer("db_write"):
+            fail_task_house(self.cnx, self.cursor, self.task_id, task_house_id, progress)
+
+    def result(self, task_house_id, result):
+        # 結果をDBに登録 (int)($float * 100.0 + 0.5);
+        sql = "INSERT `task_results` (task_id, task_house_id, result, created_at) " \
+              "value (%s, %s, %s, NOW())"
+        param = (self.task_id, task_house_id, 100 - int(result))
+        with stage_timer("db_write"):
+            self.cursor.execute(sql, param)
+            self.cnx.commit()
+
+    def flush(self):
+        """逐次登録するため何もしない"""
+
+
+class BatchedTaskHouseWriter(TaskHouseWriter):
+    """
+    task_housesの進捗・task_resultsをまとめてDBに登録する（write-behind）
+
+    ハウス毎の進捗はメモリ上で最新の値のみ保持し、終了（status 1 / -1）したハウスがflush_houses件に
+    達した時点、または前回の登録からflush_interval秒経過した時点で、進捗のUPDATEとtask_resultsの
+    INSERTをexecutemanyで1つのトランザクションとして登録する。task_resultsと最終のstatusは同じ
+    トランザクションで登録される。タスクの終了時にはflush()で未登録分を登録する。
+    まとめた登録に失敗した場合はロールバックし、ハウス毎に登録し直す（失敗したハウスはエラー終了とする）。
+    """
+
+    UPDATE_SQL = "UPDATE `task_houses` SET status = %s, progress = %s, updated_at = NOW() WHERE id = %s"
+    # executemanyで複数行のINSERTにまとめるため、VALUES句で記述する
+    INSERT_SQL = "INSERT INTO `task_results` (task_id, task_house_id, result, created_at) " \
+                 "VALUES (%s, %s, %s, NOW())"
+
+    def __init__(self, cnx, cursor, task_id, flush_houses=100, flush_interval=5.0):
+        """
+        :param flush_houses: まとめて登録する終了済みのハウス数
+        :param flush_interval: 進捗を登録する間隔（秒）
+        """
+        super().__init__(cnx, cursor, task_id)
+        self.flush_houses = flush_houses
+        self.flush_interval = flush_interval
+        self._progress = {}  # task_house_id -> (status, progress)
+        self._results = []  # (task_id, task_house_id, result)
+        self._n_finished = 0
+        self._last_flush = time.monotonic()
+
+    def update(self, task_house_id, status, progress):
+        self._progress[task_house_id] = (status, progress)
+        if status != 0:
+            self._n_finished += 1
+        self._flush_if_due()
+
+    def fail(self, task_house_id, progress):
+        self._progress[task_house_id] = (-1, progress)
+        self._results.append((self.task_id, task_house_id, -1))
+        self._n_finished += 1
+        self._flush_if_due()
+
+    def result(self, task_house_id, result):
+        # 最終のstatus（progress 100）と同じトランザクションで登録するため、ここでは登録しない
+        self._results.append((self.task_id, task_house_id, 100 - int(result)))
+
+    def _flush_if_due(self):
+        if self._n_finished >= self.flush_houses or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """未登録の進捗・task_resultsを1つのトランザクションで登録する"""
+        progress, results = self._progress, self._results
+        self._progress, self._results, self._n_finished = {}, [], 0
+        self._last_flush = time.monotonic()
+        if not progress and not results:
+            return
+        with stage_timer("db_write"):
+            try:
+                if progress:
+                    self.cursor.executemany(
+                        self.UPDATE_SQL, [(status, p, task_house_id) for task_house_id, (status, p) in progress.items()])
+                if results:
+                    self.cursor.executemany(self.INSERT_SQL, results)
+                self.cnx.commit()
+            except Exception as e:
+                logger = logging.getLogger(__name__)
+                logger.warning(f"Warning Occurred. failed batched update_task_houses, retrying per house. exception: %s", e)
+                self.cnx.rollback()
+                self._write_per_house(progress, results)
+
+    def _write_per_house(self, progress, results):
+        """まとめた登録に失敗した場合に、ハウス毎に登録する"""
+        logger = logging.getLogger(__name__)
+        results_by_house = {}
+        for param in results:
+            results_by_house.setdefault(param[1], []).append(param)
+        for task_house_id in list(progress) + [i for i in results_by_house if i not in progress]:
+            status, p = progress.get(task_house_id, (0, 50))
+            try:
+                if task_house_id in progress:
+                    self.cursor.execute(self.UPDATE_SQL, (status, p, task_house_id))
+                for param in results_by_house.get(task_house_id, []):
+                    self.cursor.execute(self.INSERT_SQL, param)
+                self.cnx.commit()
+            except Exception as e:
+                logger.warning(f"Warning Occurred. failed task_house. exception: %s", e)
+                self.cnx.rollback()
+                if status != -1:
+                    fail_task_house(self.cnx, self.cursor, self.task_id, task_house_id, p)
+
+
+class DeferredTaskHouseWriter:
+    """
+    TaskHouseWriterへの登録を(メソッド名, task_house_id, 引数)として渡し、後でapply_task_house_writeで登録する
+    （パイプライン実行・マルチプロセス実行時に、DB登録を1か所にまとめる）
+    """
+
+    def __init__(self, put):
+        """
+        :param put: 登録を受け取る関数（キューへの追加、リストへの追加など）
+        """
+        self.put = put
+
+    def update(self, task_house_id, status, progress):
+        self.put(('update', task_house_id, (status, progress)))
+
+    def fail(self, task_house_id, progress):
+        self.put(('fail', task_house_id, (progress,)))
+
+    def result(self, task_house_id, result):
+        self.put(('result', task_house_id, (result,)))
+
+
+def apply_task_house_write(writer, item, failed):
+    """
+    DeferredTaskHouseWriterの登録をDBに登録する
+
+    :param failed: DB登録に失敗したハウスのset（以降の登録は行わない）
+    """
+    logger = logging.getLogger(__name__)
+    method, task_house_id, method_args = item
+    if task_house_id in failed:
+        return
+    if method == 'fail':
+        writer.fail(task_house_id, *method_args)
+        return
+    try:
+        getattr(writer, method)(task_house_id, *method_args)
+    except Exception as e:
+        # 逐次実行時と同様に、登録に失敗した時点のprogressでエラー終了とする
+        logger.warning(f"Warning Occurred. failed task_house. exception: %s", e)
+        failed.add(task_house_id)
+        writer.fail(task_house_id, method_args[1] if method == 'update' else 50)
+
+
+def prepare_task_house(writer, fetch_config, date_from, date_to, task_house):
+    """
+    ハウスの電力データを取得し、予測の引数を作成する（progress 10〜30）
+
+    プロファイルの対象のハウス（get_house_profiler）は、取得をプロファイルする（<task_house_id>_fetch）
+
+    :return: Args。失敗した場合はエラーを登録してNone
+    """
+    profiler = get_house_profiler()
+    if profiler is not None and profiler.select(task_house[0]):
+        with profiler.profile(f"{task_house[0]}_fetch"):
+            return _prepare_task_house(writer, fetch_config, date_from, date_to, task_house)
+    return _prepare_task_house(writer, fetch_config, date_from, date_to, task_house)
+
+
+def _prepare_task_house(writer, fetch_config, date_from, date_to, task_house):
+    logger = logging.getLogger(__name__)
+    (task_house_id, spid, houseid, age, sex, education, solo) = task_house
+    status = 0
+    progress = 0
+    try:
+        # ハウス毎
+        logger.debug("task_house. task_house_id: %s", task_house_id)
+
+        progress = 10
+        writer.update(task_house_id, status, progress)
+
+        # API取得
+        # 1日分ずつ特徴量を集計し、分単位の電力データはCSV出力時のみ保持する
+        electric_data = ElectricFeatureAccumulator()
+        arr = []
+        exist_all = False
+        # 制限時間を超えた場合はPredictionTimeOutでハウスをエラー終了とする
+        with time_limit(fetch_config.timeout or None, "fetch") as deadline:
+            for date_time_jst, values, exist in fetch_electric_data_days(
+                    fetch_config.api_url, fetch_config.mock_api_url, fetch_config.app_type_ids, spid, houseid,
+                    date_from, date_to, fetch_config.max_workers, deadline, fetch_config.cache):
+                exist_all = exist_all or exist
+                electric_data.add(ElectricData.from_matrix(date_time_jst, values, fetch_config.csv_header[1:]))
+                if fetch_config.archive_csv:
+                    arr.extend(electric_data_rows(date_time_jst, values))
+
+        progress = 20
+        writer.update(task_house_id, status, progress)
+
+        # 前欠損エラー
+        if (len(electric_data) == 0) or (exist_all is False):
+            raise ValueError("Total loss error!")
+
+        # CSV出力（アーカイブ用）
+        if fetch_config.archive_csv:
+            start, _ = get_fetch_window(date_from, date_to)
+            save_electric_data_csv(arr, fetch_config.csv_header, start, houseid)
+
+        progress = 30
+        writer.update(task_house_id, status, progress)
+
+        # data_path = f"/tmp/data/sample.csv"
+        # MySQLから取得した値を明示的にint型に変換
+        age_int = int(age) if age is not None else 0
+        sex_int = int(sex) if sex is not None else 0
+        edu_int = int(education) if education is not None else 0
+        solo_int = int(solo) if solo is not None else 0
+
+        return Args(age_int, sex_int, edu_int, solo_int, electric_data)
+
+    except Exception as e:
+        print(traceback.format_exc())
+        # ハウス毎のエラー
+        logger.warning(f"Warning Occurred. failed task_house. exception: %s", e)
+        writer.fail(task_house_id, progress)
+        return None
+
+
+def predict_task_houses(prepared_houses):
+    """
+    取得済みのハウスをまとめて予測する
+
+    プロファイルの対象のハウスはまとめずに1件ずつcalculate_scoreで予測し、予測をプロファイルする
+    （<task_house_id>_predict）
+
+    :param prepared_houses: (task_house_id, Args)のリスト
+    :return: 各ハウスのスコア(int)、またはエラーの場合はException
+    """
+    profiler = get_house_profiler()
+    if profiler is None:
+        return api_main_batch([args for (_, args) in prepared_houses])
+
+    profiled = [k for k, (task_house_id, _) in enumerate(prepared_houses) if profiler.is_selected(task_house_id)]
+    batch = [k for k in range(len(prepared_houses)) if k not in profiled]
+    results = [None] * len(prepared_houses)
+    for k, result in zip(batch, api_main_batch([prepared_houses[k][1] for k in batch])):
+        results[k] = result
+    for k in profiled:
+        task_house_id, args = prepared_houses[k]
+        with profiler.profile(f"{task_house_id}_predict"):
+            try:
+                results[k] = api_main(args)
+            except Exception as e:
+                results[k] = e
+    return results
+
+
+def save_task_house_result(writer, task_house_id, args, result):
+    """
+    ハウスの予測結果を登録する（progress 50〜100）
+
+    :param result: スコア(int)、またはエラーの場合はException
+    """
+    logger = logging.getLogger(__name__)
+    status = 0
+    progress = 30
+    try:
+        if isinstance(result, Exception):
+            raise result
+        logger.debug(f"api_main args: %s", json.dumps(vars(args), default=str))
+
+        progress = 50
+        writer.update(task_house_id, status, progress)
+
+        writer.result(task_house_id, result)
+
+        logger.debug(f"predicted. result: %s", result)
+
+        status = 1
+        progress = 100
+        writer.update(task_house_id, status, progress)
+
+    except Exception as e:
+        print(traceback.format_exc())
+        # ハウス毎のエラー
+        logger.warning(f"Warning Occurred. failed task_house. exception: %s", e)
+        writer.fail(task_house_id, progress)
+
+
+def run_task_houses(writer, fetch_config, date_from, date_to, task_houses, predict_batch_size):
+    """
+    PREDICT_BATCH_SIZE件ずつ電力データを取得し、まとめて予測する
+    """
+    for offset in range(0, len(task_houses), predict_batch_size):
+        prepared_houses = []  # (task_house_id, args)
+        for task_house in task_houses[offset:offset + predict_batch_size]:
+            args = prepare_task_house(writer, fetch_config, date_from, date_to, task_house)
+            if args is not None:
+                prepared_houses.append((task_house[0], args))
+
+        # まとめて予測（ハウス毎のエラーはそのハウスの結果のみに反映される）
+        results = predict_task_houses(prepared_houses)
+
+        for (task_house_id, args), result in zip(prepared_houses, results):
+            save_task_house_result(writer, task_house_id, args, result)
+
+
+# パイプラインのキューの終端
+_QUEUE_END = object()
+
+
+def _queue_put(q, item, stop):
+    """stopがセットされるまでキューへの追加を試みる"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _queue_get(q, stop):
+    """stopがセットされるまでキューからの取得を試みる（stop時は_QUEUE_END）"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _QUEUE_END
+
+
+def run_task_houses_pipeline(writer, fetch_config, date_from, date_to, task_houses, predict_batch_size,
+                             prefetch_houses):
+    """
+    電力データの取得・予測・DB登録をパイプラインで行う
+
+    取得スレッドが最大prefetch_houses件先まで電力データを取得し、メインスレッドが取得済みのハウスを
+    最大predict_batch_size件ずつまとめて予測し、DB登録スレッドがtask_housesの進捗とtask_resultsを登録する。
+    ステージ間は上限付きのキューでつなぎ、DB登録は1つのスレッドで順に行うため、
+    ハウス毎のprogress/statusの更新順は逐次実行時と同じになる。
+    予測はメインスレッドで行う。
+    """
+    stop = threading.Event()
+    prepared_queue = queue.Queue(maxsize=prefetch_houses)
+    # 1ハウスあたりの登録は最大3件ずつ（取得・予測）
+    db_queue = queue.Queue(maxsize=3 * (prefetch_houses + predict_batch_size))
+    queued_writer = DeferredTaskHouseWriter(lambda item: _queue_put(db_queue, item, stop))
+    errors = []
+
+    def fetch_houses():
+        try:
+            for task_house in task_houses:
+                if stop.is_set():
+                    break
+                args = prepare_task_house(queued_writer, fetch_config, date_from, date_to, task_house)
+                if args is not None:
+                    _queue_put(prepared_queue, (task_house[0], args), stop)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _queue_put(prepared_queue, _QUEUE_END, stop)
+
+    def write_houses():
+        failed = set()
+        try:
+            while True:
+                item = _queue_get(db_queue, stop)
+                if item is _QUEUE_END:
+                    break
+                apply_task_house_write(writer, item, failed)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    fetcher = threading.Thread(target=fetch_houses, name="fetch_houses", daemon=True)
+    db_writer = threading.Thread(target=write_houses, name="write_houses", daemon=True)
+    fetcher.start()
+    db_writer.start()
+    try:
+        end = False
+        while not end:
+            item = _queue_get(prepared_queue, stop)
+            if item is _QUEUE_END:
+                break
+            # 取得済みのハウスを最大predict_batch_size件まとめる
+            prepared_houses = [item]
+            while len(prepared_houses) < predict_batch_size:
+                try:
+                    item = prepared_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _QUEUE_END:
+                    end = True
+                    break
+                prepared_houses.append(item)
+
+            results = predict_task_houses(prepared_houses)
+            for (task_house_id, args), result in zip(prepared_houses, results):
+                save_task_house_result(queued_writer, task_house_id, args, result)
+    except Exception:
+        stop.set()
+        raise
+    finally:
+        fetcher.join()
+        _queue_put(db_queue, _QUEUE_END, stop)
+        db_writer.join()
+
+    if errors:
+        raise errors[0]
+
+
+def _limit_threads():
+    """
+    OpenMP/BLASのスレッド数を1に制限する（threadpoolctlはscikit-learnの依存パッケージ）
+    子プロセスがそれぞれ全コア分のスレッドを使わないようにし、fork前にスレッドプールが作られないようにする
+    """
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return contextlib.nullcontext()
+    return threadpool_limits(limits=1)
+
+
+def _init_worker():
+    """マルチプロセス実行の子プロセスの初期化"""
+    # 親プロセスのコネクションを子プロセスで使わないよう、Sessionは子プロセス毎に作り直す
+    _http_sessions.clear()
+    _limit_threads()
+    # 段階毎の処理時間は子プロセス毎の新しいStageMetricsに記録する
+    # （fork時に引き継いだ親プロセスの値を返すと、親プロセスで重複して集計される）
+    if active_metrics() is not None:
+        enable_metrics()
+
+
+def _run_task_houses_worker(job):
+    """
+    子プロセスでハウスの電力データ取得・予測を行い、DB登録の内容を返す
+    """
+    fetch_config, date_from, date_to, task_houses, predict_batch_size = job
+    writes = []
+    run_task_houses(DeferredTaskHouseWriter(writes.append), fetch_config, date_from, date_to, task_houses,
+                    predict_batch_size)
+    # 電力データキャッシュのヒット・ミス数、段階毎の処理時間は親プロセスで集計する
+    cache_stats = fetch_config.cache.take_stats() if fetch_config.cache is not None else None
+    metrics = active_metrics()
+    return writes, cache_stats, metrics.take() if metrics is not None else None
+
+
+def run_task_houses_multiprocess(writer, fetch_config, date_from, date_to, task_houses, predict_batch_size,
+                                 n_workers):
+    """
+    ハウスをn_workers個の子プロセスに分けて電力データ取得・予測を行う
+
+    モデルは親プロセスで1度だけ読み込み、forkした子プロセスでcopy-on-writeで共有する。
+    子プロセスは担当するハウスをrun_task_housesと同様に処理し、DB登録の内容を親プロセスに返す。
+    DB登録は親プロセスでハウスの順に行うため、ハウス毎のprogress/statusの更新順は逐次実行時と同じになる。
+    """
+    logger = logging.getLogger(__name__)
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        logger.warning("fork is not available. Running task_houses in a single process.")
+        run_task_houses(writer, fetch_config, date_from, date_to, task_houses, predict_batch_size)
+        return
+
+    # 親プロセスでモデルを読み込む（子プロセスはforkで引き継ぐ）
+    with _limit_threads():
+        get_predictor()
+    # 読み込み済みのオブジェクトをGCの対象外にし、子プロセスでのcopy-on-writeによるコピーを減らす
+    gc.freeze()
+
+    # 子プロセスにハウスを均等に分ける（1回の予測はPREDICT_BATCH_SIZE件まで）
+    chunk_size = max(1, min(predict_batch_size, -(-len(task_houses) // n_workers)))
+    jobs = [
+        (fetch_config, date_from, date_to, task_houses[offset:offset + chunk_size], predict_batch_size)
+        for offset in range(0, len(task_houses), chunk_size)
+    ]
+    failed = set()
+    try:
+        with multiprocessing.get_context('fork').Pool(n_workers, initializer=_init_worker) as pool:
+            for writes, cache_stats, stage_stats in pool.imap(_run_task_houses_worker, jobs):
+                if cache_stats is not None:
+                    fetch_config.cache.merge_stats(cache_stats)
+                if stage_stats is not None:
+                    active_metrics().merge(stage_stats)
+                for item in writes:
+                    apply_task_house_write(writer, item, failed)
+    finally:
+        gc.unfreeze()
+
+
+def process_task_houses(writer, fetch_config, date_from, date_to, task_houses, predict_batch_size, predict_workers,
+                        pipeline_prefetch_houses):
+    """
+    PREDICT_WORKERS・PIPELINE_PREFETCH_HOUSESに応じた方式でハウスを処理し、未登録分を登録する
+    """
+    try:
+        if predict_workers > 1:
+            # 子プロセスで電力データの取得・予測を並列に行う
+            run_task_houses_multiprocess(
+                writer, fetch_config, date_from, date_to, task_houses, predict_batch_size, predict_workers)
+        elif pipeline_prefetch_houses > 0:
+            # 電力データの取得・予測・DB登録を並行して行う
+            run_task_houses_pipeline(
+                writer, fetch_config, date_from, date_to, task_houses, predict_batch_size, pipeline_prefetch_houses)
+        else:
+            run_task_houses(writer, fetch_config, date_from, date_to, task_houses, predict_batch_size)
+    finally:
+        # まとめて登録する場合の未登録分を登録する
+        writer.flush()
+
+
+def get_fetch_window(date_from, date_to):
+    """
+    date_from〜date_toの取得開始日時（JST 0:00）と日数を返す
+    """
+    start = dt.strptime(f"{date_from} 00:00:00+0900", '%Y-%m-%d %H:%M:%S%z')
+    end = dt.strptime(f"{date_to} 00:00:00+0900", '%Y-%m-%d %H:%M:%S%z')
+    end = end + timedelta(days=1)
+    sub = end - start
+    return start, sub.days
+
+
+def get_http_session(spid, pool_size=1):
+    """
+    spid毎に共有するrequests.Sessionを取得する（コネクションプール・keep-alive）
+
+    :param pool_size: 同時に保持するコネクション数（取得の並列数）
+    """
+    key = (str(spid), pool_size)
+    with _http_sessions_lock:
+        session = _http_sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_sessions[key] = session
+        return session
+
+
+def request_electric_data_day(session, url, spid, houseid, sts, ets, timeout=30):
+    """
+    Energy Gateway APIからsts〜etsの電力データを取得する
+
+    :param timeout: リクエストのタイムアウト（秒）
+    :return: APIのレスポンス(JSON)
+    """
+    headers = {'Authorization': f"imSP {spid}:{os.environ.get('API_SHARED_PASSWORD')}"}
+    params = {'service_provider': spid, 'house': houseid, 'sts': int(sts.timestamp()),
+              'ets': int(ets.timestamp()), 'time_units': 20}
+
+    res = session.get(url, headers=headers, params=params, timeout=timeout)
+    res.raise_for_status()  # HTTPエラーの場合に例外を発生
+    # print(r.json()['data'][0]['timestamps'])
+
+    return res.json()
+
+
+def _powers_to_flags(powers, n):
+    """
+    1家電のpowersを使用フラグに変換する
+
+    :return: (値がある行のindex, 使用フラグ(0/1))。powersがn件より少ない場合、残りの行は値なし
+    """
+    m = min(len(powers), n)
+    obj = np.empty(m, dtype=object)
+    obj[:] = powers[:m]
+    index = np.flatnonzero(np.not_equal(obj, None))
+    try:
+        values = obj[index].astype(np.float64)
+    except (TypeError, ValueError):
+        # 数値に変換できない値を含む場合は1件ずつ変換し、変換できない値は値なしとする
+        converted = []
+        for k in index:
+            try:
+                converted.append((k, float(obj[k])))
+            except (Exception,):
+                continue
+        index = np.array([k for k, _ in converted], dtype=np.int64)
+        values = np.array([v for _, v in converted], dtype=np.float64)
+    return index, (values > 0.0).astype(np.float64)
+
+
+def convert_electric_data_day(response_data, app_type_ids):
+    """
+    1日分のAPIのレスポンスを分単位の電力データに変換する
+
+    家電毎にpowersを配列として変換し、値が0より大きければ1、それ以外は0、nullは欠損(NaN)とする。
+    1つでも値がある時刻は、欠損の家電を0とする。
+
+    :return: (JSTの時刻(datetime64[m]), 家電毎の使用フラグ(時刻数, len(app_type_ids))の配列, 1つでもデータが存在したか)
+    """
+    timestamps = response_data['data'][0]['timestamps']
+    appliance_types = response_data['data'][0]['appliance_types']
+
+    # JSTの時刻（秒は切り捨て）
+    seconds = np.asarray(timestamps)
+    if not np.issubdtype(seconds.dtype, np.integer):
+        seconds = np.floor(seconds.astype(np.float64)).astype(np.int64)
+    date_time_jst = (seconds.astype(np.int64) + 9 * 3600).astype('datetime64[s]').astype('datetime64[m]')
+
+    n = len(date_time_jst)
+    values = np.full((n, len(app_type_ids)), np.nan)
+    for appliance_type in appliance_types:
+        try:
+            j = app_type_ids.index(int(appliance_type['appliance_type_id']))
+            index, flags = _powers_to_flags(appliance_type['appliances'][0]['powers'], n)
+        except (Exception,):
+            continue
+        values[index, j] = flags
+
+    # 1つでもnullでなければ0を代入
+    exist = ~np.all(np.isnan(values), axis=1)
+    values[exist] = np.nan_to_num(values[exist], nan=0.0)
+
+    return date_time_jst, values, bool(np.any(exist))
+
+
+def electric_data_rows(date_time_jst, values):
+    """
+    分単位の電力データをCSV登録用の行リストに変換する（欠損はNone）
+    """
+    arr = []
+    for d, line in zip(date_time_jst.astype(dt), values.tolist()):
+        arr.append([d.strftime('%Y/%m/%d %H:%M:00')] + [None if v != v else int(v) for v in line])
+    return arr
+
+
+def fetch_electric_data_days(api_url, mock_api_url, app_type_ids, spid, houseid, date_from, date_to, max_workers=1,
+                             deadline=None, cache=None):
+    """
+    Energy Gateway APIからdate_from〜date_toの電力データを1日ずつ取得し、分単位の電力データに変換する
+
+    spid毎に共有するSessionで、1日毎の取得をmax_workers並列で行う。結果は日付順に返し、
+    HTTPエラー等の例外はその日の結果を返す時点で送出する（それより前の日の結果は返される）
+
+    :param max_workers: 1日毎の取得の並列数
+    :param deadline: 取得の期限（deadline.Deadline）。期限を超えた場合はPredictionTimeOutを送出する
+    :param cache: 1日分の電力データのキャッシュ（electric_day_cache.ElectricDayCache）。キャッシュ済みの日は
+                  APIから取得せず、取得した日は確定済み（キャッシュの対象）であればキャッシュに保存する
+    :return: 1日分の(JSTの時刻, 家電毎の使用フラグ, その日に1つでもデータが存在したか)を1日ずつ返すジェネレータ
+             （convert_electric_data_dayを参照）
+    """
+    # spid=9991かつMOCK_API_URLが定義されている場合はモックサーバーを使用
+    if str(spid) == '9991' and mock_api_url:
+        url = mock_api_url
+    else:
+        url = api_url
+
+    max_workers = max(1, max_workers)
+    session = get_http_session(spid, max_workers)
+
+    def fetch_day(day):
+        sts = start + timedelta(days=day)
+        ets = start + timedelta(days=(day + 1))
+        if cache is not None:
+            cached = cache.get(spid, houseid, sts, ets, app_type_ids)
+            if cached is not None:
+                return cached
+        timeout = 30
+        if deadline is not None:
+            deadline.check("fetch")
+            timeout = min(timeout, deadline.remaining())
+        with stage_timer("fetch_day"):
+            response_data = request_electric_data_day(session, url, spid, houseid, sts, ets, timeout)
+        with stage_timer("convert"):
+            result = convert_electric_data_day(response_data, app_type_ids)
+        if cache is not None:
+            cache.put(spid, houseid, sts, ets, app_type_ids, result)
+        return result
+
+    # API取得
+    start, n_days = get_fetch_window(date_from, date_to)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = [executor.submit(fetch_day, day) for day in range(n_days)]
+    try:
+        for future in futures:
+            if deadline is None:
+                yield future.result()
+                continue
+            try:
+                yield future.result(timeout=min(deadline.remaining(), 24 * 60 * 60))
+            except FutureTimeoutError:
+                deadline.check("fetch")
+                raise
+    finally:
+        # エラー時は未開始の取得をキャンセルする
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def save_electric_data_csv(arr, csv_header, start, houseid):
+    """
+    電力データをCSVに出力し、GCS_LOG_BUCKETが設定されている場合はCloud Storageにバックアップする
+
+    :return: CSVファイルパス
+    """
+    logger = logging.getLogger(__name__)
+
+    ts = dt.timestamp(dt.now())
+    csv_filename = f"{start.strftime('%Y%m%d')}_{houseid}_{int(ts)}.csv"
+    data_path = f"/tmp/data/{csv_filename}"  # input csv path
+    # CSV出力
+    with stage_timer("csv_write"), open(data_path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(csv_header)
+        writer.writerows(arr)
+
+    # CSVファイルをCloud Storageにバックアップ
+    gcs_bucket_name = os.environ.get('GCS_LOG_BUCKET')
+    if gcs_bucket_name:
+        try:
+            storage_client = storage.Client()
+            bucket = storage_client.bucket(gcs_bucket_name)
+            gcs_csv_path = f"data/{csv_filename}"
+            blob = bucket.blob(gcs_csv_path)
+            with stage_timer("gcs_upload"):
+                blob.upload_from_filename(data_path)
+            logger.debug(f"CSV file uploaded to gs://{gcs_bucket_name}/{gcs_csv_path}")
+        except Exception as e:
+            logger.warning(f"Failed to upload CSV to GCS: {e}")
+
+    return data_path
+
+
+def get_lease_owner():
+    """リースの所有者（ジョブ実行・Cloud Runタスク・プロセスを識別する文字列）"""
+    execution = os.environ.get('CLOUD_RUN_EXECUTION') or socket.gethostname()
+    task_index = os.environ.get('CLOUD_RUN_TASK_INDEX', '0')
+    return f"{execution}/{task_index}/{os.getpid()}"[:128]
+
+
+def claim_task_houses(cnx, cursor, task_id, owner, n, lease_seconds):
+    """
+    未終了で、リースされていないかリースの期限が切れたハウスを最大n件取得し、ownerのリースを設定する
+
+    SELECT ... FOR UPDATE SKIP LOCKED（MySQL 8.0以降）で他のジョブ実行が取得中の行を読み飛ばすため、
+    同時に実行しても同じハウスを取得しない。期限切れのリースは異常終了したジョブ実行のハウスとして取得し直す。
+
+    :return: ハウスのリスト（task_house_id, spid, houseid, age, sex, education, solo）
+    """
+    try:
+        sql = "SELECT id AS task_house_id, spid, houseid, age, sex, education, solo from `task_houses` " \
+              "WHERE task_id = %s AND (status IS NULL OR status = 0) " \
+              "AND (lease_expires_at IS NULL OR lease_expires_at < NOW()) " \
+              "ORDER BY spid, id LIMIT %s FOR UPDATE SKIP LOCKED"
+        cursor.execute(sql, (task_id, n))
+        task_houses = cursor.fetchall()
+        if len(task_houses) > 0:
+            placeholders = ", ".join(["%s"] * len(task_houses))
+            sql = f"UPDATE `task_houses` SET lease_owner = %s, lease_expires_at = NOW() + INTERVAL %s SECOND " \
+                  f"WHERE id IN ({placeholders})"
+            cursor.execute(sql, (owner, lease_seconds) + tuple(task_house[0] for task_house in task_houses))
+        cnx.commit()
+        return task_houses
+    except Exception:
+        cnx.rollback()
+        raise
+
+
+def finish_task_if_done(cnx, cursor, task_id):
+    """
+    タスクの全ハウスが終了（status 1 / -1）していれば、task終了をDBに登録する
+
+    :return: このジョブ実行でtask終了を登録した場合はTrue
+    """
+    sql = "UPDATE `tasks` SET end_at=NOW(), status=%s WHERE id = %s AND end_at IS NULL " \
+          "AND NOT EXISTS (SELECT 1 FROM `task_houses` WHERE task_id = %s AND (status IS NULL OR status = 0))"
+    cursor.execute(sql, (1, task_id, task_id))
+    finished = cursor.rowcount > 0
+    cnx.commit()
+    return finished
+
+
 def update_task_houses(cnx, cursor, p_task_house_id, p_status, p_progress):
     m_sql = "UPDATE `task_houses` SET status = %s, progress = %s, updated_at = NOW() WHERE id = %s"
     m_param = (p_status, p_progress, p_task_house_id,)
@@ -464,9 +1344,58 @@ def update_task_houses(cnx, cursor, p_task_house_id, p_status, p_progress):
     cnx.commit()
 
 
+def fail_task_house(cnx, cursor, task_id, task_house_id, progress):
+    """ハウスをエラー終了としてDBに登録"""
+    logger = logging.getLogger(__name__)
+    try:
+        status = -1
+        update_task_houses(cnx, cursor, task_house_id, status, progress)
+
+        sql = "INSERT `task_results` (task_id, task_house_id, result, created_at) value (%s, %s, %s, " \
+              "NOW()) "
+        param = (task_id, task_house_id, -1,)
+        cursor.execute(sql, param)
+        cnx.commit()
+    except Exception as e:
+        logger.warning(f"Warning Occurred. failed update_task_houses. exception: %s", e)
+
+
+def upload_profiles_to_gcs(task_id=None):
+    """
+    HouseProfilerのプロファイルをCloud Storageのlogs/profiles/<task_id>/にアップロードする
+    （GCS_LOG_BUCKETが設定されていない場合・失敗した場合はlogディレクトリに移動する）
+    """
+    logger = logging.getLogger(__name__)
+    paths = profile_files(get_profile_dir())
+    if not paths:
+        return
+    task_id_str = str(task_id).zfill(10) if task_id else 'unknown'
+    gcs_bucket_name = os.environ.get('GCS_LOG_BUCKET')
+    bucket = None
+    if gcs_bucket_name:
+        try:
+            bucket = storage.Client().bucket(gcs_bucket_name)
+        except Exception as e:
+            logger.warning(f"Failed to upload profiles to GCS: {e}. Saving locally.")
+    for path in paths:
+        try:
+            if bucket is not None:
+                gcs_path = f"logs/profiles/{task_id_str}/{os.path.basename(path)}"
+                with stage_timer("gcs_upload"):
+                    bucket.blob(gcs_path).upload_from_filename(path)
+                logger.info(f"Profile uploaded to gs://{gcs_bucket_name}/{gcs_path}")
+                os.remove(path)
+            else:
+                os.makedirs(os.path.join(base_dir, 'log'), exist_ok=True)
+                os.replace(path, os.path.join(base_dir, 'log', os.path.basename(path)))
+        except Exception as e:
+            logger.warning(f"Failed to upload profile {path}: {e}")
+
+
 def upload_log_to_gcs(task_id=None):
-    """predictor.logをCloud Storageにアップロード（エラー時も実行）"""
+    """predictor.log（とプロファイル）をCloud Storageにアップロード（エラー時も実行）"""
     logger = logging.getLogger(__name__)
+    upload_profiles_to_gcs(task_id)
 
     # pred_mci.pyはカレントディレクトリにログを作成するため、両方の場所を確認
     possible_paths = [
@@ -494,7 +1423,8 @@ def upload_log_to_gcs(task_id=None):
             bucket = storage_client.bucket(gcs_bucket_name)
             log_filename = f"logs/predictor_{task_id_str}_{dt.now().strftime('%Y%m%d%H%M%S')}.log"
             blob = bucket.blob(log_filename)
-            blob.upload_from_filename(predictor_log_path)
+            with stage_timer("gcs_upload"):
+                blob.upload_from_filename(predictor_log_path)
             logger.info(f"Log file uploaded to gs://{gcs_bucket_name}/{log_filename}")
             # アップロード後、ローカルファイルを削除
             os.remove(predictor_log_path)
@@ -546,8 +1476,45 @@ def api_main(args):
         logger.error(traceback.format_exc())
         raise
 
+def api_main_batch(args_list):
+    """
+    複数ハウスをまとめて予測する
+
+    :param args_list: Argsのリスト
+    :return: 各ハウスのスコア(int)、またはエラーの場合はException
+    """
+    logger = logging.getLogger(__name__)
+    if len(args_list) == 0:
+        return []
+
+    try:
+        # シングルトンインスタンスを取得（初回のみ初期化される）
+        predictor = get_predictor()
+
+        # 予測実行
+        logger.info(f"予測を実行中... (ハウス数: {len(args_list)})")
+        records = [(args.age, args.male, args.edu, args.solo, args.csv) for args in args_list]
+        results = predictor.calculate_scores_batch(records, debug=False)
+    except Exception as e:
+        logger.error(f"予測実行中にエラーが発生しました: {e}")
+        logger.error(traceback.format_exc())
+        return [e for _ in args_list]
+
+    scores = []
+    for args, result in zip(args_list, results):
+        status_code = result.get('status_code')
+        if status_code == 100:
+            scores.append(result.get('score'))
+        else:
+            logger.error(f"エラーが発生しました。ステータスコード: {status_code}, data: {args.csv}")
+            scores.append(Exception(get_status_message(status_code)))
+    return scores
+
 class Args:
     def __init__(self, age, male, edu, solo, data_path):
+        """
+        :param data_path: 電力データのCSVファイルパス、ElectricData、またはElectricFeatureAccumulator
+        """
         if male != 1:
             male = 0  # 女性は0
         if solo is None:
@@ -0,0 +1,367 @@
+"""
+MCI予測サービス（常駐HTTPサーバ）
+
+起動時にPredictorWithLogging（main.pyのget_predictor、環境変数も同じ）でモデルを1度だけ読み込み、
+HTTPリクエスト毎にスコアを返す。同時に届いたリクエストはSERVICE_BATCH_WAIT_MSの間まとめて
+（最大SERVICE_MAX_BATCH_SIZE件）、1回のcalculate_scores_batchで予測する（api/micro_batcher.py）。
+バッチの予測はモデルの段階毎にPREDICT_BATCH_TIMEOUT（未設定の場合はPREDICT_TIMEOUT×件数）で、
+超えた場合は各ハウスをPREDICT_TIMEOUTで1件ずつ予測し直す。リクエストはSERVICE_REQUEST_TIMEOUTまでしか
+待たないため、バッチの予測もSERVICE_REQUEST_TIMEOUTで打ち切る。
+
+    POST /predict  予測（JSON、またはCSVのアップロード）
+    GET  /health   ヘルスチェック
+    GET  /metrics  処理時間のヒストグラム・件数（Prometheus形式、?format=jsonでJSON）
+
+    $ python3 server.py
+    $ curl -s localhost:8080/health
+"""
+import json
+import logging
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(base_dir, 'api'))
+
+from main import get_predictor, get_status_message
+from deadline import time_limit
+from micro_batcher import MicroBatcher
+from myexception import PredictionTimeOut
+from stage_metrics import StageMetrics, enable_metrics
+
+# 予測リクエストの背景データの項目（electric_data / electric_csvのいずれかと合わせて指定）
+BEHAVIOR_FIELDS = ("age", "male", "edu", "solo")
+
+
+class RequestError(Exception):
+    """リクエストの形式エラー（HTTP 400等）"""
+
+    def __init__(self, message, http_status=400):
+        super().__init__(message)
+        self.http_status = http_status
+
+
+class PredictionService:
+    """
+    モデルを読み込み済みのPredictorで予測リクエストを処理する
+
+    同時に処理中のリクエストはmax_concurrent_requests件まで（超えた場合はHTTP 503）。
+    リクエスト全体・バッチ待ち・バッチ予測の処理時間はmetricsに記録する。
+    バッチの予測はrequest_timeout（リクエストの待ち時間）を超えて続けない。
+    """
+
+    def __init__(self, predictor, max_batch_size=32, batch_wait=0.01, max_concurrent_requests=64,
+                 request_timeout=30.0, metrics=None):
+        self.predictor = predictor
+        self.request_timeout = request_timeout
+        self.max_concurrent_requests = max_concurrent_requests
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        if request_timeout < predictor.timeout:
+            logging.getLogger(__name__).warning(
+                f"SERVICE_REQUEST_TIMEOUT（{request_timeout}秒）がPREDICT_TIMEOUT（{predictor.timeout}秒）より短いため、"
+                f"予測に時間がかかるハウスはステータスコード400またはHTTP 504になります"
+            )
+        self.batcher = MicroBatcher(
+            self._predict_batch,
+            max_batch_size=max_batch_size, max_wait=batch_wait, metrics=self.metrics, name="prediction-batcher"
+        )
+        self.started_at = time.time()
+        self._slots = threading.BoundedSemaphore(max_concurrent_requests)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # HTTPステータス・予測のステータスコード毎の件数
+        self._responses = {}
+        self._results = {}
+
+    def _predict_batch(self, records):
+        """
+        まとめたリクエストを1回のcalculate_scores_batchで予測する
+
+        制限時間を超えたバッチはPredictorが各ハウスをPREDICT_TIMEOUTで1件ずつ予測し直す。全体は
+        request_timeoutで打ち切り、打ち切られたハウスはステータスコード400になる（待っているリクエストはHTTP 504）。
+        """
+        results = None
+        try:
+            with time_limit(self.request_timeout, "batch"):
+                results = self.predictor.calculate_scores_batch(records, debug=False)
+        except PredictionTimeOut:
+            # 全ハウスの予測の完了後に期限を過ぎた場合も結果を返す
+            if results is None:
+                raise
+        return results
+
+    def acquire(self):
+        """処理中のリクエスト数の上限に達していない場合は枠を確保してTrueを返す"""
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def predict(self, record, temp_path=None):
+        """
+        1ハウスを予測して結果（status_code・score・message）を返す
+
+        :param record: (age, male, edu, solo, 電力データ)。電力データはCSVファイルパスまたはCSV形式の行のリスト
+        :param temp_path: 予測後に削除する一時ファイル（タイムアウトした場合も予測の完了後に削除する）
+        """
+        try:
+            future = self.batcher.submit(record)
+        except Exception:
+            remove_file(temp_path)
+            raise
+        if temp_path is not None:
+            future.add_done_callback(lambda _: remove_file(temp_path))
+        try:
+            result = future.result(timeout=self.request_timeout)
+        except FutureTimeoutError:
+            raise RequestError(f"予測が{self.request_timeout}秒以内に完了しませんでした", 504)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"バッチ予測でエラーが発生しました: {e}")
+            result = {"status_code": 900, "score": None}
+        with self._lock:
+            self._results[result["status_code"]] = self._results.get(result["status_code"], 0) + 1
+        return dict(result, message=get_status_message(result["status_code"]))
+
+    def count_response(self, http_status):
+        with self._lock:
+            self._responses[http_status] = self._responses.get(http_status, 0) + 1
+
+    def health(self):
+        with self._lock:
+            in_flight = self._in_flight
+        return {
+            "status": "ok",
+            "uptime_s": time.time() - self.started_at,
+            "in_flight": in_flight,
+            "max_concurrent_requests": self.max_concurrent_requests,
+            "pending": self.batcher.pending(),
+            "lgb_backend": self.predictor.lgb_backend,
+            "logi_backend": self.predictor.logi_backend,
+            "early_exit": self.predictor.early_exit,
+        }
+
+    def metrics_json(self):
+        with self._lock:
+            responses = dict(self._responses)
+            results = dict(self._results)
+        return {
+            "summary": self.metrics.summary(n_houses=sum(results.values())),
+            "batcher": self.batcher.stats(),
+            "responses": responses,
+            "results": results,
+            "prediction_cache": self.predictor.prediction_cache_info(),
+            "early_exit": self.predictor.early_exit_info(),
+        }
+
+    def metrics_prometheus(self):
+        with self._lock:
+            responses = dict(self._responses)
+            results = dict(self._results)
+        stats = self.batcher.stats()
+        lines = [self.metrics.to_prometheus().rstrip("\n")]
+        lines.append("# TYPE mci_service_responses_total counter")
+        lines += [f'mci_service_responses_total{{http_status="{k}"}} {v}' for k, v in sorted(responses.items())]
+        lines.append("# TYPE mci_service_results_total counter")
+        lines += [f'mci_service_results_total{{status_code="{k}"}} {v}' for k, v in sorted(results.items())]
+        lines.append("# TYPE mci_service_batches_total counter")
+        lines.append(f"mci_service_batches_total {stats['batches']}")
+        lines.append("# TYPE mci_service_batch_records_total counter")
+        lines.append(f"mci_service_batch_records_total {stats['records']}")
+        lines.append("# TYPE mci_service_pending gauge")
+        lines.append(f"mci_service_pending {stats['pending']}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        self.batcher.close()
+
+
+def parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RequestError(f"{name}は整数で指定してください: {value!r}")
+
+
+def remove_file(path):
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def write_temp_csv(content):
+    """アップロードされたCSVを一時ファイルに書き出してパスを返す（予測後に削除する）"""
+    fd, path = tempfile.mkstemp(prefix="mci_request_", suffix=".csv")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return path
+
+
+def parse_predict_request(content_type, query, body):
+    """
+    予測リクエストを(age, male, edu, solo, 電力データ)と一時ファイルのパス（なければNone）に変換する
+
+    - application/json: {"age", "male", "edu", "solo"}と、"electric_data"（CSV形式の行のリスト、
+      ヘッダなし40320行×10列）または"electric_csv"（CSVファイルの内容の文字列）
+    - text/csv: 本文がCSVファイル、背景データはクエリパラメータ（?age=70&male=0&edu=12&solo=1）
+    """
+    if content_type == "text/csv":
+        behavior = [parse_int(query.get(name, [None])[0], name) for name in BEHAVIOR_FIELDS]
+        path = write_temp_csv(body)
+        return (*behavior, path), path
+
+    if content_type not in ("application/json", ""):
+        raise RequestError(f"Content-Typeはapplication/jsonまたはtext/csvを指定してください: {content_type}", 415)
+    try:
+        request = json.loads(body)
+    except ValueError as e:
+        raise RequestError(f"JSONの形式エラー: {e}")
+    if not isinstance(request, dict):
+        raise RequestError("JSONはオブジェクトで指定してください")
+    missing = [name for name in BEHAVIOR_FIELDS if name not in request]
+    if missing:
+        raise RequestError(f"項目がありません: {', '.join(missing)}")
+    # 型の検証はPredictor（ステータスコード211）で行う
+    behavior = [request[name] for name in BEHAVIOR_FIELDS]
+    if isinstance(request.get("electric_data"), list):
+        return (*behavior, request["electric_data"]), None
+    if isinstance(request.get("electric_csv"), str):
+        path = write_temp_csv(request["electric_csv"].encode("utf-8"))
+        return (*behavior, path), path
+    raise RequestError("electric_data（行のリスト）またはelectric_csv（CSVの文字列）を指定してください")
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MCIPredictionService/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug("%s - %s", self.address_string(), format % args)
+
+    def send_json(self, http_status, payload, headers=None):
+        self.send_body(http_status, json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                       "application/json; charset=utf-8", headers)
+
+    def send_body(self, http_status, body, content_type, headers=None):
+        self.service.count_response(http_status)
+        self.send_response(http_status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == "/health":
+            self.send_json(200, self.service.health())
+        elif url.path == "/metrics":
+            query = urllib.parse.parse_qs(url.query)
+            if query.get("format", [""])[0] == "json":
+                self.send_json(200, self.service.metrics_json())
+            else:
+                self.send_body(200, self.service.metrics_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self.send_json(404, {"error": f"Not found: {url.path}"})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        if url.path != "/predict":
+            self.rfile.read(length)
+            self.send_json(404, {"error": f"Not found: {url.path}"})
+            return
+        if length > self.server.max_body_bytes:
+            # 本文を読まずに接続を閉じる
+            self.close_connection = True
+            self.send_json(413, {"error": f"リクエストが大きすぎます（上限{self.server.max_body_bytes}バイト）"})
+            return
+        body = self.rfile.read(length)
+        if not self.service.acquire():
+            self.send_json(503, {"error": "同時リクエスト数の上限に達しています"}, {"Retry-After": "1"})
+            return
+
+        started = time.perf_counter()
+        try:
+            content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            record, path = parse_predict_request(content_type, urllib.parse.parse_qs(url.query), body)
+            self.send_json(200, self.service.predict(record, path))
+        except RequestError as e:
+            self.send_json(e.http_status, {"error": str(e)})
+        except Exception:
+            logging.getLogger(__name__).exception("予測リクエストの処理中にエラーが発生しました")
+            self.send_json(500, {"status_code": 900, "score": None, "message": get_status_message(900)})
+        finally:
+            self.service.release()
+            self.service.metrics.observe("request", time.perf_counter() - started)
+
+
+def main():
+    logger = logging.getLogger(__name__)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(message)s')
+
+    # 予測パイプラインの段階（load_data、lgb_ensemble等）もリクエスト・バッチと合わせて記録する
+    metrics = enable_metrics()
+    # モデルを読み込んでから待ち受けを開始する
+    predictor = get_predictor()
+    service = PredictionService(
+        predictor,
+        # 1回の予測でまとめるリクエスト数
+        max_batch_size=max(1, int(os.environ.get('SERVICE_MAX_BATCH_SIZE', '32'))),
+        # 最初のリクエストから他のリクエストを待つ時間（ミリ秒）
+        batch_wait=max(0.0, float(os.environ.get('SERVICE_BATCH_WAIT_MS', '10'))) / 1000,
+        # 同時に処理するリクエスト数の上限（超えた場合は503）
+        max_concurrent_requests=max(1, int(os.environ.get('SERVICE_MAX_CONCURRENT_REQUESTS', '64'))),
+        # 1リクエストの予測の待ち時間の上限（秒、超えた場合は504）
+        request_timeout=float(os.environ.get('SERVICE_REQUEST_TIMEOUT', '30')),
+        metrics=metrics,
+    )
+
+    host = os.environ.get('SERVICE_HOST', '0.0.0.0')
+    port = int(os.environ.get('PORT', '8080'))
+    httpd = ThreadingHTTPServer((host, port), PredictionRequestHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    httpd.max_body_bytes = int(float(os.environ.get('SERVICE_MAX_BODY_MB', '20')) * 1024 ** 2)
+
+    def shutdown(signum, frame):
+        logger.info(f"シグナル{signum}を受信したため、サービスを停止します")
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    logger.info(f"予測サービスを開始します: http://{host}:{port} (max_batch_size={service.batcher.max_batch_size}, "
+                f"batch_wait={service.batcher.max_wait}s, max_concurrent_requests={service.max_concurrent_requests}, "
+                f"request_timeout={service.request_timeout}s, predict_timeout={predictor.timeout}s, "
+                f"predict_batch_timeout={predictor.batch_timeout})")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        service.close()
+        logger.info("予測サービスを停止しました")
+
+
+if __name__ == '__main__':
+    main()